@@ -1,13 +1,4 @@
 from shell_adventure.api import *
-# You can of course use any of Python's default libraries. filecmp is particularly useful.
-import filecmp
-
-# Private methods won't be used as puzzle generators
-def _cmp_folders(diff: filecmp.dircmp):
-    return (
-        not diff.left_only and not diff.right_only and
-        all(_cmp_folders(sub) for sub in diff.subdirs.values())
-    )
 
 def copy_folder():
     src = File("folder") # Files are relative to home by default
@@ -19,14 +10,16 @@ def copy_folder():
     def checker():
         # Check the folders are identical
         # (this might not work if the student modifies "folder", you could add additional checks for that)
-        if src.exists() and dst.exists() and src.is_dir() and dst.is_dir():
-            return _cmp_folders(filecmp.dircmp(src, dst))
+        # tree_digest() compares names, modes and contents, and doesn't read files again unless they've changed.
+        if src.is_dir() and dst.is_dir():
+            return src.tree_digest() == dst.tree_digest()
         else:
             return False
 
     return Puzzle(
         question = 'Copy "folder" to "folder (copy)"',
         checker = checker,
+        depends_on = [src, dst], # Only compare the folders again if something in them changed
     )
 
 def rm_folder(home: File, root: File):
@@ -41,6 +34,7 @@ def rm_folder(home: File, root: File):
         checker = lambda: not folder.exists(),
     )
 
+@independent # Creating all the files is slow, so generate it in parallel with the other puzzles
 def grep(home: File):
     bulk = home / "bulk"
     secret = bulk.random_shared_folder(depth = (2,6)).random_file("txt")
@@ -1,14 +1,16 @@
 #!/usr/bin/env python3
-import sys
+import argparse
 from textwrap import indent
 from shell_adventure.gui.main import ShellAdventureGUI
 from shell_adventure.gui.gui_widgets import standalone_fileselect
 from shell_adventure.host_side.tutorial import Tutorial
+from shell_adventure.host_side import variants
+from shell_adventure.shared.support import PathLike
 from shell_adventure.shared.tutorial_errors import *
 
-def launch(config_file: str):
+def launch(config_file: PathLike, variant: PathLike = None):
     try:
-        tutorial = Tutorial(config_file)
+        tutorial = Tutorial(config_file, variant)
     except ConfigError as e:
         exit(str(e))
 
@@ -40,12 +42,17 @@ def launch(config_file: str):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description = "Launches a tutorial.")
+    parser.add_argument("config_file", nargs = "?", help = "The tutorial config file. Asks for it if not given.")
+    parser.add_argument("--variant", help = "The id of a variant made with pregenerate.py to launch")
+    parser.add_argument("--store", default = "variants", help = "The folder the variant is saved in (default: variants)")
+    args = parser.parse_args()
+
+    config_file = args.config_file
+    if not config_file:
         config_file = standalone_fileselect(filetypes = [("YAML", ".yml"), ("YAML", ".yaml")])
-    else:
-        config_file = sys.argv[1]
 
     if not config_file:
         exit("No tutorial config file given.")
 
-    launch(config_file)
\ No newline at end of file
+    launch(config_file, variants.variant_file(args.store, args.variant) if args.variant else None)
\ No newline at end of file
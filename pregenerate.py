@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+""" Generates variants of a tutorial ahead of time, so they can be launched with `launch.py CONFIG --variant ID` """
+import argparse
+from shell_adventure.host_side import variants
+from shell_adventure.shared.tutorial_errors import *
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generates variants of a tutorial ahead of time.")
+    parser.add_argument("config_file", help = "The tutorial config file")
+    parser.add_argument("store", help = "The folder to save the variants in")
+    parser.add_argument("seeds", nargs = "+", help = "The seeds to generate a variant for")
+    parser.add_argument("-j", "--jobs", type = int, default = 4, help = "How many containers to run at once")
+    args = parser.parse_args()
+
+    print(f"Generating {len(args.seeds)} variant(s)...")
+    try:
+        ids = variants.generate_all(args.config_file, args.store, args.seeds, args.jobs)
+    except TutorialError as e:
+        exit(str(e))
+    print("\n".join(ids))
@@ -3,16 +3,21 @@ The shell_adventure.api package contains the classes and methods needed to make
 """
 
 from __future__ import annotations
-from shell_adventure.shared.puzzle import Puzzle, PuzzleTemplate, AutoGrader
+from shell_adventure.shared.puzzle import Puzzle, PuzzleTemplate, AutoGrader, independent
 from .file import File
+from .file_batch import FileBatch
 from .permissions import (change_user, user_exists, Permissions, LinkedPermissions,
                           PermissionsGroup, LinkedPermissionsGroup)
 from .random_helper import RandomHelper, RandomHelperException
 
 from pathlib import Path as _Path
+from shell_adventure.shared import messages as _messages
 
 PKG_PATH = _Path(__path__[0]).resolve() # type: ignore  # mypy issue #1422
 
+ARCHIVE_PATH = _messages.archive_path
+""" The folder in the container that the archives listed in the tutorial config are mounted in. """
+
 # Unfortunately we need some package level variables to allow File methods to access
 # the RandomHelper and student home. They will be set when the tutorial is created.
 _home: File = None
@@ -35,11 +40,23 @@ def rand() -> RandomHelper:
         raise RandomHelperException("You can only use randomization in Puzzle templates, not autograders")
     return _rand
 
+def archive(name: str) -> File:
+    """
+    Returns the `File` of an archive listed in the `archives` option of the tutorial config, by its file name. Pass it
+    to `File.unpack()` to extract it.
+    """
+    file = File(ARCHIVE_PATH, name)
+    if not file.is_file():
+        raise FileNotFoundError(f'No archive "{name}". Archives need to be listed in the "archives" option of the tutorial config.')
+    return file
+
 __all__ = [
     "Puzzle",
     "PuzzleTemplate",
     "AutoGrader",
+    "independent",
     "File",
+    "FileBatch",
     "change_user",
     "user_exists",
     "Permissions",
@@ -49,4 +66,5 @@ __all__ = [
     "RandomHelper",
     "RandomHelperException",
     "rand",
+    "archive",
 ]
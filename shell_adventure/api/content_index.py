@@ -0,0 +1,129 @@
+""" Splits content sources for `RandomHelper` into paragraphs. """
+from typing import List, Sequence, Union, overload
+from pathlib import Path
+from array import array
+import re, os, mmap, hashlib, tempfile, operator
+from shell_adventure.shared.support import PathLike
+
+def clean_paragraph(paragraph: str) -> str:
+    """ Strips trailing whitespace and blank lines from a paragraph. """
+    # paragraph = re.sub(r"\s*\n\s*", "", paragraph) # unwrap
+    paragraph = paragraph.rstrip()
+    paragraph = "\n".join([l for l in paragraph.split("\n") if l.strip() != ""]) # remove blank lines.
+    return paragraph
+
+def split_paragraphs(source: str) -> List[str]:
+    """ Splits a string into a list of cleaned paragraphs. """
+    paragraphs = re.split(r"\s*\n\s*\n", source) # split into paragraphs
+    # # split paragraphs into lists of sentences
+    # para_sentences = [re.findall(r".*?\.\s+", para, flags = re.DOTALL) for para in paragraphs]
+    return [clean_paragraph(para) for para in paragraphs if para.strip() != ""]
+
+class ContentIndex(Sequence[str]):
+    """
+    The paragraphs of a content source file, read lazily from a memory map of the file. Only the offsets of the
+    paragraphs are kept in memory, so large files don't use much memory. Indexing or slicing it returns cleaned
+    paragraphs like `split_paragraphs()`, but only ASCII whitespace separates paragraphs.
+    """
+
+    VERSION = 1
+    """ Version of the index file format. Part of the cache file names so old indexes aren't used. """
+
+    def __init__(self, path: PathLike, cache_dir: PathLike = None):
+        """
+        Indexes the file at path. If cache_dir is given the index is saved there, keyed by a hash of the file, so
+        the file only has to be split once. A cached index that doesn't fit the file is ignored, and cache_dir can be
+        read-only.
+        """
+        self.path = Path(path)
+        self._offsets = array("Q") # Pairs of (start, end) for each paragraph
+        self._open()
+
+        if self._mmap:
+            cache_file = None
+            if cache_dir:
+                digest = hashlib.sha256(self._mmap).hexdigest()
+                cache_file = Path(cache_dir, f"{digest}.v{ContentIndex.VERSION}.idx")
+
+            if not (cache_file and self._load(cache_file)):
+                self._build()
+                if cache_file:
+                    self._save(cache_file)
+
+    def _open(self):
+        """ Memory maps the file. """
+        self._mmap: mmap.mmap = None
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size > 0: # Can't mmap an empty file
+                self._mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    def __getstate__(self):
+        """ Pickles only the path and offsets. The file is mapped again when unpickled, so it should still exist. """
+        return {"path": self.path, "offsets": self._offsets}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._offsets = state["offsets"]
+        self._open()
+
+    def _build(self):
+        """ Finds the offsets of the paragraphs in the file. """
+        start = 0
+        for sep in re.finditer(rb"\s*\n\s*\n", self._mmap):
+            self._add(start, sep.start())
+            start = sep.end()
+        self._add(start, len(self._mmap))
+
+    def _add(self, start: int, end: int):
+        if self._mmap[start:end].strip() != b"":
+            self._offsets.extend((start, end))
+
+    def _load(self, cache_file: Path) -> bool:
+        """
+        Reads the index from cache_file. Returns False, leaving the index empty, if it doesn't exist or isn't a valid index
+        of the file, that is if the paragraphs aren't in order, empty, or past the end of the file.
+        """
+        try:
+            with open(cache_file, "rb") as f:
+                self._offsets.frombytes(f.read())
+        except (OSError, ValueError): # ValueError if the size isn't a multiple of the item size
+            return False
+
+        starts, ends = self._offsets[0::2], self._offsets[1::2]
+        valid = (len(starts) == len(ends) and (not ends or ends[-1] <= len(self._mmap)) and
+                 all(map(operator.lt, starts, ends)) and all(map(operator.le, ends, starts[1:])))
+        if not valid:
+            self._offsets = array("Q")
+        return valid
+
+    def _save(self, cache_file: Path):
+        """
+        Writes the index to cache_file atomically, so concurrent tutorials don't read a partial index. Does nothing if
+        the cache can't be written.
+        """
+        try:
+            cache_file.parent.mkdir(parents = True, exist_ok = True)
+            fd, tmp = tempfile.mkstemp(dir = cache_file.parent)
+        except OSError:
+            return
+        with open(fd, "wb") as f:
+            f.write(self._offsets.tobytes())
+        os.replace(tmp, cache_file)
+
+    def __len__(self) -> int:
+        return len(self._offsets) // 2
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+    @overload
+    def __getitem__(self, index: slice) -> List[str]: ...
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self._paragraph(i) for i in range(*index.indices(len(self)))]
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError("paragraph index out of range")
+        return self._paragraph(index)
+
+    def _paragraph(self, index: int) -> str:
+        start, end = self._offsets[2 * index], self._offsets[2 * index + 1]
+        return clean_paragraph(self._mmap[start:end].decode(errors = "replace"))
@@ -1,8 +1,9 @@
 from __future__ import annotations
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Iterable, Dict
 from pathlib import PosixPath
-import shutil, subprocess
-from .permissions import Permissions, LinkedPermissions, change_user
+import shutil, stat, os
+from .permissions import Permissions, LinkedPermissions, change_user, _adjust_mode
+from shell_adventure.shared.support import PathLike
 import shell_adventure.api # For access to globals
 
 class File(PosixPath):
@@ -54,6 +55,99 @@ class File(PosixPath):
 
         return self
 
+    def create_sparse(self, size: int, *, recursive = True) -> File:
+        """
+        Creates a file of size bytes without writing anything. The file reads as all zeros and `ls` shows the full size,
+        but it takes almost no space on disk, so `du` shows it as nearly empty. An existing file is truncated or extended
+        to size. Makes missing parent dirs if recursive is True (the default). Returns self.
+        >>> File("big.img").create_sparse(10**9) # Instant, no matter the size
+        """
+        if recursive:
+            self.parent.mkdir(parents = True, exist_ok = True)
+        with open(self, "ab") as f:
+            f.truncate(size)
+        return self
+
+    def create_preallocated(self, size: int, *, recursive = True) -> File:
+        """
+        Creates a file of size bytes with its disk space allocated, without writing the data. Unlike `create_sparse()`,
+        the file takes up its full size on disk, so it shows up in `du` and `df`. Makes missing parent dirs if recursive
+        is True (the default). Returns self.
+        """
+        if recursive:
+            self.parent.mkdir(parents = True, exist_ok = True)
+        with open(self, "ab") as f:
+            f.truncate(size) # posix_fallocate() only ever grows the file
+            os.posix_fallocate(f.fileno(), 0, size)
+        return self
+
+    def write_chunks(self, chunks: Iterable[Union[str, bytes]], size: int = None, *, recursive = True) -> File:
+        """
+        Writes the chunks to the file one at a time, so the whole content never has to be in memory. If size is given,
+        stops once size bytes have been written, cutting off the last chunk, so chunks can be an infinite generator. A
+        str chunk is only cut between characters, so the file can come out a few bytes short of size. Overwrites the file
+        like `Path.write_text()`. Makes missing parent dirs if recursive is True (the default). Returns self.
+        >>> File("random.bin").write_chunks(iter(lambda: os.urandom(2**20), None), size = 10**9)
+        >>> File("words.txt").write_chunks(rand().paragraph_stream(), size = 10**7)
+        """
+        if recursive:
+            self.parent.mkdir(parents = True, exist_ok = True)
+        written = 0
+        with open(self, "wb", buffering = 2**20) as f:
+            for chunk in chunks:
+                data = chunk.encode() if isinstance(chunk, str) else chunk
+                if size != None and written + len(data) >= size:
+                    end = size - written
+                    while isinstance(chunk, str) and end < len(data) and data[end] & 0xC0 == 0x80: # Mid-character
+                        end -= 1
+                    f.write(data[:end])
+                    break
+                f.write(data)
+                written += len(data)
+        return self
+
+    def unpack(self, archive: PathLike, *, owner: Union[str, int] = None, group: Union[str, int] = None,
+               file_mode: int = None, dir_mode: int = None, rename: bool = False) -> Dict[str, File]:
+        """
+        Extracts a tar (optionally compressed) or zip archive into this directory, creating it if needed. Use
+        `shell_adventure.api.archive()` to get archives listed in the tutorial config. Files keep their modes and
+        modification times from the archive unless you give file_mode or dir_mode, and are owned by the current user
+        unless you give owner or group. If rename is True, every file and folder gets a random name from `rand()`,
+        keeping its extensions. Raises `ValueError` if the archive has paths or links outside of this directory.
+
+        Returns a dict mapping each path in the archive to the `File` it was extracted to.
+        >>> files = home.unpack(archive("project.tar.gz"), rename = True)
+        >>> files["project/src/main.py"]
+        File("/home/student/apple/banana/orange.py")
+        """
+        from .unpack import unpack # Avoid circular import
+        return unpack(archive, self, owner = owner, group = group, file_mode = file_mode, dir_mode = dir_mode, rename = rename)
+
+    def tree_digest(self, *, contents: bool = True, modes: bool = True) -> str:
+        """
+        Returns a hash of this file or directory and everything under it, as a hex string. Two trees have the same digest
+        if they have the same names, file types, symlink targets, and modes and file contents unless modes or contents
+        are False. The name of the root, owners and modification times don't matter, so a copy of a folder has the same
+        digest as the original. Symlinks aren't followed. File contents are only read again if a file has changed, so
+        checking the same tree again is fast.
+        >>> src.tree_digest() == dst.tree_digest() # Check dst is a copy of src
+        True
+        """
+        from .tree_digest import tree_digest # Avoid circular import
+        return tree_digest(self, contents = contents, modes = modes)
+
+    def tree_diff(self, other: Union[str, PosixPath], *, contents: bool = True, modes: bool = True, limit: int = 10) -> List[str]:
+        """
+        Compares the tree at other to this one like `tree_digest()`, and returns up to limit messages describing the
+        differences, such as `'"sub/a.txt" is missing'`. Only folders that differ are compared file by file. Returns an
+        empty list if the trees are the same, so you can return the first difference as feedback in an autograder.
+        >>> diffs = src.tree_diff(dst)
+        >>> diffs[0] if diffs else True
+        '"sub/a.txt" is missing'
+        """
+        from .tree_digest import tree_diff # Avoid circular import
+        return tree_diff(self, other, contents = contents, modes = modes, limit = limit)
+
     # === Permissions ===
 
     def chown(self, owner: Union[str, int] = None, group: Union[str, int] = None):
@@ -72,13 +166,10 @@ class File(PosixPath):
         that the unix `chmod` command would recognize such as `"u+x"`. See the [chmod man page](https://linux.die.net/man/1/chmod)
         """
         with change_user("root"): # Automatically set privilege to root.
-            if isinstance(mode, str): # Just call chmod directly instead of trying to parse the mode string ourselves.
-                if not self.exists(): raise FileNotFoundError
-                process = subprocess.run(["chmod", mode, self.path])
-                if process.returncode != 0:
-                    raise ValueError(f'Invalid mode "{mode}"')
-            else:
-                super().chmod(mode)
+            if isinstance(mode, str): # Parse the mode string the same way GNU chmod would
+                file_stat = self.stat()
+                mode = _adjust_mode(mode, file_stat.st_mode, stat.S_ISDIR(file_stat.st_mode))
+            super().chmod(mode)
 
     @property
     def permissions(self) -> LinkedPermissions:
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import Union, Dict, Set, NamedTuple, Any
+import os
+from .file import File
+from .permissions import change_user, _uid, _gid
+from shell_adventure.shared.support import PathLike
+
+class _Entry(NamedTuple):
+    """ The attributes to apply to a file or directory in a `FileBatch` """
+    content: str
+    mode: Union[str, int]
+    owner: Union[str, int]
+    group: Union[str, int]
+
+class FileBatch:
+    """
+    Collects files and directories to create, and creates them all at once. Missing parent directories are only made
+    once no matter how many files are in them, and all modes and owners are applied together as root. Use it instead
+    of many `File.create()` calls when a puzzle needs a lot of files.
+
+    Files and directories are created when the context manager exits, or when you call `apply()`.
+    >>> with FileBatch() as batch:
+    ...     for i in range(1000):
+    ...         batch.file(home / "logs" / f"{i}.log", content = "log\\n")
+    ...     batch.dir(home / "secret", mode = 0o700, owner = "root")
+    >>> FileBatch().tree(home / "project", {
+    ...     "README.md": "# My Project\\n",
+    ...     "src": {"main.py": None, "util.py": ""},
+    ... }).apply()
+    """
+
+    def __init__(self):
+        self._files: Dict[File, _Entry] = {}
+        self._dirs: Dict[File, _Entry] = {}
+
+    def file(self, path: PathLike, *, content: str = None, mode: Union[str, int] = None,
+             owner: Union[str, int] = None, group: Union[str, int] = None) -> File:
+        """
+        Adds a file to the batch. Like `File.create()`, an existing file is left as is unless content is given, and new
+        parent directories use the default mode. mode can be an int or a string that `File.chmod()` accepts. owner and
+        group are names or ids like `File.chown()`. Returns the `File`.
+        """
+        path = File(path)
+        self._files[path] = _Entry(content, mode, owner, group)
+        return path
+
+    def dir(self, path: PathLike, *, mode: Union[str, int] = None, owner: Union[str, int] = None,
+            group: Union[str, int] = None) -> File:
+        """ Adds a directory to the batch. Its mode is set after its contents are created. Returns the `File`. """
+        path = File(path)
+        self._dirs[path] = _Entry(None, mode, owner, group)
+        return path
+
+    def tree(self, root: PathLike, spec: Dict[str, Any]) -> FileBatch:
+        """
+        Adds a tree of files under root. spec maps names to either a dict for a directory, a string for a file with
+        that content, or None for an empty file. Returns self.
+        """
+        root = self.dir(root)
+        for name, value in spec.items():
+            if isinstance(value, dict):
+                self.tree(root / name, value)
+            else:
+                self.file(root / name, content = value)
+        return self
+
+    def _makedirs(self, path: File, made: Set[File]):
+        """ mkdir path and any missing parents, skipping any we've already made or found in made. """
+        if path in made:
+            return
+        try:
+            os.mkdir(path)
+        except FileNotFoundError:
+            self._makedirs(path.parent, made)
+            os.mkdir(path)
+        except FileExistsError:
+            if not path.is_dir(): raise
+        made.add(path)
+
+    def apply(self):
+        """ Creates all the files and directories in the batch, and then clears it. """
+        made: Set[File] = set()
+        for path in self._dirs:
+            self._makedirs(path, made)
+        for path, entry in self._files.items():
+            self._makedirs(path.parent, made)
+            flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if entry.content != None else 0)
+            fd = os.open(path, flags, 0o666) # Like touch(), the umask applies
+            if entry.content:
+                with open(fd, "w") as f:
+                    f.write(entry.content)
+            else:
+                os.close(fd)
+
+        # Files first, then directories deepest first, so that a restrictive mode doesn't stop us changing their contents.
+        entries = [*self._files.items(), *sorted(self._dirs.items(), key = lambda d: len(d[0].parts), reverse = True)]
+        entries = [(path, entry) for path, entry in entries if entry.mode != None or entry.owner != None or entry.group != None]
+        if entries:
+            with change_user("root"):
+                for path, entry in entries:
+                    if entry.owner != None or entry.group != None:
+                        uid = _uid(entry.owner) if isinstance(entry.owner, str) else entry.owner
+                        gid = _gid(entry.group) if isinstance(entry.group, str) else entry.group
+                        os.chown(path, -1 if uid == None else uid, -1 if gid == None else gid)
+                    if isinstance(entry.mode, str):
+                        path.chmod(entry.mode)
+                    elif entry.mode != None:
+                        os.chmod(path, entry.mode)
+
+        self._files.clear()
+        self._dirs.clear()
+
+    def __enter__(self) -> FileBatch:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None: # Don't create a partial batch if there was an error
+            self.apply()
@@ -1,8 +1,37 @@
 
 from __future__ import annotations # Don't evaluate annotations until after the module is run.
+from typing import List, Tuple, NamedTuple
 from . import file
 import os, stat, pwd, grp
 from contextlib import contextmanager
+from functools import lru_cache
+
+@lru_cache(maxsize = None)
+def _uid(user: str) -> int:
+    """ Returns the uid of user. Cached, since looking up a name reads the passwd file. (Failed lookups aren't cached) """
+    return pwd.getpwnam(user).pw_uid
+
+@lru_cache(maxsize = None)
+def _gid(group: str) -> int:
+    """ Returns the gid of group. Cached, since looking up a name reads the group file. """
+    return grp.getgrnam(group).gr_gid
+
+_credentials: List[Tuple[int, int]] = []
+"""
+Stack of the effective (uid, gid) set by the active `change_user()` contexts, so nested contexts don't need to query or
+set the credentials again. The effective ids are shared by the whole process, so this is a global.
+"""
+
+def _set_credentials(current: Tuple[int, int], new: Tuple[int, int]):
+    """ Changes the effective (uid, gid) from current to new, with as few syscalls as possible. """
+    (cur_uid, cur_gid), (uid, gid) = current, new
+    if gid != cur_gid:
+        if cur_uid != 0: # Need to be root to change to an arbitrary group. Our real uid is root so we can always go back.
+            os.seteuid(0)
+            cur_uid = 0
+        os.setegid(gid)
+    if uid != cur_uid:
+        os.seteuid(uid)
 
 @contextmanager
 def change_user(user: str, group: str = None):
@@ -17,20 +46,126 @@ def change_user(user: str, group: str = None):
     ...     File("root_file").create() # root will own this file
     >>> File("student_file").create() # We are back to default user, student will own this file.
     """
-    group = group if group else user
-    prev_user = os.geteuid()
-    prev_group = os.getegid()
+    new = (_uid(user), _gid(group if group else user))
+    current = _credentials[-1] if _credentials else (os.geteuid(), os.getegid())
 
-    uid = pwd.getpwnam(user).pw_uid
-    gid = grp.getgrnam(group).gr_gid
-    os.setegid(gid)
-    os.seteuid(uid)
+    if new != current: # Skip switching if we are already the user
+        _set_credentials(current, new)
+    _credentials.append(new)
 
     try:
-        yield (uid, gid)
+        yield new
     finally: # change back to original user.
-        os.setegid(prev_user)
-        os.seteuid(prev_group)
+        _credentials.pop()
+        if new != current:
+            _set_credentials(new, current)
+
+class _ModeChange(NamedTuple):
+    """ A single operation in a chmod mode string, eg. the "+x" in "u+x". Mirrors the struct used by GNU chmod. """
+    op: str
+    """ "+", "-", or "=" """
+    flag: str
+    """ "ordinary", "copy" to copy existing bits (eg. "g=u"), or "X" to set execute only if a directory or already executable """
+    affected: int
+    """ The bits in the "who" part, or 0 if it was omitted. """
+    value: int
+    """ The bits to change, before limiting to affected. """
+    mentioned: int
+    """ The bits explicitly mentioned. """
+
+_WHO_BITS = {"u": stat.S_ISUID | stat.S_IRWXU, "g": stat.S_ISGID | stat.S_IRWXG, "o": stat.S_ISVTX | stat.S_IRWXO, "a": 0o7777}
+_PERM_BITS = {"r": 0o444, "w": 0o222, "x": 0o111, "X": 0, "s": stat.S_ISUID | stat.S_ISGID, "t": stat.S_ISVTX}
+_COPY_BITS = {"u": stat.S_IRWXU, "g": stat.S_IRWXG, "o": stat.S_IRWXO}
+
+@lru_cache(maxsize = None)
+def _compile_mode(mode: str) -> Tuple[_ModeChange, ...]:
+    """
+    Parses a mode string that the chmod command would accept, either octal or symbolic, eg. "u+x,go=rX". Follows the GNU
+    chmod grammar, one clause per comma `[ugoa]*([-+=]([rwxXst]*|[ugo]))+|[-+=][0-7]+`. Raises ValueError if invalid.
+    """
+    invalid = ValueError(f'Invalid mode "{mode}"')
+    def at(i: int) -> str: return mode[i] if i < len(mode) else ""
+
+    if at(0).isdigit(): # Octal mode
+        if not all(c in "01234567" for c in mode) or int(mode, 8) > 0o7777: raise invalid
+        value = int(mode, 8)
+        # Like GNU chmod, keep the setuid and setgid bits on directories unless you give 5 digits.
+        mentioned = (value & (stat.S_ISUID | stat.S_ISGID)) | stat.S_ISVTX | 0o777 if len(mode) < 5 else 0o7777
+        return (_ModeChange("=", "ordinary", 0o7777, value, mentioned),)
+
+    changes: List[_ModeChange] = []
+    p = 0
+    while True: # One loop per clause
+        affected = 0
+        while at(p) and at(p) in _WHO_BITS:
+            affected |= _WHO_BITS[at(p)]
+            p += 1
+
+        if not (at(p) and at(p) in "+-="): raise invalid # Need at least one op
+        while at(p) and at(p) in "+-=":
+            op, p = at(p), p + 1
+            mentioned = 0
+            if at(p) and at(p) in "01234567":
+                end = p
+                while at(end) and at(end) in "01234567": end += 1
+                value = int(mode[p:end], 8)
+                p = end
+                if affected or value > 0o7777 or at(p) not in ("", ","): raise invalid
+                affected = mentioned = 0o7777
+                flag = "ordinary"
+            elif at(p) and at(p) in _COPY_BITS:
+                value, flag = _COPY_BITS[at(p)], "copy"
+                p += 1
+            else:
+                value, flag = 0, "ordinary"
+                while at(p) and at(p) in _PERM_BITS:
+                    value |= _PERM_BITS[at(p)]
+                    if at(p) == "X": flag = "X"
+                    p += 1
+            changes.append(_ModeChange(op, flag, affected, value, mentioned if mentioned else (affected & value if affected else value)))
+
+        if at(p) == "":
+            return tuple(changes)
+        elif at(p) == ",":
+            p += 1
+        else:
+            raise invalid
+
+def _umask() -> int:
+    """ Returns the umask of the process. """
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+def _adjust_mode(mode: str, old_mode: int, is_dir: bool) -> int:
+    """
+    Returns the mode a file with old_mode would have after `chmod mode`. Like chmod, if "who" is omitted bits set in the
+    umask aren't set, and setuid and setgid bits on directories aren't changed unless mentioned explicitly.
+    """
+    new_mode = old_mode & 0o7777
+    umask = None
+    for change in _compile_mode(mode):
+        omit = (stat.S_ISUID | stat.S_ISGID if is_dir else 0) & ~change.mentioned
+        value = change.value
+        if change.flag == "copy":
+            value &= new_mode
+            value |= ((0o444 if value & 0o444 else 0) | (0o222 if value & 0o222 else 0) | (0o111 if value & 0o111 else 0))
+        elif change.flag == "X" and (new_mode & 0o111 or is_dir):
+            value |= 0o111
+
+        if not change.affected and umask == None:
+            umask = _umask()
+        # If who was given, limit to the affected bits, otherwise don't change bits in umask.
+        value &= (change.affected if change.affected else ~umask) & ~omit
+
+        if change.op == "=": # If who was given, preserve the bits that aren't affected. Otherwise umask bits are cleared.
+            preserved = (~change.affected if change.affected else 0) | omit
+            new_mode = (new_mode & preserved) | value
+        elif change.op == "+":
+            new_mode |= value
+        else:
+            new_mode &= ~value
+    return new_mode & 0o7777
 
 def user_exists(user: str) -> bool:
     """ Returns True if the user exists (by their username) """
@@ -99,13 +234,63 @@ class LinkedPermissions(Permissions):
 
     You can access and modify `File` permissions via the `File.permissions` property, which offers a more convenient API to manipulate
     UNIX file permissions than `os` and `stat` modules.
+
+    Each bit you read or set is a separate `stat` or `chmod`. Use `batch()` to make several changes at once, or `snapshot()`
+    to read all the bits at once.
     """
 
     def __init__(self, file: file.File):
         self._file = file
-        self.user = LinkedPermissionsGroup(file, 6)
-        self.group = LinkedPermissionsGroup(file, 3)
-        self.others = LinkedPermissionsGroup(file, 0)
+        self._mode: int = None # The mode, with edits, while in a batch()
+        self.user = LinkedPermissionsGroup(file, 6, self)
+        self.group = LinkedPermissionsGroup(file, 3, self)
+        self.others = LinkedPermissionsGroup(file, 0, self)
+
+    def _get_mode(self) -> int:
+        """ Returns the mode of the file, including special bits. """
+        if self._mode != None:
+            return self._mode
+        return stat.S_IMODE(self._file.stat().st_mode)
+
+    def _set_mode(self, mode: int):
+        """ Sets the mode of the file, or just records it if we are in a batch() """
+        if self._mode != None:
+            self._mode = mode
+        else:
+            self._file.chmod(mode)
+
+    @contextmanager
+    def batch(self):
+        """
+        A context manager that reads the mode once, applies all changes to the permissions made in the context to it, and
+        writes it with a single `chmod` when the context exits. If an exception is thrown the file isn't changed. Make
+        the changes through the returned `LinkedPermissions`, not through new calls to `File.permissions`.
+        >>> with File("A.txt").permissions.batch() as perms:
+        ...     perms.user.execute = True
+        ...     perms.group.write = False
+        ...     perms.others.read = False
+        """
+        if self._mode != None: # Nested batch, the outer one will write the changes
+            yield self
+            return
+
+        original = self._mode = self._get_mode()
+        try:
+            yield self
+            if self._mode != original:
+                self._file.chmod(self._mode)
+        finally:
+            self._mode = None
+
+    def snapshot(self) -> Permissions:
+        """ Returns the current permissions as a plain `Permissions` object that isn't linked to the file. Only does one `stat`. """
+        return Permissions(self._get_mode())
+
+    def __int__(self):
+        return self._get_mode() & 0o777
+
+    def __str__(self):
+        return str(self.snapshot())
 
 
 class PermissionsGroup:
@@ -169,17 +354,17 @@ class LinkedPermissionsGroup(PermissionsGroup):
 
     def _get_bit(self, mask: int) -> bool:
         """ Gets the read (0o4), write (0o2), or execute (0o1) bit. """
-        mode = stat.S_IMODE(self._file.stat().st_mode)
+        mode = self._permissions._get_mode()
         return bool((mode >> self._bit_shift) & mask)
 
     def _set_bit(self, mask: int, val: bool):
-        """ Gets the read (0o4), write (0o2), or execute (0o1) bit. """
-        mode = stat.S_IMODE(self._file.stat().st_mode)
+        """ Sets the read (0o4), write (0o2), or execute (0o1) bit. """
+        mode = self._permissions._get_mode()
         if val: # set bit
             mode = mode | (mask << self._bit_shift)
         else: # clear bit at mask
             mode = mode & ~(mask << self._bit_shift)
-        self._file.chmod(mode)
+        self._permissions._set_mode(mode)
 
     # MyPy fusses at overriding field with property. See https://github.com/python/mypy/issues/4125
     read = property(lambda self: self._get_bit(0o4), lambda self, val: self._set_bit(0o4, val)) #type: ignore
@@ -189,10 +374,18 @@ class LinkedPermissionsGroup(PermissionsGroup):
     execute = property(lambda self: self._get_bit(0o1), lambda self, val: self._set_bit(0o1, val)) #type: ignore
     """ The execute permission bit """
 
-    def __init__(self, file: file.File, bit_shift: int):
+    def __init__(self, file: file.File, bit_shift: int, permissions: LinkedPermissions = None):
         """
         bit_shift is the number of bits to shift to the right to get the rwx bits in the lowest position
         user: 6, group: 3, others: 0
+        permissions is the `LinkedPermissions` this group is part of, so that it shares its `batch()`.
         """
         self._file = file
         self._bit_shift = bit_shift
+        self._permissions = permissions if permissions else LinkedPermissions(file)
+
+    def __int__(self) -> int:
+        return (self._permissions._get_mode() >> self._bit_shift) & 0o7
+
+    def __str__(self) -> str:
+        return str(PermissionsGroup.from_int(int(self)))
@@ -1,7 +1,10 @@
 from __future__ import annotations
-from typing import List, Tuple, Union, Set
-import random, re, lorem
+from typing import List, Tuple, Union, Set, Dict, Sequence, Iterator, Iterable
+import random, lorem, copy
+from itertools import accumulate
+from contextlib import contextmanager
 from .file import File
+from .content_index import ContentIndex, split_paragraphs
 from shell_adventure.shared.support import PathLike
 
 class RandomHelper:
@@ -10,43 +13,176 @@ class RandomHelper:
     You can access an instance of `RandomHelper` in puzzle modules via the `shell_adventure.api.rand()` function.
     """
 
-    def __init__(self, name_dictionary: str, content_sources: List[str] = []):
+    seed: Union[int, str]
+    """ The seed the random streams are derived from. None if generation isn't reproducible. """
+
+    def __init__(self, name_dictionary: str, content_sources: List[str] = [], seed: Union[int, str] = None, *,
+                 content_files: Sequence[PathLike] = [], index_dir: PathLike = None):
         """
         Creates a `RandomHelper`.
         name_dictionary is a string containing words, each on its own line.
+        content_sources are strings, and content_files are paths to files that will be used to generate random content.
+        content_files are read lazily, and if index_dir is given their paragraph indexes are cached there. See `ContentIndex`.
+        If seed is given, the output will be reproducible. See `_stream()`.
         """
-        names = set(name_dictionary.splitlines())
-        names.discard("") # remove empty entries
+        # Remove duplicates, but keep the dictionary order so that a seed gives the same names every time.
+        names = dict.fromkeys(name_dictionary.splitlines())
+        names.pop("", None) # remove empty entries
 
-        # A list of strings that will be used to generate random names.
-        self._name_dictionary: List[str] = list(names) # choice() only works on list.
+        # A list of strings that will be used to generate random names, and the index of each.
+        self._name_dictionary: List[str] = list(names)
+        self._name_index: Dict[str, int] = {name: i for i, name in enumerate(self._name_dictionary)}
+        self._used: Set[int] = set() # Indexes of the names that have been returned
+        self._part, self._parts = 0, 1 # Only names whose index % parts == part are used. See _partition()
+        self._names_left = len(self._name_dictionary) # Unused names in the partition
+        self._replay: List[str] = [] # Names to return again before drawing new ones, last first. See _record()
+        self._drawn: List[str] = None # The names returned since _record() was called
 
-        def clean_paragraph(paragraph: str) -> str:
-            # paragraph = re.sub(r"\s*\n\s*", "", paragraph) # unwrap
-            paragraph = paragraph.rstrip()
-            paragraph = "\n".join([l for l in paragraph.split("\n") if l.strip() != ""]) # remove blank lines.
-            return paragraph
+        self.seed = seed
+        # The random number generator for the current stream.
+        self._random = random.Random(self._stream_seed("")) if seed != None else random.Random()
+        # The random order the current stream goes through the name dictionary in. See _next_in_order()
+        self._reset_order(self._stream_seed("") if seed != None else None)
 
-        # The sources that will be used to generate random content. List of files, each file is a list of paragraphs.
-        self._content_sources: List[List[str]] = []
-        for source in content_sources:
-            paragraphs = re.split(r"\s*\n\s*\n", source) # split into paragraphs
-            paragraphs = [clean_paragraph(para) for para in paragraphs if para.strip() != ""]
-            # # split paragraphs into lists of sentences
-            # para_sentences = [re.findall(r".*?\.\s+", para, flags = re.DOTALL) for para in paragraphs]
-            self._content_sources.append(paragraphs)
+        # The sources that will be used to generate random content. Each source is a sequence of paragraphs.
+        self._content_sources: List[Sequence[str]] = [split_paragraphs(source) for source in content_sources]
+        self._content_sources += [ContentIndex(file, index_dir) for file in content_files]
+        # Cache of the sources large enough for each paragraph count, and their cumulative weights.
+        self._content_weights: Dict[int, Tuple[List[Sequence[str]], List[int]]] = {}
 
         # A set of shared folders. random._folder() can use existing folders if they are shared.
         self._shared_folders: Set[File] = set()
+        # Index of the shared folders directly under each folder, in the order they were marked, so _folder() doesn't have
+        # to scan directories.
+        self._shared_children: Dict[File, List[File]] = {}
+        # Shared folders we've seen on disk, so we don't have to check them again.
+        self._created_shared: Set[File] = set()
+
+    def _stream_seed(self, key: str) -> str:
+        """ Returns the seed for the stream identified by key. """
+        return f"{self.seed}:{key}"
+
+    def _stream(self, key: str):
+        """
+        Switches to the random stream for key, which should identify the puzzle template being generated by its name and
+        position. Does nothing if there is no seed. Each stream is derived from only the seed and key, so a template's
+        random values don't depend on what was generated before it. Names have to be unique, so each stream goes through
+        the name dictionary in its own random order and skips names that other streams have used. So a template only
+        gets different names if another template happened to use one of them first.
+        """
+        if self.seed != None:
+            self._random = random.Random(self._stream_seed(key))
+            self._reset_order(self._stream_seed(key))
+
+    def _reset_order(self, seed: str):
+        """ Starts a new random order of the name dictionary from seed, or from a random seed if seed is None. """
+        self._order_random = random.Random(f"{seed}:names" if seed != None else None)
+        self._order: Dict[int, int] = {} # The positions that have been swapped, see _next_in_order()
+        self._order_pos = 0
+
+    def _next_in_order(self) -> int:
+        """
+        Returns the index of the next name in the current order of the name dictionary, or None if every name has been
+        gone through. The order is a Fisher-Yates shuffle that is only done as far as it's needed, so streams that only
+        use a few names are cheap even with a big dictionary. Uses its own random number generator, so that drawing names
+        doesn't change the other random values of the stream.
+        """
+        pos, count = self._order_pos, len(self._name_dictionary)
+        if pos >= count:
+            return None
+        swap = self._order_random.randrange(pos, count)
+        index = self._order.get(swap, swap)
+        self._order[swap] = self._order.pop(pos, pos)
+        self._order_pos += 1
+        return index
+
+    @contextmanager
+    def _global_stream(self, key: str):
+        """
+        Seeds the global `random` module from the stream for key while in the context, so that user code that uses it
+        directly is reproducible as well. The global state is restored afterwards. Does nothing if there is no seed.
+        """
+        if self.seed == None:
+            yield
+            return
+        state = random.getstate()
+        random.seed(self._stream_seed(key))
+        try:
+            yield
+        finally:
+            random.setstate(state)
+
+    def _record(self, replay: List[str] = []) -> List[str]:
+        """
+        Starts recording the names returned by name() in a new list, and returns the list. If replay is given, name()
+        returns those names first, in order, before drawing new ones. It is used to regenerate a puzzle with the names it
+        had, so they should be names this `RandomHelper` has already returned. Replayed names go through the order of the
+        stream up to where they were the first time, so the names after them match as well. Names that `_file()` rejected
+        because the file already existed aren't recorded, since a replay goes past them anyway. Shared folders that
+        `_folder()` reused are recorded as their absolute path, so that a replay reuses them again instead of making a new
+        folder.
+        """
+        self._replay = list(reversed(replay))
+        self._drawn = []
+        return self._drawn
+
+    def _partition(self, part: int, parts: int) -> RandomHelper:
+        """
+        Returns a copy of this `RandomHelper` that only uses every parts-th name in the dictionary, starting at part.
+        Copies with different parts will never generate the same name, so they can be used by separate processes. Each
+        copy only gets 1/parts of the unused names, and raises `RandomHelperException` if it runs out even if the
+        others have names left. Use `_unpartition()` to get the names of the other copies back once they are done.
+        """
+        new = copy.copy(self)
+        new._part, new._parts = part, parts
+        new._used = set(self._used)
+        new._names_left = sum(1 for i in range(part, len(self._name_dictionary), parts) if i not in self._used)
+        new._reset_order(None) # Each partition switches to the stream it's generating before drawing names
+        new._replay, new._drawn = [], None
+        new._shared_folders = set(self._shared_folders)
+        new._shared_children = {parent: list(children) for parent, children in self._shared_children.items()}
+        new._created_shared = set(self._created_shared)
+        return new
 
+    def _unpartition(self, used: Iterable[str]):
+        """
+        Gives a copy made by `_partition()` back the unused names of the other copies, so that later generation can use
+        them. used should be all the names the other copies returned.
+        """
+        self._used.update(self._name_index[name] for name in used if name in self._name_index)
+        self._part, self._parts = 0, 1
+        self._names_left = len(self._name_dictionary) - len(self._used)
 
     def name(self) -> str:
         """ Returns a random word that can be used as a file name. The name is taken from the name_dictionary. """
-        if len(self._name_dictionary) == 0:
-            raise RandomHelperException("Out of unique names.")
-        choice = random.choice(self._name_dictionary)
-        self._name_dictionary.remove(choice) # We can't choose the same name again.
-        return choice
+        if self._replay:
+            name = self._replay.pop()
+            # Go through the order up to the name like the first time, so the names after it match
+            target = self._name_index.get(name)
+            while target != None and self._next_in_order() not in (target, None):
+                pass
+        else:
+            if self._names_left == 0:
+                if self._parts > 1:
+                    size = len(range(self._part, len(self._name_dictionary), self._parts))
+                    raise RandomHelperException(
+                        f"Out of unique names. All {size} names in this process's partition of the name dictionary have been "
+                        f"used. Independent templates each get 1/{self._parts} of the {len(self._name_dictionary)} names, "
+                         "other partitions may still have names left.")
+                raise RandomHelperException(
+                    f"Out of unique names. All {len(self._name_dictionary)} names in the name dictionary have been used.")
+            index = self._next_in_order()
+            while index != None and (index % self._parts != self._part or index in self._used):
+                index = self._next_in_order()
+            if index == None: # Only if the order was used up by replays. Just take the first unused name.
+                index = next(i for i in range(self._part, len(self._name_dictionary), self._parts) if i not in self._used)
+            self._used.add(index)
+            self._names_left -= 1
+            name = self._name_dictionary[index]
+
+        if self._drawn != None:
+            self._drawn.append(name)
+        return name
 
     def paragraphs(self, count: Union[int, Tuple[int, int]] = (1, 3)) -> str:
         """
@@ -57,62 +193,91 @@ class RandomHelper:
             count: Either an int or a (min, max) tuple. If a tuple is given, will return a random number of paragraphs
                    in the range, inclusive.
         """
-        if isinstance(count, tuple): count = random.randint(count[0], count[1])
-        # filter sources too small for chosen size
-        sources = [source for source in self._content_sources if count <= len(source)]
+        if isinstance(count, tuple): count = self._random.randint(count[0], count[1])
+        if count not in self._content_weights:
+            # filter sources too small for chosen size
+            sources = [source for source in self._content_sources if count <= len(source)]
+            # Weight the files so all paragraphs are equally likely regardless of source
+            self._content_weights[count] = (sources, list(accumulate(len(source) - count + 1 for source in sources)))
+        sources, cum_weights = self._content_weights[count]
 
         if sources: # If we have source
-            # Weight the files so all paragraphs are equally likely regardless of source
-            weights = [len(source) - count + 1 for source in sources]
-            [source] = random.choices(sources, k = 1, weights = weights)
+            [source] = self._random.choices(sources, k = 1, cum_weights = cum_weights)
 
-            index = random.randint(0, len(source) - count)
+            index = self._random.randint(0, len(source) - count)
             return "\n\n".join(source[index:index+count]) + "\n"
         else:
             return lorem.get_paragraph(count = count, sep = "\n\n") + "\n"
 
+    def paragraph_stream(self, count: Union[int, Tuple[int, int]] = (1, 3)) -> Iterator[str]:
+        """
+        An infinite generator of random paragraphs from `paragraphs()`, separated by blank lines. Use it with
+        `File.write_chunks()` to make large text files.
+        """
+        while True:
+            yield self.paragraphs(count) + "\n"
+
     # === Files ===
 
     def _file(self, parent: PathLike, ext = None) -> File:
         """ Creates a `File` with a random name. You should use `File.rand_file()` instead of calling this method directly. """
         parent = File(parent).resolve()
         ext = "" if ext == None else f".{ext}"
-        new_file = File("/") # garanteed to exist.
 
-        # check if file already exists. This can happen if a hardcoded name happens to match the random one.
-        while new_file.exists():
+        while True:
+            replayed = bool(self._replay)
             new_file = parent / f"{self.name()}{ext}"
-
-        return new_file
+            # A replayed name is the file the puzzle had before, so it can still exist. Otherwise check if file already
+            # exists. This can happen if a hardcoded name happens to match the random one.
+            if replayed or not new_file.exists():
+                return new_file
+            if self._drawn != None:
+                self._drawn.pop() # A replay goes past it on the way to the next name
 
     def _folder(self, parent: PathLike, depth: Union[int, Tuple[int, int]] = (1, 3), create_new_chance: float = 0.5) -> File:
         """ Makes a `File` to a random folder under parent. You should use `File.random_shared_folder()` instead of calling this method directly. """
 
-        if isinstance(depth, tuple): depth = random.randint(depth[0], depth[1])
+        if isinstance(depth, tuple): depth = self._random.randint(depth[0], depth[1])
         folder = File(parent).resolve()
 
         for i in range(depth):
-            if folder.exists():
-                choices = [d for d in folder.iterdir() if d.is_dir() and d in self._shared_folders]
-            else:
-                choices = []
+            choices = [d for d in self._shared_children.get(folder, []) if self._is_created(d)]
             # Create new shared folder if no choices or random chance succeeds.
             # Add check for 1 since uniform() is an inclusive range
-            roll = random.uniform(0, 1)
-            if len(choices) == 0 or create_new_chance == 1 or roll < create_new_chance:
+            roll = self._random.uniform(0, 1)
+            if self._replay: # Make the same choice as the first time, since the folders it made may exist now
+                reuse = self._replay[-1].startswith("/")
+            else:
+                reuse = not (len(choices) == 0 or create_new_chance == 1 or roll < create_new_chance)
+
+            if not reuse:
                 folder = self._file(folder) # create random file under folder
                 self._mark_shared(folder)
             else:
-                folder = File(random.choice(choices))
+                index = int(self._random.random() * len(choices)) # One draw, whether or not it is replaying
+                folder = File(self._replay.pop()) if self._replay else File(choices[index])
+                if self._drawn != None:
+                    self._drawn.append(str(folder)) # Recorded as a path, so a replay knows it reused a folder here
 
         return folder
 
+    def _is_created(self, folder: File) -> bool:
+        """ Returns True if the shared folder exists on disk. Only shared folders that have been created can be reused. """
+        if folder not in self._created_shared:
+            if not folder.is_dir():
+                return False
+            self._created_shared.add(folder) # Shared folders shouldn't be removed, so we don't need to check again.
+        return True
+
     def _mark_shared(self, folder: PathLike):
         """ Marks a folder as shared. You should use `File.mark_shared()` instead of calling this method directly. """
         folder = File(folder)
         if folder.exists() and not folder.is_dir():
             raise RandomHelperException(f"Can't mark {folder} as shared, it already exists as a f. Can only mark folders as shared.")
-        self._shared_folders.add(folder.resolve())
+        folder = folder.resolve()
+        if folder not in self._shared_folders:
+            self._shared_folders.add(folder)
+            self._shared_children.setdefault(folder.parent, []).append(folder)
 
 class RandomHelperException(Exception):
     """ Error for when the `RandomHelper` fails. """
\ No newline at end of file
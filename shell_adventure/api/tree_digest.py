@@ -0,0 +1,96 @@
+""" Merkle digests of directory trees for `File.tree_digest()` and `File.tree_diff()` """
+from __future__ import annotations
+from typing import Dict, List, Tuple, NamedTuple
+from pathlib import PurePosixPath
+import os, stat, hashlib
+from .permissions import change_user
+from shell_adventure.shared.support import PathLike
+
+class _Node(NamedTuple):
+    """ The digest of a file or directory in a tree. """
+    header: bytes
+    """ The type and mode of the file, and the target if it's a symlink. """
+    digest: bytes
+    """ The hash of the header and the content, or the names and digests of the children for a directory. """
+    children: List[str]
+    """ The names of the children, if it's a directory. """
+
+_content_hashes: Dict[Tuple[int, int, int, int, int], bytes] = {}
+"""
+Hashes of file contents, keyed by (device, inode, mtime, ctime, size) so unchanged files aren't read again. The ctime
+is included since the mtime can be set back with `touch`, but the ctime can't.
+"""
+
+_MAX_CACHED = 100_000 # Clear the cache if it gets this big, so stale entries don't build up forever
+
+def _content_hash(path: str, st: os.stat_result) -> bytes:
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_ctime_ns, st.st_size)
+    if key not in _content_hashes:
+        if len(_content_hashes) >= _MAX_CACHED:
+            _content_hashes.clear()
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                digest.update(chunk)
+        _content_hashes[key] = digest.digest()
+    return _content_hashes[key]
+
+def _digest(path: str, rel: PurePosixPath, contents: bool, modes: bool, nodes: Dict[PurePosixPath, _Node]) -> bytes:
+    """ Returns the digest of path and everything under it, and adds their nodes to nodes by path relative to the root. """
+    st = os.lstat(path)
+    mode = f"{stat.S_IMODE(st.st_mode):o}" if modes else ""
+    children: List[str] = []
+    if stat.S_ISDIR(st.st_mode):
+        header = f"d {mode}".encode()
+        children = sorted(os.listdir(path))
+        body = [name.encode(errors = "surrogateescape") + b"\0" +
+                _digest(os.path.join(path, name), rel / name, contents, modes, nodes) for name in children]
+    elif stat.S_ISREG(st.st_mode):
+        header = f"f {mode}".encode()
+        body = [_content_hash(path, st)] if contents else []
+    elif stat.S_ISLNK(st.st_mode): # Symlinks aren't followed, and their modes don't mean anything
+        header = b"l " + os.readlink(path).encode(errors = "surrogateescape")
+        body = []
+    else:
+        header = f"o {stat.S_IFMT(st.st_mode):o} {mode}".encode()
+        body = []
+
+    digest = hashlib.sha256(header + b"\n" + b"\n".join(body)).digest()
+    nodes[rel] = _Node(header, digest, children)
+    return digest
+
+def _nodes(root: PathLike, contents: bool, modes: bool) -> Dict[PurePosixPath, _Node]:
+    """ Returns the nodes of every file under root, by path relative to root. """
+    nodes: Dict[PurePosixPath, _Node] = {}
+    with change_user("root"): # So files the student can't read can still be compared
+        _digest(os.fspath(root), PurePosixPath("."), contents, modes, nodes)
+    return nodes
+
+def tree_digest(root: PathLike, contents: bool = True, modes: bool = True) -> str:
+    """ See `File.tree_digest()` """
+    return _nodes(root, contents, modes)[PurePosixPath(".")].digest.hex()
+
+def tree_diff(expected: PathLike, actual: PathLike, contents: bool = True, modes: bool = True, limit: int = 10) -> List[str]:
+    """ See `File.tree_diff()` """
+    for path in (expected, actual):
+        if not os.path.lexists(path):
+            return [f'"{path}" doesn\'t exist']
+    expected_nodes, actual_nodes = _nodes(expected, contents, modes), _nodes(actual, contents, modes)
+    diffs: List[str] = []
+
+    def compare(rel: PurePosixPath):
+        a, b = expected_nodes.get(rel), actual_nodes.get(rel)
+        if len(diffs) >= limit or (a and b and a.digest == b.digest):
+            return
+        elif not b:
+            diffs.append(f'"{rel}" is missing')
+        elif not a:
+            diffs.append(f'"{rel}" shouldn\'t be there')
+        elif a.header == b.header and a.header.startswith(b"d"): # Only go into folders whose contents differ
+            for name in sorted(set(a.children) | set(b.children)):
+                compare(rel / name)
+        else:
+            diffs.append(f'"{rel}" is different')
+
+    compare(PurePosixPath("."))
+    return diffs
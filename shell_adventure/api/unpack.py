@@ -0,0 +1,165 @@
+""" Extracts tar and zip archives for `File.unpack()` """
+from __future__ import annotations
+from typing import Union, Dict, List, Tuple, Set, Iterator, IO, Callable, NamedTuple
+from pathlib import PurePosixPath
+import tarfile, zipfile, shutil, os, time, stat, functools
+from itertools import chain
+import shell_adventure.api # For access to globals
+from .file import File
+from .permissions import change_user, _uid, _gid
+from shell_adventure.shared.support import PathLike
+
+class _Member(NamedTuple):
+    """ A file in an archive, so tar and zip files can be extracted the same way. """
+    name: str
+    kind: str
+    """ "file", "dir", "symlink", or "hardlink" """
+    mode: int
+    mtime: float
+    link: str = None
+    """ The target of a symlink or hardlink """
+    opener: Callable[[], IO[bytes]] = None
+    """ Opens the content of a file """
+
+def _tar_members(tar: tarfile.TarFile) -> Iterator[_Member]:
+    for info in tar:
+        if info.isreg():
+            yield _Member(info.name, "file", info.mode, info.mtime, opener = functools.partial(tar.extractfile, info))
+        elif info.isdir():
+            yield _Member(info.name, "dir", info.mode, info.mtime)
+        elif info.issym():
+            yield _Member(info.name, "symlink", info.mode, info.mtime, link = info.linkname)
+        elif info.islnk():
+            yield _Member(info.name, "hardlink", info.mode, info.mtime, link = info.linkname)
+        else:
+            raise ValueError(f'Can\'t unpack "{info.name}", only regular files, directories, and links are supported.')
+
+def _zip_members(zip: zipfile.ZipFile) -> Iterator[_Member]:
+    for info in zip.infolist():
+        unix_mode = info.external_attr >> 16 # Unix mode and file type, if the zip was made on Unix
+        mode = unix_mode & 0o7777
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        if info.is_dir():
+            yield _Member(info.filename, "dir", mode or 0o755, mtime)
+        elif stat.S_ISLNK(unix_mode): # Zip stores the target as the content of the link
+            yield _Member(info.filename, "symlink", mode, mtime, link = zip.read(info).decode(errors = "surrogateescape"))
+        else:
+            yield _Member(info.filename, "file", mode or 0o644, mtime, opener = functools.partial(zip.open, info))
+
+def _relative_path(name: str) -> PurePosixPath:
+    """ Returns the normalized path of an archive member, or raises if it would be outside of the destination folder. """
+    path = PurePosixPath(os.path.normpath(name))
+    if path.is_absolute() or path.parts[:1] == ("..",):
+        raise ValueError(f'Can\'t unpack "{name}", it is outside of the destination folder.')
+    return path
+
+def _id(name: Union[str, int], lookup: Callable[[str], int]) -> int:
+    """ Converts a user or group name to an id for `os.chown()`. None becomes -1, which leaves it unchanged. """
+    if name == None: return -1
+    return lookup(name) if isinstance(name, str) else name
+
+def _make_symlinks(dest: File, links: List[Tuple[str, File, PurePosixPath]], owner: Union[str, int], group: Union[str, int]):
+    """
+    Makes the symlinks of an archive, as (name, file, link) tuples. The link targets are only checked lexically as they
+    are read, and links can point through each other, e.g. `a -> .` and `b -> a/..`, so once they are all made they are
+    resolved on disk. Removes them and raises if any point outside of dest.
+    """
+    for name, file, link in links:
+        if file.is_symlink() or file.exists(): file.unlink()
+        file.symlink_to(link)
+
+    root = os.path.realpath(dest)
+    for name, file, link in links:
+        if os.path.commonpath([root, os.path.realpath(file)]) != root:
+            for _, made, _ in links:
+                made.unlink()
+            raise ValueError(f'Can\'t unpack "{name}", it links outside of the destination folder.')
+
+    if owner != None or group != None:
+        with change_user("root"):
+            for _, file, _ in links:
+                os.chown(file, _id(owner, _uid), _id(group, _gid), follow_symlinks = False)
+
+def unpack(archive: PathLike, dest: File, *, owner: Union[str, int] = None, group: Union[str, int] = None,
+           file_mode: int = None, dir_mode: int = None, rename: bool = False) -> Dict[str, File]:
+    """ Extracts archive into dest. See `File.unpack()` """
+    renamed: Dict[PurePosixPath, str] = {} # Random names for each path in the archive, if rename is set
+
+    def target(path: PurePosixPath) -> File:
+        if not rename:
+            return dest / path
+        for i in range(1, len(path.parts) + 1):
+            sub = PurePosixPath(*path.parts[:i])
+            if sub not in renamed:
+                renamed[sub] = shell_adventure.api.rand().name() + "".join(sub.suffixes)
+        return dest.joinpath(*[renamed[PurePosixPath(*path.parts[:i])] for i in range(1, len(path.parts) + 1)])
+
+    opened: Union[zipfile.ZipFile, tarfile.TarFile]
+    if zipfile.is_zipfile(archive):
+        zip = zipfile.ZipFile(archive)
+        opened, members = zip, _zip_members(zip)
+    else:
+        tar = tarfile.open(archive) # Detects compression
+        opened, members = tar, _tar_members(tar)
+
+    created: Dict[str, File] = {}
+    regular: Set[str] = set() # The members that are regular files, which are the only ones that can be hardlinked
+    symlinks: List[PurePosixPath] = []
+    links: List[Tuple[str, File, PurePosixPath]] = [] # The symlinks to make after everything else, as (name, file, link)
+    # Set modes and owners at the end, so restrictive modes don't stop us from extracting the rest
+    files: List[Tuple[File, int]] = []
+    dirs: List[Tuple[File, int, float]] = []
+    parents: Set[File] = set() # Parent folders we've already made
+    with opened:
+        dest.mkdir(parents = True, exist_ok = True)
+        for member in members:
+            path = _relative_path(member.name)
+            if any(link in path.parents or link == path for link in symlinks): # Don't write through a link we made
+                raise ValueError(f'Can\'t unpack "{member.name}", it is under a symlink in the archive.')
+            file = target(path)
+            if path != PurePosixPath(".") and file.parent not in parents:
+                file.parent.mkdir(parents = True, exist_ok = True)
+                parents.add(file.parent)
+
+            if member.kind == "dir":
+                file.mkdir(exist_ok = True)
+                dirs.append((file, dir_mode if dir_mode != None else member.mode & 0o7777, member.mtime))
+            elif member.kind == "file":
+                with member.opener() as src, open(file, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 2**20)
+                os.utime(file, (member.mtime, member.mtime))
+                files.append((file, file_mode if file_mode != None else member.mode & 0o7777))
+                regular.add(str(path))
+            elif member.kind == "symlink":
+                link = PurePosixPath(member.link)
+                if link.is_absolute():
+                    raise ValueError(f'Can\'t unpack "{member.name}", it links to an absolute path.')
+                link_target = _relative_path(str(path.parent / link)) # Raises if outside of the destination
+                if rename:
+                    link = PurePosixPath(os.path.relpath(target(link_target), file.parent))
+                links.append((member.name, file, link))
+                symlinks.append(path)
+            else: # hardlink to an earlier member
+                hardlink_target = str(_relative_path(member.link))
+                if hardlink_target not in created:
+                    raise ValueError(f'Can\'t unpack "{member.name}", it links to a file that isn\'t earlier in the archive.')
+                if hardlink_target not in regular:
+                    raise ValueError(f'Can\'t unpack "{member.name}", it links to a directory or symlink. Only regular files '
+                                      'can be hardlinked.')
+                if file.is_symlink() or file.exists(): file.unlink()
+                os.link(created[hardlink_target], file)
+                regular.add(str(path))
+            created[str(path)] = file
+
+        _make_symlinks(dest, links, owner, group)
+        # Set on the paths we extracted directly, instead of with a FileBatch that would open every file again.
+        # Files first, then directories deepest first, so that a restrictive mode doesn't stop us changing their contents.
+        dirs.sort(key = lambda d: len(d[0].parts), reverse = True)
+        with change_user("root"): # The owner may change
+            for file, mode in chain(files, ((file, mode) for file, mode, mtime in dirs)):
+                if owner != None or group != None:
+                    os.lchown(file, _id(owner, _uid), _id(group, _gid))
+                os.chmod(file, mode)
+            for file, mode, mtime in dirs: # Set after their contents are extracted, since that changes the mtime
+                os.utime(file, (mtime, mtime))
+    return created
@@ -0,0 +1,118 @@
+""" Auto-grades puzzles in the background when the files they depend on change. """
+from typing import Dict, List, Callable, Any
+import time, threading
+from shell_adventure.docker_side.fingerprint import fingerprint
+
+class _Watch:
+    """ The state of a puzzle being watched by `BackgroundGrader` """
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+        self.fingerprint: bytes = None
+        self.dirty = False # Whether the paths have changed since the checker last ran
+        self.checked = float("-inf") # When the checker last ran
+
+class BackgroundGrader:
+    """
+    Watches the paths that puzzles depend on in a background thread, and runs their checkers when they change. A change
+    has to be quiet for one interval before the checker is run, so a command that writes lots of files only causes one
+    run. The results are buffered until they are collected with `drain()`, so that they can be sent to the host in one
+    message.
+    """
+
+    interval: float
+    """ Seconds between checks for changes. """
+
+    MIN_CHECK_INTERVAL = 2.0
+    """ The checker of a puzzle won't be run more than once in this many seconds. """
+
+    def __init__(self, check: Callable[[str], Any], interval: float, lock: threading.Lock):
+        """
+        Create a `BackgroundGrader`. check is called with the id of a puzzle whose paths changed, and should return
+        something to buffer or None. lock is held while checking, and should be held by anything else that runs user
+        code, since checkers change the effective user of the whole process. It's also held while the watched puzzles
+        are read, so `watch()` and `drain()` should be called with it held. Call `start()` to start watching.
+        """
+        self.check = check
+        self.interval = interval
+        self._lock = lock
+        self._watched: Dict[str, _Watch] = {}
+        self._buffer: List[Any] = []
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self):
+        """ Start watching in a background thread. """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._loop, name = "BackgroundGrader", daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop watching. Can be called with the lock held. """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def watch(self, puzzles: Dict[str, List[str]]):
+        """
+        Sets the puzzles to watch, as a map of puzzle id to the paths it depends on. Puzzles that were already watched
+        keep their state. Should be called with the lock held.
+        """
+        old, self._watched = self._watched, {}
+        for id, paths in puzzles.items():
+            watch = old.get(id)
+            self._watched[id] = watch if watch and watch.paths == paths else _Watch(paths) # Paths change if regenerated
+
+    def drain(self) -> List[Any]:
+        """ Returns the results of the checks since the last call to `drain()`. Should be called with the lock held. """
+        results, self._buffer = self._buffer, []
+        return results
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def _acquire(self) -> bool:
+        """
+        Acquires the lock. Gives up and returns False if `stop()` is called while waiting, since whoever is stopping us
+        may be holding the lock.
+        """
+        while not self._lock.acquire(timeout = 0.1):
+            if self._stop_event.is_set():
+                return False
+        return True
+
+    def poll(self):
+        """
+        Check the watched puzzles for changes once, and run the checkers of the ones that have settled. The lock is only
+        held while running the checkers, so that fingerprinting large trees doesn't hold up messages from the host. A
+        checker run for the host can change the effective user meanwhile, but that can only cause an extra check.
+        """
+        now = time.monotonic()
+        if not self._acquire():
+            return
+        try:
+            watched = list(self._watched.items())
+        finally:
+            self._lock.release()
+
+        settled = []
+        for id, watch in watched: # Only this thread changes the watches, watch() replaces them
+            new_fingerprint = fingerprint(watch.paths)
+            if new_fingerprint != watch.fingerprint: # Wait until it stops changing
+                watch.fingerprint, watch.dirty = new_fingerprint, True
+            elif watch.dirty and now - watch.checked >= BackgroundGrader.MIN_CHECK_INTERVAL:
+                settled.append((id, watch))
+
+        if not self._acquire():
+            return
+        try:
+            for id, watch in settled:
+                if self._watched.get(id) is not watch: # No longer watched, or regenerated, while we fingerprinted
+                    continue
+                watch.dirty, watch.checked = False, now
+                result = self.check(id)
+                if result != None:
+                    self._buffer.append(result)
+        finally:
+            self._lock.release()
@@ -0,0 +1,112 @@
+""" Runs autograders in a separate process with time and resource limits. """
+from __future__ import annotations
+from typing import Dict, Tuple, Any, Union, TYPE_CHECKING
+from multiprocessing.connection import Connection
+import multiprocessing, resource, signal, math
+from shell_adventure.shared.tutorial_errors import *
+if TYPE_CHECKING:
+    from shell_adventure.docker_side.tutorial_docker import TutorialDocker
+
+def _vm_data() -> int:
+    """ Returns the size of the data segment of this process in bytes, which is what RLIMIT_DATA limits. """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmData:"):
+                return int(line.split()[1]) * 1024 # In kB
+    return 0
+
+def _worker(conn: Connection, parent_conn: Connection, tutorial: TutorialDocker, memory_limit: float):
+    """ Runs in the worker process. Runs the checkers of the puzzles sent over conn until the connection closes. """
+    parent_conn.close()
+    if tutorial.profiler: # The worker is forked during a profiled SOLVE, but its stats would never be collected
+        tutorial.profiler.disable()
+    if memory_limit: # The worker starts with a copy of the tutorial's memory, so only limit what the checkers allocate
+        limit = _vm_data() + int(memory_limit * 2**20)
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+    while True:
+        try:
+            puzzle_id, args, cpu_limit = conn.recv()
+        except EOFError: # The tutorial closed the connection or exited
+            return
+
+        if cpu_limit: # CPU time adds up over all the checks, so set the limit from what we've used so far
+            used = resource.getrusage(resource.RUSAGE_SELF)
+            soft = math.ceil(used.ru_utime + used.ru_stime + cpu_limit)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+
+        try:
+            result: Union[Tuple[bool, str], UserCodeError] = tutorial._run_checker(tutorial.puzzles[puzzle_id], args)
+        except UserCodeError as e:
+            result = e
+        conn.send(result)
+
+class CheckerSandbox:
+    """
+    Runs the autograders of a `TutorialDocker` in a forked worker process, so that an autograder that hangs or uses
+    too much memory or CPU fails with a `UserCodeError` instead of freezing the tutorial. The worker is reused between
+    checks, and is only forked again after it is killed or `reset()` is called.
+    """
+
+    timeout: float
+    """ Seconds an autograder can run before it is killed. None for no limit. """
+
+    memory_limit: float
+    """ Megabytes of memory an autograder can allocate. None for no limit. """
+
+    cpu_limit: float
+    """ Seconds of CPU time an autograder can use. None for no limit. """
+
+    def __init__(self, tutorial: TutorialDocker, timeout: float = None, memory_limit: float = None, cpu_limit: float = None):
+        """ Create a `CheckerSandbox` for the tutorial. The worker is forked on the first check. """
+        self.tutorial = tutorial
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self._process: multiprocessing.Process = None
+        self._conn: Connection = None
+
+    def _start(self):
+        """ Forks the worker. It gets a copy of the tutorial with the current puzzles. """
+        context = multiprocessing.get_context("fork")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target = _worker, name = "CheckerSandbox", daemon = True,
+                                        args = (child_conn, self._conn, self.tutorial, self.memory_limit))
+        self._process.start()
+        child_conn.close()
+
+    def reset(self):
+        """
+        Kills the worker, if it's running. Call this when the puzzles change, since the worker only has the puzzles it
+        was forked with. The next check will fork a new one.
+        """
+        if self._process:
+            self._conn.close()
+            self._process.kill()
+            self._process.join()
+            self._process, self._conn = None, None
+
+    def check(self, puzzle_id: str, args: Dict[str, Any]) -> Tuple[bool, str]:
+        """ Runs the checker of the puzzle in the worker. Returns (success, feedback) like `TutorialDocker._run_checker()` """
+        template = self.tutorial.puzzles[puzzle_id].template
+        if not self._process:
+            self._start()
+
+        self._conn.send((puzzle_id, args, self.cpu_limit))
+        try:
+            finished = self._conn.poll(self.timeout)
+            result = self._conn.recv() if finished else None
+        except EOFError: # The worker died
+            self._process.join()
+            exitcode = self._process.exitcode
+            self.reset()
+            if exitcode == -signal.SIGXCPU:
+                raise UserCodeError(f"Puzzle autograder for template {template} used more than {self.cpu_limit} seconds of CPU time.")
+            raise UserCodeError(f"Puzzle autograder for template {template} was killed (exit code {exitcode}).")
+
+        if not finished:
+            self.reset()
+            raise UserCodeError(f"Puzzle autograder for template {template} timed out after {self.timeout} seconds.")
+        if isinstance(result, UserCodeError):
+            raise result
+        return result
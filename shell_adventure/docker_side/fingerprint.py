@@ -0,0 +1,37 @@
+""" Fingerprints files from their metadata, so we can tell if they've changed without reading them. """
+from typing import Iterable
+import os, stat, hashlib
+from shell_adventure.shared.support import PathLike
+
+def _add(digest, path: str):
+    """ Adds the metadata of path, and everything under it if it's a directory, to digest. """
+    try:
+        st = os.lstat(path)
+    except OSError as e: # Missing files are part of the fingerprint too
+        digest.update(f"{path}\0{type(e).__name__}\n".encode(errors = "surrogateescape"))
+        return
+
+    digest.update(
+        f"{path}\0{st.st_ino}\0{st.st_mode}\0{st.st_uid}\0{st.st_gid}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_ctime_ns}\n"
+            .encode(errors = "surrogateescape")
+    )
+    if stat.S_ISDIR(st.st_mode):
+        try:
+            with os.scandir(path) as it:
+                names = sorted(entry.name for entry in it)
+        except OSError as e:
+            digest.update(f"{path}/\0{type(e).__name__}\n".encode(errors = "surrogateescape"))
+            return
+        for name in names: # Doesn't follow symlinks, so it can't loop
+            _add(digest, os.path.join(path, name))
+
+def fingerprint(paths: Iterable[PathLike]) -> bytes:
+    """
+    Returns a digest of the inode, mode, owner, size, and modification and change times of each path, recursively for
+    directories. If any of the files are created, removed, written, renamed, or have their permissions changed the
+    fingerprint will change. Symlinks are not followed.
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    for path in paths:
+        _add(digest, os.fspath(path))
+    return digest.digest()
@@ -0,0 +1,83 @@
+""" Measures the resources used by setup scripts and puzzle templates during puzzle generation. """
+from typing import Tuple, Dict
+from pathlib import Path
+import sys, os, time, threading
+from shell_adventure.shared.generation_report import GenerationStats
+
+# Counts of (files, dirs) created by threads with an active recorder. Updated by an audit hook, since templates can
+# create files with open(), os, pathlib, shutil, etc.
+_created = [0, 0]
+# Number of active recorders by thread ident. The audit hook is process-wide, so it ignores other threads, like the
+# resource sampler and background grader, which can be running during generation.
+_active: Dict[int, int] = {}
+_hook_installed = False
+
+def _audit_hook(event: str, args: tuple):
+    if threading.get_ident() not in _active:
+        return
+    if event == "open":
+        path, mode, flags = args
+        # flags can be None for opening an existing file descriptor
+        if flags and flags & os.O_CREAT and isinstance(path, (str, bytes, os.PathLike)) and not os.path.lexists(path):
+            _created[0] += 1
+    elif event in ("os.symlink", "os.link"):
+        _created[0] += 1
+    elif event == "os.mkdir":
+        if not os.path.lexists(args[0]):
+            _created[1] += 1
+
+def _bytes_written() -> int:
+    """ Returns the bytes written by this process so far. Returns None if we can't read it. """
+    try:
+        for line in Path("/proc/self/io").read_text().splitlines():
+            if line.startswith("wchar:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class GenerationRecorder:
+    """
+    Context manager that records the wall time, CPU time, files and directories created, and bytes written while running
+    a setup script or puzzle template. The result is available in `stats` after the context exits. Only counts the
+    current process, so it doesn't include commands run with `os.system()` and the like, or other workers. Files and
+    directories are only counted if they are created by the thread the recorder was entered in.
+    """
+
+    stats: GenerationStats
+    """ The result. None until the context exits. """
+
+    def __init__(self, name: str, kind: str):
+        """ Create a recorder. name and kind will be set in the `GenerationStats` """
+        global _hook_installed
+        if not _hook_installed and hasattr(sys, "addaudithook"): # Python 3.8+
+            sys.addaudithook(_audit_hook) # Can't be removed, so we only install it once.
+            _hook_installed = True
+
+        self.name = name
+        self.kind = kind
+        self.stats = None
+
+    def _snapshot(self) -> Tuple[float, float, int, int, int]:
+        return (time.perf_counter(), time.process_time(), _created[0], _created[1], _bytes_written())
+
+    def __enter__(self):
+        thread = threading.get_ident()
+        _active[thread] = _active.get(thread, 0) + 1
+        self._start = self._snapshot()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = self._snapshot()
+        thread = threading.get_ident()
+        _active[thread] -= 1
+        if not _active[thread]:
+            del _active[thread]
+
+        wall, cpu, files, dirs, written = [(e - s) if e != None and s != None else None for e, s in zip(end, self._start)]
+        if not _hook_installed:
+            files = dirs = None
+        self.stats = GenerationStats(
+            name = self.name, kind = self.kind, wall_time = wall, cpu_time = cpu,
+            files_created = files, dirs_created = dirs, bytes_written = written,
+        )
@@ -0,0 +1,133 @@
+""" Samples the resource usage of the student's shell session from /proc. """
+from typing import Dict, List, Tuple, Deque
+from collections import deque
+from pathlib import Path
+import os, time, threading
+from shell_adventure.shared.resource_usage import ResourceSample
+
+class ResourceSampler:
+    """
+    Samples the CPU, memory and disk I/O of a process tree at a regular interval in a background thread. Samples are
+    buffered until they are collected with `drain()`, so that they can be sent to the host in one message.
+    """
+
+    root_pid: int
+    """ The pid of the root of the process tree that will be sampled. """
+
+    interval: float
+    """ Seconds between samples. """
+
+    # Only keep the most recent samples if the host isn't collecting them, so we don't grow forever.
+    MAX_BUFFERED = 1000
+
+    _CLK_TCK = os.sysconf("SC_CLK_TCK")
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+    def __init__(self, root_pid: int, interval: float):
+        """ Create a `ResourceSampler`. Call `start()` to start sampling. """
+        self.root_pid = root_pid
+        self.interval = interval
+
+        self._buffer: Deque[ResourceSample] = deque(maxlen = ResourceSampler.MAX_BUFFERED)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread = None
+        # Map pid to the (cpu_ticks, read_bytes, write_bytes) of the process at the last sample. We keep track of them per
+        # process so that processes exiting between samples don't make the deltas go negative.
+        self._prev: Dict[int, Tuple[int, int, int]] = {}
+        self._prev_time: float = None
+
+    def start(self):
+        """ Start sampling in a background thread. """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target = self._loop, name = "ResourceSampler", daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling. """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def drain(self) -> List[ResourceSample]:
+        """ Returns the samples that have been taken since the last call to `drain()`. """
+        with self._lock:
+            samples = list(self._buffer)
+            self._buffer.clear()
+        return samples
+
+    def _loop(self):
+        self.sample() # Initialize the previous values
+        while not self._stop_event.wait(self.interval):
+            sample = self.sample()
+            with self._lock:
+                self._buffer.append(sample)
+
+    def _read_stats(self) -> Dict[int, Tuple[int, int, int]]:
+        """ Reads /proc for every process. Returns a map of pid to (ppid, cpu_ticks, rss_bytes) """
+        stats = {}
+        for proc in Path("/proc").iterdir():
+            if proc.name.isdigit():
+                try:
+                    stat = (proc / "stat").read_text()
+                except OSError: # Process exited
+                    continue
+                # The command name is in parenthesis and can contain spaces, so split after the last ")"
+                fields = stat[stat.rindex(")") + 2:].split()
+                # See "man proc". fields[0] is field 3 "state"
+                ppid, utime, stime, rss = int(fields[1]), int(fields[11]), int(fields[12]), int(fields[21])
+                stats[int(proc.name)] = (ppid, utime + stime, rss * ResourceSampler._PAGE_SIZE)
+        return stats
+
+    def _process_tree(self, stats: Dict[int, Tuple[int, int, int]]) -> List[int]:
+        """ Returns the pids in the tree under root_pid. Excludes the tutorial process and its children. """
+        children: Dict[int, List[int]] = {}
+        for pid, (ppid, _, _) in stats.items():
+            children.setdefault(ppid, []).append(pid)
+
+        exclude = os.getpid() # If the tutorial is a child of the shell, don't count ourselves.
+        tree, stack = [], [self.root_pid] if self.root_pid in stats else []
+        while stack:
+            pid = stack.pop()
+            if pid != exclude:
+                tree.append(pid)
+                stack.extend(children.get(pid, []))
+        return tree
+
+    @staticmethod
+    def _read_io(pid: int) -> Tuple[int, int]:
+        """ Returns (read_bytes, write_bytes) for the process. Returns (0, 0) if we can't read it. """
+        try:
+            io = dict(line.split(": ", 1) for line in Path(f"/proc/{pid}/io").read_text().splitlines())
+            return (int(io["read_bytes"]), int(io["write_bytes"]))
+        except (OSError, KeyError, ValueError):
+            return (0, 0)
+
+    def sample(self) -> ResourceSample:
+        """ Take a sample of the process tree now. """
+        now = time.time()
+        stats = self._read_stats()
+
+        current: Dict[int, Tuple[int, int, int]] = {}
+        cpu_ticks = memory = read_bytes = write_bytes = 0
+        for pid in self._process_tree(stats):
+            _, ticks, rss = stats[pid]
+            io = ResourceSampler._read_io(pid)
+            current[pid] = (ticks, *io)
+
+            # New processes count all their usage since they started
+            prev_ticks, prev_read, prev_write = self._prev.get(pid, (0, 0, 0))
+            cpu_ticks += max(ticks - prev_ticks, 0)
+            read_bytes += max(io[0] - prev_read, 0)
+            write_bytes += max(io[1] - prev_write, 0)
+            memory += rss
+
+        elapsed = (now - self._prev_time) if self._prev_time else 0
+        cpu_percent = 100 * (cpu_ticks / ResourceSampler._CLK_TCK) / elapsed if elapsed > 0 else 0.0
+        self._prev, self._prev_time = current, now
+
+        return ResourceSample(
+            time = now, cpu_percent = cpu_percent, memory = memory,
+            read_bytes = read_bytes, write_bytes = write_bytes, processes = len(current),
+        )
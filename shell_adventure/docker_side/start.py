@@ -1,14 +1,25 @@
 """
 Script to start the tutorial. Runs as a script, not a module.
+
+Normally the host runs this with `docker exec` after the container has started. If the image is preforked (see
+`docker_helper.prefork_options()`) this script is the entrypoint of the container instead, and is run as root with
+`start.py --prefork USER [--pycache-prefix PATH] -- COMMAND...`. It forks the tutorial server and then execs COMMAND as
+USER, so that the student's shell is still the main process of the container. The server does all its imports while
+the shell is starting, and only starts listening once the shell is running, so the host can send SETUP as soon as it
+can connect.
+
+`start.py --fill-cache [--content-index-dir PATH] -- FILE...` is run in a separate container to fill the cache volume.
+See `docker_helper.cache_volume()`
 """
-import sys
+from typing import List
+import sys, os
 sys.path.insert(0, "/usr/local") # Add to path so we can reference our modules
 from importlib.util import find_spec
 from shell_adventure.shared.support import sentence_list
+from shell_adventure.shared import messages
 
-
-if __name__ == "__main__":
-    # Check the the container has the python libraries we need.
+def missing_deps_error() -> str:
+    """ Check the the container has the python libraries we need. Returns an error message, or None if none are missing. """
     deps = {
         # import_name: pip_package_name
         "dill": "dill",
@@ -17,12 +28,129 @@ if __name__ == "__main__":
 
     missing_deps = [pip for imp, pip in deps.items() if find_spec(imp) == None]
     if missing_deps:
-        print(f'Package(s) {sentence_list(missing_deps, quote = True)} are not installed in the Docker image. Add the following line to your Dockerfile:')
-        print(f'  python3 -m pip --no-cache-dir install {", ".join(missing_deps)}')
-        sys.exit(1)
+        return (f'Package(s) {sentence_list(missing_deps, quote = True)} are not installed in the Docker image. Add the following line to your Dockerfile:\n' +
+                f'  python3 -m pip --no-cache-dir install {", ".join(missing_deps)}')
+    return None
+
+def serve_error(message: str):
+    """
+    Waits for the host to connect and responds to the first message with a ContainerStartupError. Returns once the host
+    disconnects, so that the container is still up while the host fetches the logs.
+    """
+    from multiprocessing.connection import Listener
+    from shell_adventure.shared.tutorial_errors import ContainerStartupError
+
+    with Listener(('0.0.0.0', messages.port), authkey = messages.conn_key) as listener:
+        with listener.accept() as conn:
+            conn.recv()
+            conn.send(ContainerStartupError(message))
+            try:
+                while True: conn.recv()
+            except EOFError:
+                pass
+
+def switch_user(spec: str):
+    """ Permanently switches the process to a user, given in "user[:group]" format like Docker's `--user` option. """
+    import pwd, grp
+    user, _, group = spec.partition(":")
+
+    try:
+        pw = pwd.getpwuid(int(user)) if user.isdigit() else pwd.getpwnam(user)
+        name, uid, gid, home = pw.pw_name, pw.pw_uid, pw.pw_gid, pw.pw_dir
+    except KeyError:
+        if not user.isdigit(): # Docker allows uids that aren't in passwd
+            raise ValueError(f"unable to find user {user}: no matching entries in passwd file")
+        name, uid, gid, home = None, int(user), 0, "/"
+
+    if group:
+        try:
+            gid = int(group) if group.isdigit() else grp.getgrnam(group).gr_gid
+        except KeyError:
+            raise ValueError(f"unable to find group {group}: no matching entries in group file")
+
+    if name: os.initgroups(name, gid)
+    else: os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+    os.environ.update(HOME = home, **({"USER": name, "LOGNAME": name} if name else {}))
 
+def prefork(user: str, command: List[str], pycache_prefix: str = None):
+    """ Forks the tutorial server, then replaces this process with command running as user. """
+    read_fd, write_fd = os.pipe() # Pipes aren't inheritable, so write_fd will close when we exec the shell.
 
+    if os.fork() == 0: # Child, runs the server
+        os.close(write_fd)
+        os.setsid() # Detach from the student's terminal so that Ctrl-C and the like don't reach us.
+        log = os.open(messages.prefork_log, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        os.dup2(log, 1)
+        os.dup2(log, 2)
+        if pycache_prefix:
+            sys.pycache_prefix = pycache_prefix # type: ignore # Python 3.8+
+
+        # Do all the slow imports while the shell is starting
+        error = missing_deps_error()
+        if not error:
+            import shell_adventure.docker_side.tutorial_docker
+
+        # Block until the shell has been exec'ed (EOF) or the parent sends us an error.
+        with os.fdopen(read_fd, "rb") as pipe:
+            error = pipe.read().decode() or error
+
+        if error:
+            print(error, flush = True)
+            serve_error(error)
+        else:
+            run_tutorial()
+    else: # Parent, becomes the student's shell
+        os.close(read_fd)
+        try:
+            switch_user(user)
+            os.execvp(command[0], command) # Only returns if it fails
+        except Exception as e:
+            os.write(write_fd, str(e).encode())
+            os.close(write_fd)
+            os.wait() # Keep the container alive until the server has reported the error to the host.
+            sys.exit(1)
+
+def fill_cache(content_files: List[str], content_index_dir: str = None):
+    """
+    Compiles the tutorial into the bytecode cache, and indexes the content files into content_index_dir. Should be run
+    with PYTHONPYCACHEPREFIX set to where the cache volume is mounted. Importing the server also caches the standard
+    library modules it uses.
+    """
+    import compileall
+    compileall.compile_dir("/usr/local/shell_adventure", quiet = 1)
+    if not missing_deps_error():
+        import shell_adventure.docker_side.tutorial_docker
+        from shell_adventure.api.content_index import ContentIndex
+        for file in content_files if content_index_dir else []:
+            ContentIndex(file, content_index_dir)
+
+def run_tutorial():
     from shell_adventure.docker_side.tutorial_docker import TutorialDocker
 
     with TutorialDocker() as tutorial:
-        tutorial.run()
\ No newline at end of file
+        tutorial.run()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Start the docker side of the tutorial.")
+    parser.add_argument("--prefork", metavar = "USER", help = "Fork the server and then exec COMMAND as USER")
+    parser.add_argument("--pycache-prefix", metavar = "PATH", help = "Where the preforked server should cache bytecode")
+    parser.add_argument("--fill-cache", action = "store_true", help = "Compile the tutorial into the bytecode cache and exit")
+    parser.add_argument("--content-index-dir", metavar = "PATH", help = "Where --fill-cache saves content indexes")
+    parser.add_argument("command", nargs = "*", help = "The command to exec with --prefork, or files to index with --fill-cache")
+    args = parser.parse_args()
+
+    if args.fill_cache:
+        fill_cache(args.command, args.content_index_dir)
+    elif args.prefork:
+        prefork(args.prefork, args.command, args.pycache_prefix)
+    else:
+        error = missing_deps_error()
+        if error:
+            print(error)
+            sys.exit(1)
+        run_tutorial()
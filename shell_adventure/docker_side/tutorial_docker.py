@@ -1,20 +1,42 @@
-from typing import Callable, List, Tuple, Dict, Any, cast
+from __future__ import annotations
+from typing import Callable, List, Tuple, Dict, Any, Union, cast
 from types import ModuleType
 from pathlib import Path, PurePath, PurePosixPath;
-import subprocess, os, pwd, copy
+import subprocess, os, pwd, copy, cProfile, multiprocessing, marshal, pickle, threading
 from multiprocessing.connection import Listener
 import importlib.util, inspect, traceback
+from itertools import chain
+from contextlib import contextmanager
 import shell_adventure # For access to globals
 from shell_adventure.shared import messages
 from shell_adventure.shared.messages import Message
-from shell_adventure.shared.support import PathLike, sentence_list, call_with_args, extra_func_params
-from shell_adventure.shared.puzzle import Puzzle, PuzzleTemplate
+from shell_adventure.shared.support import PathLike, Tree, sentence_list, call_with_args, extra_func_params
+from shell_adventure.shared.puzzle import Puzzle, PuzzleTemplate, is_independent
 from shell_adventure.shared.puzzle_data import PuzzleData
 from shell_adventure.shared.tutorial_errors import *
 import shell_adventure.api
 from shell_adventure.api.file import File
 from shell_adventure.api.permissions import change_user, user_exists
 from shell_adventure.api.random_helper import RandomHelper
+from shell_adventure.docker_side.resource_sampler import ResourceSampler
+from shell_adventure.shared.resource_usage import ResourceSample
+from shell_adventure.shared.generation_report import GenerationStats
+from shell_adventure.docker_side.generation_recorder import GenerationRecorder
+from shell_adventure.docker_side.fingerprint import fingerprint
+from shell_adventure.docker_side.background_grader import BackgroundGrader
+from shell_adventure.docker_side.checker_sandbox import CheckerSandbox
+
+_worker_tutorial: TutorialDocker = None
+""" The tutorial in a worker process generating independent puzzles. Set when the process is forked. """
+
+def _init_worker(tutorial: TutorialDocker):
+    """ Initializer for the worker processes. """
+    global _worker_tutorial
+    _worker_tutorial = tutorial
+
+def _generate_independent(key: str, template_name: str, part: int, parts: int) -> Tuple[PuzzleData, GenerationStats, List[str]]:
+    """ Runs in a worker process. See `TutorialDocker._generate_independent()` """
+    return _worker_tutorial._generate_independent(key, template_name, part, parts)
 
 class TutorialDocker:
     """ Contains the information for a running tutorial docker side. """
@@ -40,6 +62,21 @@ class TutorialDocker:
     rand: RandomHelper
     """ The RandomHelper which will be used when creating random files and folders. """
 
+    sampler: ResourceSampler
+    """ Samples the resource usage of the student's session. None if resource sampling is disabled. """
+
+    grader: BackgroundGrader
+    """ Auto-grades puzzles when the files they depend on change. None if auto-grading is disabled. """
+
+    sandbox: CheckerSandbox
+    """ Runs the autograders in a separate process with limits. None if autograders are run in this process. """
+
+    profiler: cProfile.Profile
+    """
+    Profiles the SETUP, RESTORE and SOLVE handlers. None if profiling is disabled. Autograders run in the `sandbox`
+    aren't included, since they run in another process.
+    """
+
     def __init__(self):
         """ Create a tutorial. You need to call setup() afterwards to actually set and generate the puzzles etc. """
         # We don't really do anything in here, the tutorial is initialized in the "setup" method when we are actually sent the settings.
@@ -49,6 +86,24 @@ class TutorialDocker:
         self.puzzles = {}
         self.shell_pid: int = 1 # The shell is the main process of the container which is always 1
         self.rand = None
+        self._templates: Dict[str, PuzzleTemplate] = {}
+        # Compiled code of the modules sent with restore(), by path. See `_load_templates()`
+        self._compiled_modules: Dict[str, bytes] = {}
+        # Child puzzle templates that haven't been generated yet, by the id of their parent puzzle, along with the random
+        # stream key of the parent. Only used with lazy generation.
+        self._pending: Dict[str, Tuple[str, List[Tree[str]]]] = {}
+        self._send_checkers = False # Whether to dill the checkers of puzzles we send to the host
+        # The random stream key of each puzzle and the names it got from rand, by puzzle id. Used to regenerate puzzles.
+        self._generation: Dict[str, Tuple[str, List[str]]] = {}
+        # The last checker result of puzzles with depends_on set, by puzzle id, along with the fingerprint of the paths,
+        # the flag and the cwd it was checked with.
+        self._checker_cache: Dict[str, Tuple[Tuple[bytes, str, Any], Tuple[bool, str]]] = {}
+        self.sampler = None
+        self.grader = None
+        self.sandbox = None
+        # Held while handling a message, so the grader doesn't run user code at the same time. See `BackgroundGrader`
+        self._lock = threading.Lock()
+        self.profiler = None
 
     def __enter__(self):
         return self
@@ -60,6 +115,12 @@ class TutorialDocker:
         """
         shell_adventure.api._home = None
         shell_adventure.api._rand = None
+        if self.sampler:
+            self.sampler.stop()
+        if self.grader:
+            self.grader.stop()
+        if self.sandbox:
+            self.sandbox.reset()
 
     def _call_user_func(self, func, args = {}) -> Any:
         """ For calling puzzle templates and checkers. Calls func with args, and sets the user and cwd. """
@@ -67,13 +128,20 @@ class TutorialDocker:
         with change_user(self.user):
             return call_with_args(func, args)
 
-    def _create_module(self, path: PurePath, code: str) -> ModuleType:
-        """ Constructs a module object from a string of python code. Executes the module. """
+    def _create_module(self, path: PurePath, code: str, compiled: bytes = None) -> ModuleType:
+        """
+        Constructs a module object from a string of python code. Executes the module. If compiled is given, it is the
+        marshalled code object of the module compiled by the host, and code is only used for tracebacks.
+        """
         spec = importlib.util.spec_from_loader(path.stem, loader = None)
         module = importlib.util.module_from_spec(spec)
-        # We don't want the puzzle modules to exist on disk, but exceptions from exec'ed strings don't have as much info
-        # If we compile the code with a special "filename", we can inject the file line info into any exceptions that are thrown.
-        compiled_code = compile(code, f"<string>:{path}", "exec")
+        if compiled:
+            compiled_code = marshal.loads(compiled)
+        else:
+            # We don't want the puzzle modules to exist on disk, but exceptions from exec'ed strings don't have as much info
+            # If we compile the code with a special "filename", we can inject the file line info into any exceptions that are thrown.
+            # dont_inherit so the modules don't get the __future__ imports of this file.
+            compiled_code = compile(code, f"<string>:{path}", "exec", dont_inherit = True)
 
         # execute module in home as user
         self._call_user_func(lambda: exec(compiled_code, module.__dict__))
@@ -145,24 +213,150 @@ class TutorialDocker:
         lines = traceback.format_list(frames) + traceback.format_exception_only(type(e), e)
         return "Traceback (most recent call last):\n" + "".join(lines)
 
-    def _dill_checker(self, puzzle: PuzzleData) -> PuzzleData:
-        """ Returns a packed version of the puzzle. Throws detailed error if pickling fails. """
+    def _dill_checker(self, puzzle: PuzzleData, independent: bool = False) -> PuzzleData:
+        """
+        Returns a packed version of the puzzle. Throws detailed error if pickling fails. Pass independent if the puzzle
+        is being packed to send it from a worker process, for a more helpful error message.
+        """
         try:
             return puzzle.checker_dilled()
         except Exception as e: # Quite a few things can go wrong, RecursionError, PickleError, TypeError...
+            if independent:
+                reason = ("Independent puzzle templates are generated in a separate process, so their autograder functions "
+                          "must be serializable using the dill module. Either remove the @independent decorator")
+            else:
+                reason = ("In order to use restart functionality, your autograder functions must be serializable using "
+                          "the dill module. Either set restart_enabled to False")
             raise UserCodeError(
-                f"Unpickleable autograder function in '{puzzle.template}'. In order to use restart functionality, your "
-                 "autograder functions must be serializable using the dill module. Either set restart_enabled to False "
-                 "or remove the unpickleable object. See https://dill.readthedocs.io/en/latest/index.html#major-features "
-                 "for what objects dill can serialize. The error dill threw was:\n\n" + format_exc_only(e)
+                f"Unpickleable autograder function in '{puzzle.template}'. {reason} or remove the unpickleable object. "
+                 "See https://dill.readthedocs.io/en/latest/index.html#major-features for what objects dill can serialize. "
+                 "The error dill threw was:\n\n" + format_exc_only(e)
             )
 
-    def _common_setup(self, home: PathLike = None, user: str = None, rand: RandomHelper = None, modules: Dict[PurePath, str] = {}):
+    def _load_templates(self):
+        """
+        Loads the puzzle templates from the modules if they haven't been loaded. restore() doesn't load them since they
+        are only needed if more puzzles are generated after a restart.
+        """
+        if not self._templates:
+            try:
+                modules_list = [self._create_module(PurePath(path), code, self._compiled_modules.get(path))
+                                for path, code in self.modules.items()]
+            except Exception as e:
+                raise UserCodeError(f'Puzzle generation failed:', tb_str = self._format_user_exc(e))
+            for module in modules_list:
+                self._templates.update( self._get_templates_from_module(module) )
+
+    def _generate_recorded(self, template_name: str, key: str, replay: List[str] = []) -> Tuple[PuzzleData, GenerationStats, List[str]]:
+        """
+        Generates a puzzle from the template with the given name using the random stream key, and records the resources
+        it used. replay is passed to `RandomHelper._record()`. Returns the puzzle, its stats, and the names it got from rand.
+        """
+        rand = shell_adventure.api._rand
+        rand._stream(key)
+        names = rand._record(replay)
+        try:
+            with rand._global_stream(key), GenerationRecorder(template_name, "template") as recorder:
+                puzzle = self._generate_puzzle(self._templates[template_name], template_name)
+        finally:
+            rand._drawn = None # Stop recording
+        return (puzzle, recorder.stats, names)
+
+    def _generate_independent(self, key: str, template_name: str, part: int, parts: int) -> Tuple[PuzzleData, GenerationStats, List[str]]:
+        """
+        Generates an independent puzzle template in a worker process. The template gets its own partition of the
+        names so it can't conflict with puzzles generated in other processes. key is the random stream of the puzzle.
+        Returns the puzzle with its checker dilled, its stats, and the names it used.
+        """
+        rand = self.rand._partition(part, parts)
+        shell_adventure.api._rand = rand
+        puzzle, stats, names = self._generate_recorded(template_name, key)
+        return (self._dill_checker(puzzle, independent = True), stats, names)
+
+    def _generate_puzzles(self, puzzles: List[str], prefix: str = "") -> List[Tuple[PuzzleData, PuzzleData, GenerationStats]]:
+        """
+        Generates the puzzles in order. Independent templates are generated in a pool of worker processes, while the
+        rest are generated one after another in this process. Each puzzle gets the random stream `"{prefix}{i}:{template}"`.
+        Returns a list of (puzzle, dilled_puzzle, stats) tuples in the same order as puzzles. dilled_puzzle will be None
+        for puzzles that weren't generated in a worker.
+        """
+        independent = [(i, template) for i, template in enumerate(puzzles) if is_independent(self._templates[template])]
+        results: Dict[int, Tuple[PuzzleData, PuzzleData, GenerationStats]] = {}
+        keys = [f"{prefix}{i}:{template}" for i, template in enumerate(puzzles)]
+
+        if not independent:
+            for i, template in enumerate(puzzles):
+                puzzle, stats, names = self._generate_recorded(template, keys[i])
+                results[i] = (puzzle, None, stats)
+                self._generation[puzzle.id] = (keys[i], names)
+        else:
+            # This process uses partition 0 of the names, and each independent template gets one of the others.
+            parts = len(independent) + 1
+            processes = min(len(independent), os.cpu_count() or 1)
+            # Fork so the workers inherit the loaded modules and templates, which can't be pickled.
+            with self._threads_stopped():
+                pool = multiprocessing.get_context("fork").Pool(processes, initializer = _init_worker, initargs = (self,))
+            with pool:
+                pending = {
+                    i: pool.apply_async(_generate_independent, (keys[i], template, part, parts))
+                    for part, (i, template) in enumerate(independent, start = 1)
+                }
+
+                rand = self.rand._partition(0, parts)
+                shell_adventure.api._rand = rand
+                for i, template in enumerate(puzzles):
+                    if i not in pending:
+                        puzzle, stats, names = self._generate_recorded(template, keys[i])
+                        results[i] = (puzzle, None, stats)
+                        self._generation[puzzle.id] = (keys[i], names)
+
+                used: List[str] = []
+                for i, result in pending.items():
+                    dilled, stats, names = result.get() # Reraises errors from the worker
+                    results[i] = (dilled.checker_undilled(), dilled, stats)
+                    self._generation[dilled.id] = (keys[i], names)
+                    used += names
+                rand._unpartition(used) # So later generation can use the names the workers didn't
+                self.rand = rand
+
+        return [results[i] for i in range(len(puzzles))]
+
+    @contextmanager
+    def _threads_stopped(self):
+        """
+        Stops the background threads while in the context. Use it while forking, since the child only gets a copy of
+        the thread that forked, and any locks the other threads were holding would stay locked in the child. The
+        thread we're running in is left alone, since the grader can generate unlocked puzzles itself.
+        """
+        stopped = []
+        try:
+            for thread in (self.sampler, self.grader):
+                if thread and thread._thread and thread._thread is not threading.current_thread():
+                    thread.stop()
+                    stopped.append(thread)
+            yield
+        finally:
+            for thread in stopped:
+                thread.start()
+
+    def _pack_puzzles(self, generated: List[Tuple[PuzzleData, PuzzleData, GenerationStats]]) -> List[PuzzleData]:
+        """ Converts the output of _generate_puzzles() into the PuzzleData to send to the host. """
+        if self._send_checkers:
+            # Pickle the checkers before sending. Throw detailed error if dill fails. Puzzles from workers are already pickled.
+            return [dilled if dilled else self._dill_checker(puzz) for puzz, dilled, stats in generated]
+        else: # Just strip out the checkers if we don't need to send them. We only need to send the checker if restart is enabled.
+            return [puzz.checker_stripped() for puzz, dilled, stats in generated]
+
+    def _common_setup(self, home: PathLike = None, user: str = None, rand: RandomHelper = None, modules: Dict[PurePath, str] = {},
+                      resource_sample_interval: float = None, auto_grade_interval: float = None,
+                      checker_limits: Dict[str, float] = None):
         """
         Does some shared setup between setup and restore methods.
         Sets home, user, rand, and modules. If home and user are None they default to home and user of the
         shell session. Checks if home and user are valid. And initializes the global variables needed for the
-        api to work.
+        api to work. Starts sampling resource usage if resource_sample_interval is given, and auto-grading if
+        auto_grade_interval is given. If checker_limits is given, autograders are run in a `CheckerSandbox`, and it is
+        the timeout, memory_limit and cpu_limit args for it.
         """
         self.home = Path(home if home else self.student_cwd()).resolve()
         # see https://stackoverflow.com/questions/5327707/how-could-i-get-the-user-name-from-a-process-id-in-python-on-linux
@@ -180,76 +374,156 @@ class TutorialDocker:
         shell_adventure.api._home = File(self.home)
         shell_adventure.api._rand = self.rand
 
+        if resource_sample_interval:
+            self.sampler = ResourceSampler(self.shell_pid, resource_sample_interval)
+            self.sampler.start()
+        if auto_grade_interval:
+            self.grader = BackgroundGrader(self._auto_grade, auto_grade_interval, self._lock)
+            self.grader.start()
+        if checker_limits:
+            self.sandbox = CheckerSandbox(self, checker_limits.get("timeout"), checker_limits.get("memory_limit"),
+                                          checker_limits.get("cpu_limit"))
 
     ### Message actions, these functions can be called by sending a message over the connection
 
     def setup(self, *, home: PathLike = None, user: str = None, setup_scripts: Dict[PurePath, str], modules: Dict[PurePath, str],
-              puzzles: List[str], name_dictionary: str, content_sources: List[str], send_checkers: bool) -> List[PuzzleData]:
+              puzzles: List[str], name_dictionary: str, content_sources: List[str], send_checkers: bool,
+              resource_sample_interval: float = None, seed: Union[int, str] = None,
+              compiled_modules: Dict[PurePath, bytes] = {}, content_files: List[str] = [],
+              content_index_dir: str = None, lazy_children: List[List[Tree[str]]] = None,
+              auto_grade_interval: float = None, checker_limits: Dict[str, float] = None,
+             ) -> Tuple[List[PuzzleData], List[GenerationStats], bytes]:
         """
         Initializes the tutorial with the given settings. Generates the puzzles in the modules. The
         initialization is done separate from the constructor so that it can be done after the connection
-        with the host is setup. Returns the generated puzzles as a list.
+        with the host is setup. If seed is given, each setup script and puzzle template gets its own random
+        stream derived from the seed, so generation is reproducible. compiled_modules maps setup scripts and
+        modules to their marshalled code objects if the host compiled them. Any not in it are compiled here.
+        content_files are paths to content sources mounted in the container, which are indexed and cached in
+        content_index_dir rather than sent as strings like content_sources.
+
+        If lazy_children is given, it is the trees of child puzzle templates of each puzzle in puzzles. Only puzzles are
+        generated now, and the children of a puzzle are generated when it is solved. See `generate_unlocked()`.
+
+        If auto_grade_interval is given, puzzles are checked in the background every auto_grade_interval seconds. See
+        `auto_grade()`. If checker_limits is given, autograders are run in a separate process with those limits. See
+        `CheckerSandbox`.
+
+        Returns the generated puzzles as a list, a report of the resources used by each setup script and puzzle
+        template, and the state restore() needs to generate more puzzles after a restart. The state is None unless
+        send_checkers is set.
         """
         # Unfortunately we have to have some package level variables allow File methods to access the RandomHelper and TutorialDocker
-        rand = RandomHelper(name_dictionary, content_sources)
-        self._common_setup(home, user, rand, modules = {**setup_scripts, **modules})
+        rand = RandomHelper(name_dictionary, content_sources, seed = seed, content_files = content_files, index_dir = content_index_dir)
+        self._common_setup(home, user, rand, modules = {**setup_scripts, **modules},
+                           resource_sample_interval = resource_sample_interval, auto_grade_interval = auto_grade_interval,
+                           checker_limits = checker_limits)
 
+        report: List[GenerationStats] = []
         try: # Run setup scripts
-            for path, script in setup_scripts.items(): self._create_module(path, script) # Execute the module
+            for i, (path, script) in enumerate(setup_scripts.items()):
+                rand._stream(f"setup:{i}")
+                with rand._global_stream(f"setup:{i}"), GenerationRecorder(str(path), "setup_script") as recorder:
+                    self._create_module(path, script, compiled_modules.get(path)) # Execute the module
+                report.append(recorder.stats)
         except Exception as e:
             raise UserCodeError(f'Setup scripts failed:', tb_str = self._format_user_exc(e))
     
         try: # Load modules
-            modules_list = [self._create_module(path, code) for path, code in modules.items()]
+            rand._stream("modules")
+            with rand._global_stream("modules"):
+                modules_list = [self._create_module(path, code, compiled_modules.get(path)) for path, code in modules.items()]
         except Exception as e:
             raise UserCodeError(f'Puzzle generation failed:', tb_str = self._format_user_exc(e))
 
         # Get puzzle templates from the modules
-        templates: Dict[str, PuzzleTemplate] = {}
+        self._templates = {}
         for module in modules_list:
-            templates.update( self._get_templates_from_module(module) )
+            self._templates.update( self._get_templates_from_module(module) )
 
-        unknown_puzzles = [p for p in puzzles if p not in templates]
+        all_puzzles = list(chain(puzzles, *chain(*lazy_children))) if lazy_children else puzzles
+        unknown_puzzles = [p for p in all_puzzles if p not in self._templates]
         if unknown_puzzles: raise ConfigError(f"Unknown puzzle template(s) {sentence_list(unknown_puzzles, quote = True)}")
 
         # Generate the puzzles
-        puzzle_list: List[PuzzleData] = [self._generate_puzzle(templates[template], template) for template in puzzles]
-        self.puzzles = {p.id: p for p in puzzle_list}
-
-        # Reset rand after generation is complete. You can't use it during the tutorial since we don't restore it on restart
+        generated = self._generate_puzzles(puzzles)
+        self.puzzles = {p.id: p for p, dilled, stats in generated}
+        report.extend(stats for p, dilled, stats in generated)
+        if lazy_children:
+            self._pending = {
+                p.id: (f"{i}:{p.template}/", children)
+                for i, ((p, dilled, stats), children) in enumerate(zip(generated, lazy_children)) if children
+            }
+
+        # Reset rand after generation is complete. Templates can only use it while they are being generated.
         shell_adventure.api._rand = None
 
-        if send_checkers:
-            # Pickle the checkers before sending. Throw detailed error if dill fails
-            puzzle_list = [self._dill_checker(puzz) for puzz in puzzle_list]
-        else: # Just strip out the checkers if we don't need to send them. We only need to send the checker if restart is enabled.
-            puzzle_list = [p.checker_stripped() for p in puzzle_list]
+        self._send_checkers = send_checkers
+        generation_state = None
+        if send_checkers: # The host will send this back on restart, since the snapshot doesn't include it.
+            generation_state = pickle.dumps((self.rand, self._pending, self._generation))
 
-        return puzzle_list
+        return (self._pack_puzzles(generated), report, generation_state)
 
-    def restore(self, *, home: PathLike = None, user: str = None, modules: Dict[PurePath, str], puzzles: List[PuzzleData]):
+    def restore(self, *, home: PathLike = None, user: str = None, modules: Dict[PurePath, str], puzzles: List[PuzzleData],
+                resource_sample_interval: float = None, generation_state: bytes = None, auto_grade_interval: float = None,
+                checker_limits: Dict[str, float] = None, compiled_modules: Dict[PurePath, bytes] = {}):
         """
         Restore the tutorial after we've loading a snapshot. This is for usage after a restart. Docker commit keeps all filesystem state, but
         we have to restart the container and processes. We don't need to regenerate the puzzles, but we do need to resend the puzzle objects
-        so we can use the checkers.
+        so we can use the checkers. puzzles should be the puzzles as they were generated in setup(), since that is the state of
+        the snapshot. generation_state is the state returned by setup(), which is needed to regenerate puzzles or generate
+        puzzles lazily. compiled_modules is like in setup(), and is used if the modules have to be loaded again.
         """
-        self._common_setup(home, user, modules = modules)
+        self._common_setup(home, user, modules = modules,
+                           resource_sample_interval = resource_sample_interval, auto_grade_interval = auto_grade_interval,
+                           checker_limits = checker_limits)
 
         # Convert the pickled checker back into a function
         self.puzzles = {p.id: p.checker_undilled() for p in puzzles}
+        self._checker_cache = {}
+        self._send_checkers = True # We only restore if restart is enabled
+        self._compiled_modules = {str(path): code for path, code in compiled_modules.items()}
+        if generation_state:
+            self.rand, self._pending, self._generation = pickle.loads(generation_state)
 
-    def solve_puzzle(self, puzzle_id: str, flag: str = None) -> Tuple[bool, str]:
+    def solve_puzzle(self, puzzle_id: str, flag: str = None, cwd: File = None) -> Tuple[bool, str]:
         """
         Tries to solve the puzzle with the given id.
-        Returns (success, feedback) and sets the Puzzle as solved if the checker succeeded.
+        Returns (success, feedback) and sets the Puzzle as solved if the checker succeeded. If the puzzle has depends_on
+        set and nothing it depends on has changed since it was last checked with the same args, the last result is
+        returned without running the checker. cwd is the student's cwd, if it's already known.
         """
         puzzle = self.puzzles[puzzle_id]
 
+        if "cwd" in puzzle.checker_args and not cwd:
+            cwd = self.student_cwd()
         args: Dict[str, Any] = {
             # "output": output,
             "flag": flag,
-            "cwd": self.student_cwd(),
+            "cwd": cwd if "cwd" in puzzle.checker_args else None,
         }
+
+        cache_key = None
+        if puzzle.depends_on != None:
+            cache_key = (fingerprint(puzzle.depends_on), flag, args["cwd"])
+            cached = self._checker_cache.get(puzzle_id)
+            if cached and cached[0] == cache_key:
+                puzzle.solved = cached[1][0]
+                return cached[1]
+
+        if self.sandbox:
+            solved, feedback = self.sandbox.check(puzzle_id, args)
+        else:
+            solved, feedback = self._run_checker(puzzle, args)
+
+        puzzle.solved = solved
+        if cache_key:
+            self._checker_cache[puzzle_id] = (cache_key, (solved, feedback))
+        return (solved, feedback)
+
+    def _run_checker(self, puzzle: PuzzleData, args: Dict[str, Any]) -> Tuple[bool, str]:
+        """ Calls the checker of the puzzle with args. Returns (success, feedback). """
         try:
             checker_result = self._call_user_func(cast(Callable, puzzle.checker), args)
         except Exception as e:
@@ -258,22 +532,87 @@ class TutorialDocker:
                 tb_str = self._format_user_exc(e)
             )
 
-        solved = False
         if checker_result == True:
-            solved = True
-            feedback = "Correct!"
+            return (True, "Correct!")
         elif checker_result == False:
-            feedback = "Incorrect!"
+            return (False, "Incorrect!")
         elif isinstance(checker_result, str):
-            feedback = checker_result
+            return (False, checker_result)
         else:
             type_name = type(checker_result).__name__
             raise UserCodeError(
                 f'Autograder for puzzle template {puzzle.template} returned {type_name}, expected bool or str.'
             )
 
-        puzzle.solved = solved
-        return (solved, feedback)
+    def solve_puzzles(self, puzzles: List[Tuple[str, str]]) -> List[Union[Tuple[bool, str, List[PuzzleData]], TutorialError]]:
+        """
+        Tries to solve each puzzle in a list of (puzzle_id, flag) tuples in order. The student's cwd is only looked up
+        once. Returns a list of (success, feedback, unlocked) tuples like the SOLVE message. See `solve_puzzle()`. If
+        solving a puzzle raises a `TutorialError`, the error is returned in its place instead, so that the host still
+        gets the results of the other puzzles. The checkers are run one at a time, since they change the effective user
+        of the whole process, so this only saves round trips to the host.
+        """
+        cwd = None
+        if any("cwd" in self.puzzles[puzzle_id].checker_args for puzzle_id, flag in puzzles):
+            cwd = self.student_cwd()
+
+        results: List[Union[Tuple[bool, str, List[PuzzleData]], TutorialError]] = []
+        for puzzle_id, flag in puzzles:
+            try:
+                results.append((*self.solve_puzzle(puzzle_id, flag, cwd), self.generate_unlocked(puzzle_id)))
+            except TutorialError as e:
+                results.append(e)
+        return results
+
+    def generate_unlocked(self, puzzle_id: str) -> List[PuzzleData]:
+        """
+        Generates the children of the puzzle with the given id if it is solved and they haven't been generated yet.
+        Returns the new puzzles in order, or [] if there are none. Only does anything with lazy generation.
+        """
+        if not self.puzzles[puzzle_id].solved or puzzle_id not in self._pending:
+            return []
+        key, children = self._pending[puzzle_id]
+
+        shell_adventure.api._rand = self.rand
+        try:
+            self._load_templates()
+            generated = self._generate_puzzles([child.data for child in children], prefix = key)
+        finally:
+            shell_adventure.api._rand = None
+        del self._pending[puzzle_id] # Leave it pending if generation failed so solving again will retry
+
+        for i, ((puzzle, dilled, stats), child) in enumerate(zip(generated, children)):
+            self.puzzles[puzzle.id] = puzzle
+            if child.children:
+                self._pending[puzzle.id] = (f"{key}{i}:{puzzle.template}/", child.children)
+        if self.sandbox: # The worker doesn't have the new puzzles
+            self.sandbox.reset()
+        return self._pack_puzzles(generated)
+
+    def regenerate_puzzle(self, puzzle_id: str) -> PuzzleData:
+        """
+        Runs the template of the puzzle with the given id again, and replaces the puzzle. The new puzzle keeps the id, but
+        is unsolved. If the tutorial has a seed, the template gets the same random stream and the same names from rand as
+        before, so it generates the same puzzle. Otherwise it gets new names. Files the template made before aren't
+        removed, so templates should be able to run over their own files. Returns the new puzzle.
+        """
+        old = self.puzzles[puzzle_id]
+        key, names = self._generation[puzzle_id]
+
+        shell_adventure.api._rand = self.rand
+        try:
+            self._load_templates()
+            puzzle, stats, names = self._generate_recorded(old.template, key, replay = names if self.rand.seed != None else [])
+        finally:
+            shell_adventure.api._rand = None
+
+        puzzle.id = old.id
+        self.puzzles[puzzle.id] = puzzle
+        self._checker_cache.pop(puzzle.id, None)
+        if self.sandbox: # The worker has the old puzzle
+            self.sandbox.reset()
+        self._generation[puzzle.id] = (key, names)
+        return self._pack_puzzles([(puzzle, None, stats)])[0]
 
     def get_files(self, folder: PathLike) -> List[Tuple[bool, bool, PurePosixPath]]:
         """
@@ -297,6 +636,45 @@ class TutorialDocker:
         except: # if folder doesn't exist just return [] for now.
             return [] # TODO should we return None or something instead?
 
+    def auto_grade(self, puzzle_ids: List[str]) -> List[Tuple[str, str, List[PuzzleData]]]:
+        """
+        Sets the puzzles to auto-grade to the ones in puzzle_ids that have depends_on set and don't take a flag. Their
+        checkers are run in the background when something they depend on changes. Returns the puzzles that were solved
+        that way since the last call as (puzzle_id, feedback, unlocked) tuples like the SOLVE message. Returns [] if
+        auto-grading is disabled.
+        """
+        if not self.grader:
+            return []
+        puzzles = [self.puzzles[id] for id in puzzle_ids]
+        self.grader.watch({
+            p.id: p.depends_on for p in puzzles if p.depends_on != None and "flag" not in p.checker_args and not p.solved
+        })
+        return self.grader.drain()
+
+    def _auto_grade(self, puzzle_id: str) -> Tuple[str, str, List[PuzzleData]]:
+        """ Checks a puzzle for the grader. Returns (puzzle_id, feedback, unlocked) if it was solved, otherwise None. """
+        if self.puzzles[puzzle_id].solved: # Solved by the student since the grader was told to watch it
+            return None
+        try:
+            solved, feedback = self.solve_puzzle(puzzle_id)
+        except UserCodeError: # The student will see the error if they click "Solve"
+            return None
+        return (puzzle_id, feedback, self.generate_unlocked(puzzle_id)) if solved else None
+
+    def get_resource_samples(self) -> List[ResourceSample]:
+        """ Returns the resource usage samples taken since the last call. Returns [] if resource sampling is disabled. """
+        return self.sampler.drain() if self.sampler else []
+
+    def get_profile(self) -> Dict[Tuple[str, int, str], tuple]:
+        """
+        Returns the profile stats collected so far, in the format `pstats` uses, or None if profiling is disabled.
+        Profiling continues afterwards.
+        """
+        if not self.profiler:
+            return None
+        self.profiler.create_stats() # Also disables the profiler, runcall will enable it again.
+        return self.profiler.stats # type: ignore
+
     # The method is used both as a response to a message and in the puzzle code
     def student_cwd(self) -> File:
         """
@@ -309,6 +687,12 @@ class TutorialDocker:
 
     ### Other methods
 
+    def _profiled(self, func: Callable) -> Callable:
+        """ Wraps func so that its calls are profiled. Returns func unchanged if profiling is disabled. """
+        if not self.profiler:
+            return func
+        return lambda *args, **kwargs: self.profiler.runcall(func, *args, **kwargs)
+
     def run(self):
         """
         Sets up a connection between the tutorial inside the docker container and the driving application outside and
@@ -324,14 +708,27 @@ class TutorialDocker:
                         Message.RESTORE: self.restore,
                     }
                     message, *args = conn.recv()
+                    while message == Message.GET_PYTHON_MAGIC: # The host can ask before setup whether it can send compiled code
+                        conn.send(importlib.util.MAGIC_NUMBER)
+                        message, *args = conn.recv()
                     if message not in actions: raise ValueError(f"Expected initial SETUP or RESTORE message, got {message}.")
-                    conn.send(actions[message](**args[0]))
+                    kwargs = args[0]
+                    if kwargs.pop("profile", False):
+                        self.profiler = cProfile.Profile()
+                    conn.send(self._profiled(actions[message])(**kwargs))
 
                     actions = {
                         # Map message type to a function that will be called. The return of the lambda will be sent back to host.
-                        Message.SOLVE: self.solve_puzzle,
+                        # Send any puzzles the solve unlocked along with the result
+                        Message.SOLVE: self._profiled(lambda puzzle_id, flag = None:
+                            (*self.solve_puzzle(puzzle_id, flag), self.generate_unlocked(puzzle_id))),
+                        Message.SOLVE_MANY: self._profiled(self.solve_puzzles),
+                        Message.REGENERATE: self._profiled(self.regenerate_puzzle),
                         Message.GET_STUDENT_CWD: lambda: PurePosixPath(self.student_cwd()),
                         Message.GET_FILES: self.get_files,
+                        Message.GET_RESOURCE_SAMPLES: self.get_resource_samples,
+                        Message.AUTO_GRADE: self.auto_grade,
+                        Message.GET_PROFILE: self.get_profile,
                     }
 
                     while True: # Loop until connection ends.
@@ -341,7 +738,9 @@ class TutorialDocker:
                             return
                         else: # call the lambda with *args, send the return value.
                             if message not in actions: raise ValueError(f"Unrecognized message {message}.")
-                            conn.send(actions[message](*args))
+                            with self._lock:
+                                response = actions[message](*args)
+                            conn.send(response)
                 except TutorialError as e:
                     conn.send(e)
                 except BaseException as e: # Any other exception will get wrapped
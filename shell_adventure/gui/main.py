@@ -125,6 +125,9 @@ class ShellAdventureGUI(ThemedTk):
             )
             restart_button.pack(side = tk.LEFT)
 
+        check_all_button = ttk.Button(button_frame, text = "Check all", command = lambda: self.check_all())
+        check_all_button.pack(side = tk.LEFT)
+
         about = (
             'Welcome to the Shell Adventure command line tutorial! Complete the list of puzzles by entering commands in '
             'the detached terminal window and then clicking "Solve" when you think you\'ve completed the puzzle.\n'
@@ -186,6 +189,13 @@ class ShellAdventureGUI(ThemedTk):
             button.bind('<Return>', lambda e, p=puzzle: self.solve_puzzle(p)) # type: ignore
             button.grid(row = i, column = 1, padx = 5, sticky="S")
 
+            if not puzzle.solved:
+                regenerate_button = ttk.Button(self.puzzle_frame,
+                    image = self.icons["restart"],
+                    command = lambda p=puzzle: self.regenerate_puzzle(p), # type: ignore
+                )
+                regenerate_button.grid(row = i, column = 2, padx = (0, 5), sticky="S")
+
     def _tree_node_to_path(self, iid: str):
         """ Returns the path in the container that corresponds to the given Treeview node. """
         return PurePosixPath(iid if iid else self.file_tree_root)
@@ -269,7 +279,13 @@ class ShellAdventureGUI(ThemedTk):
                 # open all parents and scroll to (parents should already be open)
                 self.file_tree.see(self._path_to_tree_node(self.student_cwd)) # type: ignore
 
+        if self.tutorial.update_auto_grade():
+            self.update_puzzle_frame()
+            if self.tutorial.is_finished():
+                self.after_idle(self.finish_tutorial) # Let the update loop reschedule itself first
+
         self.score_label.set(f"Score: {self.tutorial.current_score()}/{self.tutorial.total_score()}")
+        self.tutorial.update_resources()
 
     def solve_puzzle(self, puzzle: PuzzleData):
         do_check = True
@@ -287,6 +303,27 @@ class ShellAdventureGUI(ThemedTk):
                 if self.tutorial.is_finished():
                     self.finish_tutorial()
 
+    def check_all(self):
+        """ Checks all the unlocked, unsolved puzzles that don't need a flag. """
+        puzzles = [p for p in self.tutorial.get_current_puzzles() if not p.solved and "flag" not in p.checker_args]
+        if not puzzles:
+            messagebox.showinfo("Feedback", "There are no puzzles to check.")
+            return
+
+        results = self.tutorial.solve_puzzles(puzzles)
+        solved = sum(solved for solved, feedback in results)
+        messagebox.showinfo("Feedback", f"Solved {solved} of {len(puzzles)} puzzle(s).")
+
+        if solved:
+            self.update_puzzle_frame()
+            if self.tutorial.is_finished():
+                self.finish_tutorial()
+
+    def regenerate_puzzle(self, puzzle: PuzzleData):
+        if messagebox.askokcancel("Regenerate", "Regenerate this puzzle? Its files will be recreated."):
+            self.tutorial.regenerate_puzzle(puzzle)
+            self.update_puzzle_frame()
+
     def restart(self):
         self.tutorial.restart()
         self.restart_callback()
@@ -1,14 +1,39 @@
 """
 This module contains methods for launching a container for the tutorial.
 """
-from typing import Union
-import docker, deepmerge
+from typing import Union, Dict, Any, List
+from pathlib import Path
+import docker, deepmerge, shlex, hashlib
 from docker.models.images import Image
 from docker.models.containers import Container
 from docker.errors import DockerException, ImageNotFound, NotFound
 from shell_adventure.shared import messages
 import shell_adventure
 
+CACHE_VOLUME = "shell-adventure-cache"
+""" The prefix of the names of the Docker volumes that persist caches such as Python bytecode. See `cache_volume()` """
+CACHE_PATH = "/var/cache/shell_adventure"
+""" The path the cache volume is mounted at, read-only, inside the container. """
+PYCACHE_PATH = f"{CACHE_PATH}/pycache"
+"""
+The folder inside the container that Python bytecode for the tutorial will be cached in. The package is mounted read-only
+so Python can't write `__pycache__` next to the sources.
+"""
+CONTENT_INDEX_PATH = f"{CACHE_PATH}/content_index"
+""" The folder inside the container that the paragraph indexes of content sources are cached in. """
+CONTENT_PATH = "/usr/local/shell_adventure_content"
+""" The folder inside the container that the content sources are mounted in. See `content_volumes()` """
+
+PREFORK_LABEL = "shelladventure.prefork"
+"""
+Images with this label set to "true" are "preforked". The tutorial server is started along with the container instead of
+with `docker exec` afterwards. See `prefork_options()`.
+"""
+START_SCRIPT = "/usr/local/shell_adventure/docker_side/start.py"
+""" The path to the script that starts the tutorial inside the container. """
+VARIANT_REPOSITORY = "shelladventure/variant"
+""" The repository the images of pre-generated tutorial variants are tagged in. See `variants.py` """
+
 try:
     client = docker.from_env()
 except DockerException as e:
@@ -22,14 +47,18 @@ def launch(image: Union[str, Image], **container_options) -> Container:
     with the default options to `Container.create()`. Returns the container. You can attach to the
     container to interact with the shell session inside. Make sure to `stop()` the container when 
     you are done with it (it will auto-remove once stopped).
+
+    The tutorial server's port is mapped to a free port on localhost so several tutorials can run at once. Use
+    `host_port()` to get it.
     """
+    image = get_image(image)
     container_options = deepmerge.always_merger.merge(dict(
         volumes = {
             shell_adventure.PKG_PATH: {'bind': f"/usr/local/shell_adventure", 'mode': 'ro'},
         },
         # network_mode = "host", # network_mode host doesn't work on Docker for Windows
-        # Map the port inside the container to localhost
-        ports = {messages.port: ('127.0.0.1', messages.port)},
+        # Map the port inside the container to a port on localhost that Docker picks
+        ports = {messages.port: ('127.0.0.1', None)},
         cap_add = [
             "CAP_SYS_PTRACE", # Allows us to call `pwdx` to get working directory of student
         ],
@@ -41,16 +70,108 @@ def launch(image: Union[str, Image], **container_options) -> Container:
         detach = True,
     ), container_options)
 
+    container: Container = client.containers.create(image, **container_options)
+    container.start()
+    return container
+
+def host_port(container: Container) -> int:
+    """ Returns the port on localhost that the tutorial server port of a container launched with `launch()` is mapped to. """
+    container.reload() # The port is assigned when the container starts
+    [binding] = container.ports[f"{messages.port}/tcp"]
+    return int(binding["HostPort"])
+
+def get_image(image: Union[str, Image]) -> Image:
+    """ Gets the image by name or id, pulling it if we don't have it locally. Returns image as is if it is already an `Image`. """
     if isinstance(image, str): # Pull the image or get the image
         try:
             image = client.images.get(image)
         except ImageNotFound as e: # If we don't have a local image pull it from online
             # We don't want to pull everytime since that it is very slow, especially on Windows
             image = client.images.pull(image) # Propagate any errors 
+    return image
 
-    container: Container = client.containers.create(image, **container_options)
-    container.start()
-    return container
+def is_preforked(image: Image) -> bool:
+    """ Returns True if the image has opted in to starting the tutorial server with the container. See `PREFORK_LABEL` """
+    return (image.labels or {}).get(PREFORK_LABEL, "").lower() == "true"
+
+def prefork_options(image: Image, container_options: Dict[str, Any], pycache: bool = True) -> Dict[str, Any]:
+    """
+    Returns a copy of container_options that will start the tutorial server along with the container. The container is
+    run as root with the tutorial start script as the entrypoint. The script forks the server, drops privileges to the
+    image's (or container_options') user, and then execs the original entrypoint and command. So the shell is still the
+    main process of the container, but the server is already imported and waiting by the time the container is up.
+    pycache should be False if the cache volume isn't mounted, so the server doesn't use a bytecode cache students
+    could change.
+    """
+    config = image.attrs["Config"]
+    def as_list(command) -> list: return shlex.split(command) if isinstance(command, str) else list(command or [])
+
+    user = container_options.get("user") or config.get("User") or "root"
+    entrypoint = as_list(container_options.get("entrypoint", config.get("Entrypoint")))
+    # Docker drops the image's CMD if the entrypoint is overridden, so we have to pass it explicitly.
+    command = as_list(container_options.get("command", config.get("Cmd")))
+
+    return {
+        **container_options,
+        "user": "root",
+        "entrypoint": ["python3", START_SCRIPT, "--prefork", user, *(["--pycache-prefix", PYCACHE_PATH] if pycache else []),
+                       "--", *entrypoint],
+        "command": command,
+    }
+
+def cache_volume(image: Image, content_sources: List[Path] = []) -> str:
+    """
+    Returns the name of a volume with the tutorial's bytecode compiled by the image's Python and the paragraph indexes of
+    the content sources, which should be mounted read-only at `CACHE_PATH`. The volume is filled by a separate container
+    the first time it's needed, since students have sudo in tutorial containers and could otherwise change the code later
+    tutorials run as root. Volumes are named by a hash of the image, the package files and the content sources, so a new
+    one is made when any of them change. Old ones can be removed with `docker volume prune`.
+
+    An empty volume with "-complete" added to the name is made once the volume has been filled, so a volume that is
+    still being filled or that failed part way isn't used. Filling is safe to run more than once at the same time, since
+    the files are written atomically. Returns None if the volume couldn't be filled.
+    """
+    key = hashlib.sha256(image.id.encode())
+    files = [(file.relative_to(shell_adventure.PKG_PATH).as_posix(), file)
+             for file in sorted(Path(shell_adventure.PKG_PATH).rglob("*.py"))]
+    files += list(zip(content_paths(content_sources), content_sources))
+    for path, file in files:
+        st = file.stat()
+        key.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    name = f"{CACHE_VOLUME}-{key.hexdigest()[:16]}"
+
+    try:
+        client.volumes.get(f"{name}-complete")
+    except NotFound:
+        volumes = file_volumes(dict(zip(content_sources, content_paths(content_sources))))
+        volumes[str(shell_adventure.PKG_PATH)] = {'bind': f"/usr/local/shell_adventure", 'mode': 'ro'}
+        volumes[name] = {'bind': CACHE_PATH, 'mode': 'rw'}
+        try:
+            client.containers.run(image, entrypoint = ["python3"],
+                command = [START_SCRIPT, "--fill-cache", "--content-index-dir", CONTENT_INDEX_PATH,
+                           "--", *content_paths(content_sources)],
+                user = "root", network_disabled = True, remove = True,
+                environment = {"PYTHONPYCACHEPREFIX": PYCACHE_PATH}, volumes = volumes,
+            )
+            client.volumes.create(f"{name}-complete")
+        except DockerException: # Tutorials will just be slower. The volume isn't marked complete so the next launch tries again.
+            return None
+    return name
+
+def file_volumes(files: Dict[Path, str]) -> Dict[str, Dict[str, str]]:
+    """
+    Returns the volumes option to mount each host file read-only at the given path in the container, so that the
+    container can read them directly instead of us sending them.
+    """
+    return {str(file): {'bind': path, 'mode': 'ro'} for file, path in files.items()}
+
+def content_paths(content_sources: List[Path]) -> List[str]:
+    """ Returns the paths in the container to mount the content sources at. """
+    return [f"{CONTENT_PATH}/{i}_{file.name}" for i, file in enumerate(content_sources)]
+
+def archive_paths(archives: List[Path]) -> List[str]:
+    """ Returns the paths in the container to mount the archives at. Templates get them by name with `api.archive()` """
+    return [f"{messages.archive_path}/{file.name}" for file in archives]
 
 def stop(container: Container, timeout: int = 2):
     """ Stops the container if its running and blocks until it gets autoremoved.  """
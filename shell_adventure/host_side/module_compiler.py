@@ -0,0 +1,28 @@
+""" Compiles puzzle modules and setup scripts on the host, so the container doesn't have to parse and compile them. """
+from typing import Dict
+from pathlib import PurePath
+import importlib.util, hashlib, marshal
+
+MAGIC_NUMBER = importlib.util.MAGIC_NUMBER
+"""
+The bytecode magic number of the host's Python. Compiled code can only be sent to a container whose Python has the same
+magic number.
+"""
+
+_cache: Dict[str, bytes] = {} # Marshalled code objects, keyed by hash of path and source.
+
+def compile_module(path: PurePath, source: str) -> bytes:
+    """
+    Compiles a module the same way `TutorialDocker._create_module` would and returns the marshalled code object. The
+    result is cached by a hash of the path and source, so the same module is only compiled once. Returns None if the
+    source has a syntax error, so that the container can compile it and report the error like other errors in user code.
+    """
+    key = hashlib.sha256(f"{path}\0{source}".encode()).hexdigest()
+    if key not in _cache:
+        try:
+            # Must match the filename used in the container, since it is used to reconstruct tracebacks.
+            code = compile(source, f"<string>:{path}", "exec", dont_inherit = True)
+        except (SyntaxError, ValueError):
+            return None
+        _cache[key] = marshal.dumps(code)
+    return _cache[key]
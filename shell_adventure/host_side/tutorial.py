@@ -1,7 +1,7 @@
 from __future__ import annotations
-from typing import Any, Generator, Iterator, List, Tuple, Dict, ClassVar
+from typing import Any, Generator, Iterator, List, Tuple, Dict, ClassVar, Union, TextIO
 from multiprocessing.connection import Client, Connection
-import docker, docker.errors, subprocess, os, pickle
+import docker, docker.errors, subprocess, os, pickle, csv, marshal, copy, deepmerge, hashlib, logging
 from docker.models.images import Image
 from docker.models.containers import Container
 from pathlib import Path, PurePath, PurePosixPath;
@@ -10,19 +10,29 @@ from itertools import chain
 from textwrap import indent
 import yaml, yamale
 from yamale.schema import Schema
-from . import docker_helper, PKG_PATH
+from . import docker_helper, module_compiler, PKG_PATH
 from shell_adventure.shared import messages
 from shell_adventure.shared.messages import Message
 from shell_adventure.shared.support import PathLike, retry, sentence_list, Tree
 from shell_adventure.shared.puzzle_data import PuzzleData
+from shell_adventure.shared.resource_usage import ResourceSample, peak_sample
+from shell_adventure.shared.generation_report import GenerationStats, format_report
 from shell_adventure.shared.tutorial_errors import *
 
+logger = logging.getLogger(__name__)
+
 class Tutorial:
     """ Contains the information for a running tutorial. """
 
     config_file: Path
     """ The path to the config file for this tutorial """
 
+    variant: Path
+    """
+    The file of a variant of the tutorial made with `variants.generate()` to launch, instead of generating the puzzles on launch.
+    None if the puzzles are generated on launch.
+    """
+
     data_dir: Path
     """ The folder that the config_file is in. Paths in the config_file are relative to here. """
 
@@ -50,15 +60,48 @@ class Tutorial:
     content_sources: List[Path]
     """ A list of files that will be used to generate text content in files. """
 
+    archives: List[Path]
+    """ A list of tar or zip archives that puzzle templates can unpack. They are mounted in the container. """
+
     puzzle_templates: List[Tree[str]]
     """ The tree of puzzles templates to use in this tutorial. """
 
+    lazy_generation: bool
+    """
+    Whether to only generate the root puzzles on launch. The children of a puzzle are generated in the container when it
+    is solved, and added to puzzles.
+    """
+
     restart_enabled: bool
     """ Whether restart is enabled or not. """
 
     show_tree: bool
     """ Whether to show the file tree in the GUI or not. """
 
+    log_dir: Path
+    """ A folder to save logs of each tutorial session in. None if logs shouldn't be saved. """
+
+    resource_sample_interval: float
+    """ Seconds between samples of the resource usage of the student's session. None if resource sampling is disabled. """
+
+    auto_grade_interval: float
+    """
+    Seconds between checks for changes to the files puzzles depend on, to auto-grade them. None if auto-grading is
+    disabled.
+    """
+
+    checker_limits: Dict[str, float]
+    """
+    The timeout, memory_limit and cpu_limit to run autograders with in a separate process. None if autograders aren't
+    limited.
+    """
+
+    seed: Union[int, str]
+    """ Seed for generating the random puzzles. Puzzles are generated the same way each launch if given. None if not set. """
+
+    profile: bool
+    """ Whether to profile puzzle generation and checkers in the container and save the stats to log_dir. """
+
     # Other fields
     container: Container
     """ The docker container that the student is in. """
@@ -66,20 +109,34 @@ class Tutorial:
     puzzles: List[Tree[PuzzleData]]
     """ The tree of generated PuzzleData for this tutorial. """
 
+    generation_report: List[GenerationStats]
+    """
+    The resources used by each setup script and puzzle template while generating the tutorial. Saved in log_dir if it's
+    set, otherwise printed when the tutorial starts.
+    """
+
     start_time: datetime
     """ Time the tutorial started. """
     end_time: datetime
     """ Time the tutorial ended. """
 
+    current_resources: ResourceSample
+    """ The most recent resource usage sample of the student's session. None if there hasn't been a sample yet. """
+    peak_resources: ResourceSample
+    """ The max of each field of the resource usage samples so far. None if there hasn't been a sample yet. """
+
     # Static fields
     CONFIG_SCHEMA: ClassVar[Schema] = yamale.make_schema(PKG_PATH / "config_schema.yaml")
     # Update the image tag if we update change the container. See .github/workflows/publish_image.yml for what tag we are pushing to
     DEFAULT_IMAGE: ClassVar[str] = "shelladventure/shell-adventure:v1.0"
+    # Bytecode magic number of the Python in each image we've launched, by image id. So we only ask once per image.
+    _python_magic: ClassVar[Dict[str, bytes]] = {}
 
-    def __init__(self, config_file: PathLike):
-        """ Create a tutorial from a config_file. """
+    def __init__(self, config_file: PathLike, variant: PathLike = None):
+        """ Create a tutorial from a config_file. If variant is given, the tutorial is launched from that variant. """
         self.config_file = Path(config_file).resolve()
         self.data_dir = self.config_file.parent
+        self.variant = Path(variant).resolve() if variant else None
 
         try:
             data = yamale.make_data(config_file) # Parse the YAML data
@@ -116,20 +173,64 @@ class Tutorial:
 
         self.content_sources = [get_path(f) for f in config.get("content_sources", [])]
 
+        archives: Dict[str, Path] = {}
+        for archive in config.get("archives", []):
+            archive = get_path(archive)
+            if archive.name in archives: # Templates get archives by name
+                raise ConfigError(f'Multiple archives with name "{archive.name}" found.')
+            archives[archive.name] = archive
+        self.archives = list(archives.values())
+
+        self.lazy_generation = config.get("lazy_generation", False)
         self.restart_enabled = config.get("restart_enabled", True) # PyYAML automatically converts to bool
         self.show_tree = config.get("show_tree", True)
 
+        log_dir = config.get("log_dir")
+        self.log_dir = get_path(log_dir) if log_dir else None
+        self.resource_sample_interval = config.get("resource_sample_interval") or None # 0 disables sampling
+        self.auto_grade_interval = config.get("auto_grade_interval") or None
+        self.checker_limits = { # 0 means no limit
+            "timeout": config.get("checker_timeout") or None,
+            "memory_limit": config.get("checker_memory_limit") or None,
+            "cpu_limit": config.get("checker_cpu_limit") or None,
+        }
+        if not any(self.checker_limits.values()):
+            self.checker_limits = None
+        self.seed = config.get("seed")
+        self.profile = config.get("profile", False)
+        if self.profile and not self.log_dir:
+            raise ConfigError("log_dir is required when profile is enabled.")
+
         self.container: Container = None
         self._conn: Connection = None # Connection to send messages to docker container.
         self._logs_stream: Generator[bytes, None, None] = None # The stream that contains the docker side tutorial output.
         self._logs: str = ""
+        # The options the container was first launched with. Restarts from the snapshot reuse them, since the snapshot
+        # image has the modified entrypoint of a preforked container.
+        self._launch_options: Dict[str, Any] = None
+        self._preforked = False # Whether the tutorial server is started with the container. See docker_helper.prefork_options
+        self._cached = False # Whether the cache volume is mounted. See docker_helper.cache_volume
+        self._image_id: str = None # Id of the image the current container was launched from
+        self._module_sources: Dict[PurePath, str] = None # Sources of the modules sent on setup, resent on restart for tracebacks
+        self._restarts = 0 # Number of times the tutorial has been restarted. Used to name the profile of each container.
         self._snapshot: Image = None # A docker commit of the image state right after puzzle generation.
+        # With lazy generation, the node of each puzzle whose children haven't been generated, and the child templates.
+        self._pending: Dict[str, Tuple[Tree[PuzzleData], List[Tree[str]]]] = {}
+        self._generation_state: bytes = None # State the container needs to generate more puzzles after a restart
+        self._initial_puzzles: Dict[str, PuzzleData] = {} # The puzzles as generated on setup, which the snapshot matches
+        # If set, the snapshot is kept as an image with this tag so the tutorial can be saved as a variant. See variants.py
+        self._variant_tag: str = None
 
         self.puzzles = [] # Populated after _start()
+        self.generation_report = None # Populated after _start()
 
         self.start_time = None
         self.end_time = None
 
+        self.current_resources = None
+        self.peak_resources = None
+        self._resource_log: TextIO = None # File object of the CSV log of resource samples
+
     def _parse_puzzles(self, puzzles) -> List[Tree[str]]:
         """
         Converts YAML output of puzzles into a tree of puzzles.
@@ -174,22 +275,51 @@ class Tutorial:
 
     def logs(self):
         """ Return the container logs so far as a string. """
-        if self._logs_stream != None:
+        if self._preforked and self.container:
+            try: # The preforked server writes its output to a file in the container.
+                _, output = self.container.exec_run(["cat", messages.prefork_log], user = "root")
+                self._logs = output.decode(errors = "replace")
+            except docker.errors.DockerException: # Container is already gone, return what we got last time.
+                pass
+        elif self._logs_stream != None:
             self._logs += "\n".join((l.decode(errors = "replace") for l in self._logs_stream))
         return self._logs
 
-    def _start_container(self, image: str):
+    def _start_container(self, image: Union[str, Image]):
         """ Starts the container and connects to it. """
         try:
-            self.container = docker_helper.launch(image, **self.container_options)
+            image = docker_helper.get_image(image)
+            if self._launch_options == None:
+                # Mount the content sources and archives so the container can read them as needed
+                volumes = docker_helper.file_volumes({
+                    **dict(zip(self.content_sources, docker_helper.content_paths(self.content_sources))),
+                    **dict(zip(self.archives, docker_helper.archive_paths(self.archives))),
+                })
+                cache = docker_helper.cache_volume(image, self.content_sources)
+                self._cached = cache != None
+                if self._cached:
+                    volumes[cache] = {'bind': docker_helper.CACHE_PATH, 'mode': 'ro'}
+                options = deepmerge.always_merger.merge({"volumes": volumes}, copy.deepcopy(self.container_options))
+                self._preforked = docker_helper.is_preforked(image)
+                if self._preforked:
+                    self._launch_options = docker_helper.prefork_options(image, options, pycache = self._cached)
+                else:
+                    self._launch_options = options
+            self.container = docker_helper.launch(image, **self._launch_options)
+            self._image_id = image.id
         except Exception as e: # If container_options causes an error just raise a ContainerStartupError
            raise ContainerStartupError(f"Tutorial container failed to start:\n{indent(str(e), '  ')}") #https://github.com/docker/docker-py/issues/2860
 
         try:
-            _, self._logs_stream = self.container.exec_run(["python3", "/usr/local/shell_adventure/docker_side/start.py"],
-                                                                      user = "root", stream = True)
+            if not self._preforked: # A preforked server is already running, and will accept once it has finished importing.
+                _, self._logs_stream = self.container.exec_run(["python3", docker_helper.START_SCRIPT],
+                    # Load bytecode from the cache volume so we don't recompile the tutorial on every start and restart.
+                    environment = {"PYTHONPYCACHEPREFIX": docker_helper.PYCACHE_PATH} if self._cached else {},
+                    user = "root", stream = True,
+                )
+            port = docker_helper.host_port(self.container)
             # retry the connection a few times since the container may take a bit to get started.
-            self._conn = retry(lambda: Client(('127.0.0.1', messages.port), authkey = messages.conn_key),
+            self._conn = retry(lambda: Client(('127.0.0.1', port), authkey = messages.conn_key),
                                tries = 20, delay = 0.2)
         except (docker.errors.DockerException, ConnectionError, EOFError, OSError) as e:
             raise ContainerStartupError(
@@ -199,6 +329,12 @@ class Tutorial:
 
     def _stop_container(self):
         """ Stops the container and remove it and the connection to it. """
+        if self._preforked and self.container:
+            self.logs() # Save the logs before the container and its log file are removed.
+
+        if self.profile and self._conn != None and self.start_time:
+            self._save_profile()
+
         if self._conn != None:
             try: self._conn.send( (Message.STOP,) )
             except: pass
@@ -212,36 +348,147 @@ class Tutorial:
         Starts the tutorial. Launches the container, sets up a connection and generates the puzzles. Used by
         the Tutorial context manager.
         """
+        try: # Docker would create a directory on the host if a mounted file didn't exist
+            for file in chain(self.content_sources, self.archives):
+                file.open("rb").close()
+        except OSError as e:
+            raise ConfigError(str(e))
+
+        if self.variant: # The puzzles have already been generated
+            self._start_variant()
+        else:
+            self._generate()
+
+        self.start_time = datetime.now()
+
+        if self.log_dir:
+            self._log_path("generation_report.txt").write_text(format_report(self.generation_report))
+        else:
+            print(format_report(self.generation_report))
+
+    def _generate(self):
+        """ Launches the container and generates the puzzles. """
         self._start_container(self.image)
 
         try:
             setup_scripts = {PurePath(file): file.read_text() for file in self.setup_scripts}
             modules = {PurePath(file): file.read_text() for file in self.module_paths}
             name_dictionary = self.name_dictionary.read_text()
-            content_sources = [file.read_text() for file in self.content_sources]
         except OSError as e: # some filesystem error
             raise ConfigError(str(e))
 
-        generated_puzzles: List[PuzzleData] = self._send(Message.SETUP, {
+        self._module_sources = modules
+        compiled_modules = self._compile_modules({**setup_scripts, **modules})
+
+        if self.lazy_generation: # Only generate the roots now
+            puzzles = [tree.data for tree in self.puzzle_templates]
+            lazy_children = [tree.children for tree in self.puzzle_templates]
+        else:
+            puzzles, lazy_children = list(chain(*self.puzzle_templates)), None
+
+        generated_puzzles: List[PuzzleData]
+        generated_puzzles, self.generation_report, self._generation_state = self._send(Message.SETUP, {
             "setup_scripts": setup_scripts,
             "modules": modules,
-            "puzzles": list(chain(*self.puzzle_templates)),
+            "compiled_modules": compiled_modules,
+            "puzzles": puzzles,
+            "lazy_children": lazy_children,
             "name_dictionary": name_dictionary,
-            "content_sources": content_sources,
+            "content_sources": [],
+            "content_files": docker_helper.content_paths(self.content_sources),
+            "content_index_dir": docker_helper.CONTENT_INDEX_PATH,
              # If restart is enabled, we need the checkers. Otherwise don't try to dill them and risk pickle errors
-            "send_checkers": self.restart_enabled,
+            "send_checkers": self.restart_enabled or self._variant_tag != None,
+            "resource_sample_interval": self.resource_sample_interval,
+            "auto_grade_interval": self.auto_grade_interval,
+            "checker_limits": self.checker_limits,
+            "profile": self.profile,
+            "seed": self.seed,
         })
 
         # Convert list of puzzles into tree of same structure as self.puzzle_templates
         def make_puzzles(templates: Tree[str], puzz_iter: Iterator[PuzzleData]) -> Tree[PuzzleData]:
             return Tree(next(puzz_iter), [make_puzzles(child, puzz_iter) for child in templates.children])
+        self._initial_puzzles = {puzzle.id: puzzle for puzzle in generated_puzzles}
         generated_iter = iter(generated_puzzles)
-        self.puzzles = [make_puzzles(tree, generated_iter) for tree in self.puzzle_templates]
+        if self.lazy_generation:
+            self.puzzles = [Tree(puzzle) for puzzle in generated_iter]
+            self._reset_pending()
+        else:
+            self.puzzles = [make_puzzles(tree, generated_iter) for tree in self.puzzle_templates]
+
+        if self._variant_tag: # Keep the snapshot as the image of the variant
+            self._snapshot = self._commit(docker_helper.VARIANT_REPOSITORY, self._variant_tag)
+        elif self.restart_enabled:
+            self._snapshot = self._commit()
+
+    def _start_variant(self):
+        """ Launches the container from the variant's image, and restores the puzzles that were generated in it. """
+        try:
+            with open(self.variant, "rb") as f:
+                variant = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            raise ConfigError(f'Couldn\'t load variant "{self.variant}": {e}')
+        if variant["config"] != self._config_digest():
+            raise ConfigError(f'Variant "{self.variant}" was generated from a different config file or puzzles.')
 
+        try:
+            image = docker_helper.client.images.get(variant["image"])
+        except docker.errors.ImageNotFound:
+            raise ConfigError(f'The image "{variant["image"]}" of variant "{self.variant}" doesn\'t exist.')
+
+        self.seed = variant["seed"]
+        self._launch_options = variant["launch_options"]
+        self._preforked = variant["preforked"]
+        self._cached = variant["cached"]
+        self._module_sources = variant["module_sources"]
+        self._generation_state = variant["generation_state"]
+        self.generation_report = variant["generation_report"]
+        self.puzzles = variant["puzzles"]
+        self._initial_puzzles = {puzzle.id: puzzle for puzzle in chain(*self.puzzles)}
+        if self.lazy_generation:
+            self._reset_pending()
         if self.restart_enabled:
-            self._snapshot = self._commit()
+            self._snapshot = image
 
-        self.start_time = datetime.now()
+        self._restore(image)
+
+    def _save_variant(self, file: Path):
+        """
+        Saves the puzzles to file so the tutorial can be launched from the snapshot later without generating them. Only
+        works if the tutorial was launched with _variant_tag set, and should be called right after launching. See
+        variants.py
+        """
+        file.parent.mkdir(parents = True, exist_ok = True)
+        with open(file, "wb") as f:
+            pickle.dump({
+                "config": self._config_digest(),
+                "seed": self.seed,
+                "image": f"{docker_helper.VARIANT_REPOSITORY}:{self._variant_tag}",
+                "launch_options": self._launch_options,
+                "preforked": self._preforked,
+                "cached": self._cached,
+                "module_sources": self._module_sources,
+                "generation_state": self._generation_state,
+                "generation_report": self.generation_report,
+                "puzzles": self.puzzles,
+            }, f)
+
+    def _config_digest(self) -> str:
+        """
+        Returns a hash of the config file and the setup scripts, modules, name dictionary, content sources and archives
+        it uses, to check that a variant was made from the same version of the tutorial.
+        """
+        files = [self.config_file, *self.setup_scripts, *self.module_paths, self.name_dictionary, *self.content_sources,
+                 *self.archives]
+        digest = hashlib.sha256()
+        try:
+            for file in files:
+                content = file.read_bytes()
+                digest.update(f"{len(content)}\n".encode() + content) # Prefix the length so the files can't run together
+        except OSError as e:
+            raise ConfigError(str(e))
+        return digest.hexdigest()
 
     def _stop(self):
         """
@@ -252,9 +499,12 @@ class Tutorial:
 
             self._stop_container()
 
-            if self._snapshot:
+            if self._snapshot and not (self.variant or self._variant_tag): # Variant images are kept
                 docker_helper.client.images.remove(image = self._snapshot.id)
 
+            if self._resource_log:
+                self._resource_log.close()
+
     def __enter__(self):
         """
         Launch a tutorial by using it as a context manager, which will launch the tutorial container, generate the puzzles,
@@ -276,33 +526,73 @@ class Tutorial:
         return subprocess.Popen(["docker", "attach", self.container.id])
 
 
-    def _commit(self):
+    def _commit(self, repository: str = "shelladventure/shell-adventure", tag: str = None):
         """ Return snapshot of the current state of the tutorial """
-        return self.container.commit("shelladventure/shell-adventure", f"snapshot-{datetime.now().timestamp()}")
+        return self.container.commit(repository, tag if tag else f"snapshot-{datetime.now().timestamp()}")
 
     def restart(self):
         """
         Restart the tutorial and the container to its initial state if possible. Does not regenerate the puzzles,
-        so any random values in the puzzles will be the same after the restart.
+        so any random values in the puzzles will be the same after the restart. Puzzles that were regenerated go back to
+        how they were first generated.
         """
         if self._snapshot:
             self._stop_container()
+            self._restarts += 1
 
-            self._start_container(self._snapshot) # Restart the tutorial.
+            if self.lazy_generation: # Puzzles generated after the snapshot don't exist anymore, they'll be generated again
+                for tree in self.puzzles:
+                    tree.children = []
+                self._reset_pending()
+
+            for node in self._puzzle_nodes(): # Undo regenerate_puzzle(), the snapshot has the puzzles from setup
+                node.data = self._initial_puzzles[node.data.id]
 
             for puzzle in self.get_all_puzzles(): # Set the puzzle solved state
                 puzzle.solved = False
 
-            try:
-                modules = {PurePath(file): file.read_text() for file in self.module_paths}
-            except OSError as e: # some filesystem error
-                raise ConfigError(str(e))
+            self._restore(self._snapshot) # Restart the tutorial.
+
+    def _restore(self, image: Image):
+        """ Launches the container from a snapshot image, and restores the puzzles in it. """
+        self._start_container(image)
+        self._send(Message.RESTORE, {
+            "modules": self._module_sources, # Only used for tracebacks, so send what we setup with even if the files changed.
+            "compiled_modules": self._compile_modules(self._module_sources), # In case more puzzles are generated
+            "puzzles": self.get_all_puzzles(),
+            "generation_state": self._generation_state,
+            "resource_sample_interval": self.resource_sample_interval,
+            "auto_grade_interval": self.auto_grade_interval,
+            "checker_limits": self.checker_limits,
+            "profile": self.profile,
+        })
+
+    def _reset_pending(self):
+        """ Marks the children of the root puzzles as not generated yet. Used with lazy generation. """
+        self._pending = {
+            node.data.id: (node, templates.children)
+            for node, templates in zip(self.puzzles, self.puzzle_templates) if templates.children
+        }
 
-            self._send(Message.RESTORE, {
-                "modules": modules,
-                "puzzles": self.get_all_puzzles(),
-            })
 
+    def _compile_modules(self, sources: Dict[PurePath, str]) -> Dict[PurePath, bytes]:
+        """
+        Compiles the modules on the host so the container doesn't have to. Compiled code only works with the same Python
+        version, so if the container's Python has a different bytecode magic number this returns {} and the container
+        compiles them itself.
+        """
+        if self._get_python_magic() != module_compiler.MAGIC_NUMBER:
+            logger.info("The container's Python has a different bytecode version than the host's, so modules will be "
+                        "compiled in the container.")
+            return {}
+        compiled = {path: module_compiler.compile_module(path, source) for path, source in sources.items()}
+        return {path: code for path, code in compiled.items() if code}
+
+    def _get_python_magic(self) -> bytes:
+        """ Returns the bytecode magic number of the Python in the container. Only asks the container once per image. """
+        if self._image_id not in Tutorial._python_magic:
+            Tutorial._python_magic[self._image_id] = self._send(Message.GET_PYTHON_MAGIC)
+        return Tutorial._python_magic[self._image_id]
 
     def get_current_puzzles(self) -> List[PuzzleData]:
         """ Returns a list of the currently unlocked puzzles. """
@@ -318,12 +608,83 @@ class Tutorial:
         """ Returns a list of all puzzles (In preorder sequence)."""
         return list(chain(*self.puzzles))
 
+    def _puzzle_nodes(self) -> Iterator[Tree[PuzzleData]]:
+        """ Iterates over the nodes of the puzzle trees in preorder. """
+        stack = list(reversed(self.puzzles))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
     def solve_puzzle(self, puzzle: PuzzleData, flag: str = None) -> Tuple[bool, str]:
-        """ Tries to solve the puzzle. Returns (success, feedback) and sets the Puzzle as solved if the checker succeeded. """
-        (solved, feedback) = self._send(Message.SOLVE, puzzle.id, flag)
-        puzzle.solved = solved
+        """
+        Tries to solve the puzzle. Returns (success, feedback) and sets the Puzzle as solved if the checker succeeded.
+        With lazy generation, the puzzles the solve unlocked are added to puzzles.
+        """
+        (solved, feedback, unlocked) = self._send(Message.SOLVE, puzzle.id, flag)
+        self._set_solved(puzzle, solved, unlocked)
         return (solved, feedback)
 
+    def solve_puzzles(self, puzzles: List[PuzzleData], flags: List[str] = None) -> List[Tuple[bool, str]]:
+        """
+        Tries to solve each of the puzzles with one request to the container, like `solve_puzzle()`. flags are the flags
+        to pass to each checker, None by default. Returns a list of (success, feedback) tuples in the same order. If
+        any of the autograders failed, the results of the others are still recorded before the first error is raised.
+        """
+        flags = flags if flags != None else [None] * len(puzzles)
+        results = self._send(Message.SOLVE_MANY, [(puzzle.id, flag) for puzzle, flag in zip(puzzles, flags)])
+        errors = [result for result in results if isinstance(result, TutorialError)]
+        for puzzle, result in zip(puzzles, results):
+            if not isinstance(result, TutorialError):
+                solved, feedback, unlocked = result
+                self._set_solved(puzzle, solved, unlocked)
+        if errors:
+            raise errors[0]
+        return [(solved, feedback) for solved, feedback, unlocked in results]
+
+    def _set_solved(self, puzzle: PuzzleData, solved: bool, unlocked: List[PuzzleData]):
+        """ Sets whether the puzzle is solved, and adds the puzzles that solving it generated to puzzles. """
+        puzzle.solved = solved
+        if unlocked:
+            node, templates = self._pending.pop(puzzle.id)
+            node.children = [Tree(child) for child in unlocked]
+            for child, child_templates in zip(node.children, templates):
+                if child_templates.children:
+                    self._pending[child.data.id] = (child, child_templates.children)
+
+    def update_auto_grade(self) -> List[PuzzleData]:
+        """
+        Tells the container which puzzles are unlocked and unsolved so it can auto-grade them when their files change,
+        and marks the puzzles it solved since the last call as solved. Returns those puzzles, or [] if auto-grading is
+        disabled. A puzzle that the student solved in the meantime is returned again if auto-grading it generated its
+        children, since they are only sent with the auto-grade result.
+        """
+        if not self.auto_grade_interval:
+            return []
+
+        unsolved = [puzzle.id for puzzle in self.get_current_puzzles() if not puzzle.solved]
+        results: List[Tuple[str, str, List[PuzzleData]]] = self._send(Message.AUTO_GRADE, unsolved)
+        puzzles = {puzzle.id: puzzle for puzzle in self.get_all_puzzles()}
+        solved = []
+        for puzzle_id, feedback, unlocked in results:
+            puzzle = puzzles[puzzle_id]
+            if not puzzle.solved or unlocked:
+                self._set_solved(puzzle, True, unlocked)
+                solved.append(puzzle)
+        return solved
+
+    def regenerate_puzzle(self, puzzle: PuzzleData) -> PuzzleData:
+        """
+        Generates the puzzle again, for if the student broke its files. Only runs the puzzle's template, instead of
+        restarting the whole tutorial. The new puzzle replaces the old one in puzzles and is returned. It has the same id,
+        but is unsolved. If the tutorial has a seed it will be the same puzzle, otherwise it may use different files.
+        """
+        new = self._send(Message.REGENERATE, puzzle.id)
+        for node in self._puzzle_nodes():
+            if node.data.id == puzzle.id:
+                node.data = new
+        return new
+
     def get_student_cwd(self) -> PurePosixPath:
         """ Get the path to the students current directory/ """
         return self._send(Message.GET_STUDENT_CWD)
@@ -336,13 +697,54 @@ class Tutorial:
         assert folder.is_absolute()
         return self._send(Message.GET_FILES, folder)
 
+    def _log_path(self, name: str) -> Path:
+        """ Returns the path to a log file for this session in log_dir. Creates log_dir if needed. """
+        self.log_dir.mkdir(parents = True, exist_ok = True)
+        return self.log_dir / f"{self.start_time:%Y-%m-%d_%H-%M-%S}_{name}"
+
+    def update_resources(self) -> List[ResourceSample]:
+        """
+        Collects the resource usage samples taken in the container since the last call, and updates current_resources
+        and peak_resources. If log_dir is set the samples are also appended to a CSV log for this session. Returns the
+        new samples.
+        """
+        if not self.resource_sample_interval:
+            return []
+
+        samples: List[ResourceSample] = self._send(Message.GET_RESOURCE_SAMPLES)
+        if samples:
+            self.current_resources = samples[-1]
+            self.peak_resources = peak_sample(filter(None, [self.peak_resources, *samples]))
+
+            if self.log_dir:
+                if not self._resource_log:
+                    self._resource_log = open(self._log_path("resources.csv"), "w", newline = "")
+                    csv.writer(self._resource_log).writerow(ResourceSample._fields)
+                csv.writer(self._resource_log).writerows(samples)
+                self._resource_log.flush()
+
+        return samples
+
+    def _save_profile(self):
+        """
+        Saves the profile stats of the current container to a `.pstats` file in log_dir, which can be loaded with
+        `pstats.Stats`. Each container is saved to a separate file, since a restart starts a new container.
+        """
+        try:
+            stats = self._send(Message.GET_PROFILE)
+        except TutorialError: # The container died, so we can't get the stats
+            return
+        name = "profile.pstats" if self._restarts == 0 else f"profile_restart{self._restarts}.pstats"
+        with open(self._log_path(name), "wb") as f:
+            marshal.dump(stats, f)
+
     def time(self) -> timedelta:
         """ Returns the time that the student has spend on the tutorial so far. """
         end_point = self.end_time if self.end_time else datetime.now()
         return (end_point - self.start_time)
 
     def total_score(self) -> int:
-        """ Returns the current score of the student. """
+        """ Returns the total score of the puzzles. With lazy generation, only counts puzzles that have been generated. """
         return sum((puz.score for puz in self.get_all_puzzles()))
 
     def current_score(self) -> int:
@@ -351,5 +753,5 @@ class Tutorial:
 
     def is_finished(self) -> bool:
         """ Return true if all the puzzles in the tutorial all solved. """
-        return all((puz.solved for puz in self.get_all_puzzles()))
+        return all((puz.solved for puz in self.get_all_puzzles())) and not self._pending
 
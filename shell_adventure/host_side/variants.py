@@ -0,0 +1,52 @@
+"""
+Generates variants of a tutorial ahead of time. Each variant is a snapshot image of a tutorial container with its
+puzzles already generated, and a file with the generated puzzles, so the tutorial can be launched from it without
+waiting for generation. Launch a variant with `Tutorial(config_file, variant = variant_file(store, id))`.
+"""
+from typing import List, Iterable, Any
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import re, hashlib, docker.errors
+from . import docker_helper
+from .tutorial import Tutorial
+from shell_adventure.shared.support import PathLike
+
+MAX_TAG_LENGTH = 128
+""" The longest tag Docker allows. """
+
+def variant_id(config_file: PathLike, seed: Any) -> str:
+    """
+    Returns the id of the variant of config_file generated with seed. The id is also the tag of its image, so characters
+    Docker doesn't allow in tags are replaced, and it's shortened if it's too long. A hash of the original is added if it
+    had to be changed, so that different ids stay different.
+    """
+    id = f"{Path(config_file).stem}-{seed}"
+    tag = re.sub(r"[^A-Za-z0-9_.-]", "_", id).lstrip(".-") # Tags can't start with "." or "-"
+    if tag != id or len(tag) > MAX_TAG_LENGTH:
+        digest = hashlib.sha256(id.encode(errors = "surrogateescape")).hexdigest()[:8]
+        tag = f"{tag[:MAX_TAG_LENGTH - len(digest) - 1] or 'variant'}-{digest}"
+    return tag
+
+def variant_file(store: PathLike, id: str) -> Path:
+    """ Returns the path of the file for the variant id in the store folder. """
+    return Path(store, f"{id}.variant")
+
+def generate(config_file: PathLike, store: PathLike, seed: Any) -> str:
+    """ Generates the variant of config_file with seed and saves it in the store folder. Returns the variant's id. """
+    id = variant_id(config_file, seed)
+    try: # Remove the image of an old variant with the same id
+        docker_helper.client.images.remove(f"{docker_helper.VARIANT_REPOSITORY}:{id}")
+    except docker.errors.ImageNotFound:
+        pass
+
+    tutorial = Tutorial(config_file)
+    tutorial.seed = seed
+    tutorial._variant_tag = id
+    with tutorial:
+        tutorial._save_variant(variant_file(store, id))
+    return id
+
+def generate_all(config_file: PathLike, store: PathLike, seeds: Iterable[Any], jobs: int = 4) -> List[str]:
+    """ Generates a variant for each seed, running up to jobs containers at once. Returns the ids of the variants. """
+    with ThreadPoolExecutor(jobs) as pool:
+        return list(pool.map(lambda seed: generate(config_file, store, seed), seeds))
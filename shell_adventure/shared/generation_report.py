@@ -0,0 +1,42 @@
+""" Contains the type used to report how long each part of puzzle generation took from the container to the host. """
+from typing import NamedTuple, List
+
+class GenerationStats(NamedTuple):
+    """ The resources used by running a single setup script or generating a single puzzle template. """
+
+    name: str
+    """ The name of the puzzle template, or the path of the setup script. """
+    kind: str
+    """ Either "setup_script" or "template". """
+    wall_time: float
+    """ Seconds it took. """
+    cpu_time: float
+    """ Seconds of CPU time used by the process generating it. """
+    files_created: int
+    """ The number of files created, including symlinks. None if it couldn't be measured. """
+    dirs_created: int
+    """ The number of directories created. None if it couldn't be measured. """
+    bytes_written: int
+    """ Bytes written by the process generating it. None if it couldn't be measured. """
+
+def format_report(report: List[GenerationStats]) -> str:
+    """
+    Formats a generation report as a table, with each entry's percentage of the total wall time. Independent templates
+    are generated in parallel, so the total can be more than the time puzzle generation actually took.
+    """
+    total = sum(stats.wall_time for stats in report)
+    def opt(value) -> str: return "?" if value == None else str(value)
+
+    header = ("Name", "Kind", "Wall (s)", "%", "CPU (s)", "Files", "Dirs", "Written (B)")
+    rows = [header] + [
+        (
+            stats.name, stats.kind, f"{stats.wall_time:.3f}", f"{100 * stats.wall_time / total if total else 0:.1f}",
+            f"{stats.cpu_time:.3f}", opt(stats.files_created), opt(stats.dirs_created), opt(stats.bytes_written),
+        )
+        for stats in report
+    ]
+    widths = [max(len(row[col]) for row in rows) for col in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) if col < 2 else cell.rjust(width) for col, (cell, width) in enumerate(zip(row, widths)))
+             for row in rows]
+    lines.append(f"Total: {total:.3f}s")
+    return "\n".join(lines) + "\n"
@@ -5,6 +5,10 @@ port = 6550
 """The port that will be used to communicate from the host to the container. """
 conn_key = b'shell-adventure'
 """The authkey that will be used in communication between the Docker code and the host app. """
+prefork_log = "/var/log/shell_adventure.log"
+""" The file a preforked tutorial server writes its output to inside the container, since its stdout would go to the student's terminal. """
+archive_path = "/usr/local/shell_adventure_archives"
+""" The folder in the container that the archives listed in the tutorial config are mounted in. """
 
 class Message(Enum):
     """
@@ -17,10 +21,35 @@ class Message(Enum):
     SETUP = 'SETUP'
     """ Send settings and puzzle modules. Generate puzzles. Usage: (SETUP, **kwargs) """
     SOLVE = 'SOLVE'
-    """ Solve a puzzle. Usage: (SOLVE, puzzle_id, [flag]) """
+    """
+    Solve a puzzle. Usage: (SOLVE, puzzle_id, [flag]). Responds with (solved, feedback, unlocked), where unlocked is a
+    list of the child puzzles that were generated because the puzzle was solved, if the tutorial uses lazy generation.
+    """
+    SOLVE_MANY = 'SOLVE_MANY'
+    """
+    Solve several puzzles in order, one at a time. Usage: (SOLVE_MANY, [(puzzle_id, flag), ...]). Responds with a list
+    of (solved, feedback, unlocked) tuples like SOLVE, with a TutorialError in place of the tuple of any puzzle that
+    failed.
+    """
+    REGENERATE = 'REGENERATE'
+    """ Run a puzzle's template again and replace the puzzle. Responds with the new PuzzleData. Usage: (REGENERATE, puzzle_id) """
     GET_STUDENT_CWD = 'GET_STUDENT_CWD'
     """ Get the path to the students current directory. Usage (GET_STUDENT_CWD,) """
     GET_FILES = 'GET_FILES'
     """ Get files under a folder. Usage (GET_FILES, folder) """
     RESTORE = 'RESTORE'
     """ Restore from a snapshot after a restart. Like SETUP, but we don't regenerate the puzzles. Usage: (RESTORE, **kwargs) """
+    GET_RESOURCE_SAMPLES = 'GET_RESOURCE_SAMPLES'
+    """ Get the resource usage samples taken since the last request. Usage (GET_RESOURCE_SAMPLES,) """
+    AUTO_GRADE = 'AUTO_GRADE'
+    """
+    Set the puzzles to auto-grade, and get the puzzles that were auto-graded as solved since the last request, as a
+    list of (puzzle_id, feedback, unlocked) tuples like SOLVE. Usage (AUTO_GRADE, puzzle_ids)
+    """
+    GET_PROFILE = 'GET_PROFILE'
+    """ Get the profile stats of the SETUP, RESTORE and SOLVE handlers if profiling is enabled. Usage (GET_PROFILE,) """
+    GET_PYTHON_MAGIC = 'GET_PYTHON_MAGIC'
+    """
+    Get the bytecode magic number of the container's Python, so the host knows if it can send compiled modules. Can
+    be sent before SETUP or RESTORE. Usage (GET_PYTHON_MAGIC,)
+    """
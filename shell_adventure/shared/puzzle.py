@@ -1,8 +1,9 @@
 # Logically this should be in the api module. But I can't import the api module from shared since that will cause circular dependencies issues and
 # since shared is used host-side and docker-side, cause api with Linux only modules to imported host-side.
 from __future__ import annotations
-from typing import Union, Callable, List, ClassVar
-from shell_adventure.shared.support import extra_func_params, UnrecognizedParamsError, sentence_list
+from typing import Union, Callable, List, ClassVar, Iterable
+import os
+from shell_adventure.shared.support import PathLike, extra_func_params, UnrecognizedParamsError, sentence_list
 
 class Puzzle:
     """ Represents a single puzzle in the tutorial. """
@@ -18,10 +19,16 @@ class Puzzle:
     The function that will be used to autograde the puzzle.
     """
 
+    depends_on: List[str]
+    """
+    The absolute paths that the checker depends on. If set, the checker's result is reused until one of the paths
+    changes. None if the checker should always be run.
+    """
+
     _allowed_checker_args: ClassVar[List[str]] = ["cwd", "flag"]
     """ A set of the checker args that are recognized. """
 
-    def __init__(self, question: str, checker: AutoGrader, score: int = 1):
+    def __init__(self, question: str, checker: AutoGrader, score: int = 1, depends_on: Iterable[PathLike] = None):
         """
         Construct a `Puzzle` object.
 
@@ -43,14 +50,21 @@ class Puzzle:
             False or a string, the puzzle was not solved. Returning a string will show the string as feedback to the student.
         score:
             The score given on success. Defaults to 1.
+        depends_on:
+            The files and folders the checker looks at. If given, the checker will only be run again if one of them, or
+            anything under them, has been created, deleted, modified or had its permissions changed since the last time
+            with the same flag (and cwd, if the checker takes it). Otherwise the last result is reused. Only use it if the
+            checker's result depends on nothing else. Relative paths are relative to the current directory.
         """
         if not isinstance(question, str): raise TypeError("Puzzle.question should be a string.")
         if not callable(checker): raise TypeError("Puzzle.checker should be a Callable.")
         if not isinstance(score, int): raise TypeError("Puzzle.score should be an int.")
+        if isinstance(depends_on, (str, os.PathLike)): raise TypeError("Puzzle.depends_on should be a list of paths.")
 
         self.question = question
         self.score = score
         self.checker = checker # type: ignore # MyPy fusses about "Cannot assign to a method"
+        self.depends_on = [os.path.abspath(path) for path in depends_on] if depends_on != None else None
 
         extra_params = extra_func_params(self.checker, Puzzle._allowed_checker_args)
         if extra_params:
@@ -62,3 +76,26 @@ class Puzzle:
 
 PuzzleTemplate = Callable[..., Puzzle]
 AutoGrader = Callable[..., Union[str,bool]]
+
+def independent(template: PuzzleTemplate) -> PuzzleTemplate:
+    """
+    Decorator that marks a puzzle template as independent of the other puzzles in the tutorial. Independent templates are
+    generated in parallel with the rest of the puzzles, in separate processes. To be independent a template should only
+    modify its own files. Shared folders aren't shared between the processes, so only use `File.random_shared_folder()`
+    under a folder that belongs to the template. Its autograder must also be serializable using the dill module, as it is
+    sent back from the worker process.
+
+    Example:
+    >>> @independent
+    ... def grep_puzzle(home: File):
+    ...     bulk = home / "bulk"
+    ...     for i in range(100):
+    ...         bulk.random_shared_folder().random_file("txt").create(content = rand().paragraphs())
+    ...     # ...
+    """
+    template._independent = True # type: ignore
+    return template
+
+def is_independent(template: PuzzleTemplate) -> bool:
+    """ Returns True if the template was marked with `independent`. """
+    return getattr(template, "_independent", False)
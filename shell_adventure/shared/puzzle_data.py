@@ -23,6 +23,9 @@ class PuzzleData:
     checker_args: List[str]
     """ The arguments of the checker function. """
 
+    depends_on: List[str]
+    """ The paths the checker depends on. See `Puzzle.depends_on` """
+
     id: str
     """ A unique identifier for the puzzle. """
 
@@ -38,6 +41,7 @@ class PuzzleData:
         self.score = puzzle.score
         self.checker = puzzle.checker
         self.checker_args = inspect.getfullargspec(self.checker).args
+        self.depends_on = puzzle.depends_on
 
         self.id = f"{template}-{uuid.uuid4()}"
         self.template = template
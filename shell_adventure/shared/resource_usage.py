@@ -0,0 +1,31 @@
+""" Contains the type used to report the resource usage of the student's session from the container to the host. """
+from typing import NamedTuple, Iterable
+
+class ResourceSample(NamedTuple):
+    """
+    A compact sample of the resources used by the student's shell session, summed over the shell and all its child
+    processes. CPU and disk I/O are measured since the previous sample.
+    """
+
+    time: float
+    """ Unix timestamp the sample was taken at. """
+    cpu_percent: float
+    """ CPU usage since the previous sample as a percentage of one core. Can be over 100 on multi-core machines. """
+    memory: int
+    """ Total resident memory of the processes in bytes. """
+    read_bytes: int
+    """ Bytes read from disk since the previous sample. """
+    write_bytes: int
+    """ Bytes written to disk since the previous sample. """
+    processes: int
+    """ The number of processes in the student's session. """
+
+def peak_sample(samples: Iterable[ResourceSample]) -> ResourceSample:
+    """
+    Returns a `ResourceSample` containing the max of each field over samples. The time will be the time of the latest
+    sample. Returns None if samples is empty.
+    """
+    samples = list(samples)
+    if not samples:
+        return None
+    return ResourceSample(*(max(field) for field in zip(*samples)))
@@ -0,0 +1,109 @@
+import pytest, os
+from pathlib import PurePath, Path
+from textwrap import dedent
+from shell_adventure.docker_side.tutorial_docker import TutorialDocker
+from shell_adventure.shared.tutorial_errors import *
+from shell_adventure.shared.support import Tree
+from .helpers import *
+
+PUZZLES = dedent("""
+    from shell_adventure.api import *
+    import os
+
+    def move():
+        File("A.txt").create()
+        return Puzzle(question = "Rename A.txt to B.txt", checker = lambda: File("B.txt").exists())
+
+    def pid():
+        return Puzzle(question = "pid", checker = lambda: str(os.getpid()))
+
+    def sleep():
+        def checker():
+            while True:
+                pass
+        return Puzzle(question = "Sleep", checker = checker)
+
+    def memory():
+        return Puzzle(question = "Memory", checker = lambda: bool(bytearray(200 * 2**20)))
+
+    def error():
+        return Puzzle(question = "Error", checker = lambda: 1 / 0)
+
+    def bad_return():
+        return Puzzle(question = "Bad", checker = lambda: 5)
+""")
+
+class TestCheckerSandbox:
+    def _setup_sandbox(self, tutorial: TutorialDocker, working_dir: Path, puzzles, **limits):
+        setup_tutorial(tutorial, working_dir,
+            modules = {PurePath("puzzles.py"): PUZZLES},
+            puzzles = [f"puzzles.{p}" for p in puzzles],
+            checker_limits = limits,
+        )
+        return list(tutorial.puzzles.values())
+
+    def test_solve(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            [move, pid] = self._setup_sandbox(tutorial, working_dir, ["move", "pid"], timeout = 5)
+
+            assert tutorial.solve_puzzle(move.id) == (False, "Incorrect!")
+            os.system("mv A.txt B.txt")
+            assert tutorial.solve_puzzle(move.id) == (True, "Correct!")
+            assert move.solved
+
+            [(_, first_pid)] = [tutorial.solve_puzzle(pid.id)]
+            assert int(first_pid) != os.getpid() # Runs in the worker
+            assert tutorial.solve_puzzle(pid.id) == (False, first_pid) # Worker is reused
+
+    def test_timeout(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            [sleep, pid] = self._setup_sandbox(tutorial, working_dir, ["sleep", "pid"], timeout = 0.5)
+            first_pid = tutorial.solve_puzzle(pid.id)[1]
+
+            with pytest.raises(UserCodeError, match = "puzzles.sleep timed out after 0.5 seconds"):
+                tutorial.solve_puzzle(sleep.id)
+            assert tutorial.solve_puzzle(pid.id)[1] != first_pid # A new worker is started
+
+    def test_cpu_limit(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            [sleep, pid] = self._setup_sandbox(tutorial, working_dir, ["sleep", "pid"], cpu_limit = 1)
+            with pytest.raises(UserCodeError, match = "puzzles.sleep used more than 1 seconds of CPU time"):
+                tutorial.solve_puzzle(sleep.id)
+            assert tutorial.solve_puzzle(pid.id)[0] == False # Still works
+
+    def test_memory_limit(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            [memory] = self._setup_sandbox(tutorial, working_dir, ["memory"], memory_limit = 50)
+            with pytest.raises(UserCodeError, match = "puzzles.memory failed") as exc_info:
+                tutorial.solve_puzzle(memory.id)
+            assert "MemoryError" in exc_info.value.tb_str
+
+        with TutorialDocker() as tutorial:
+            [memory] = self._setup_sandbox(tutorial, working_dir, ["memory"], memory_limit = 500)
+            assert tutorial.solve_puzzle(memory.id) == (True, "Correct!")
+
+    def test_errors(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            [error, bad_return] = self._setup_sandbox(tutorial, working_dir, ["error", "bad_return"], timeout = 5)
+            with pytest.raises(UserCodeError, match = "puzzles.error failed") as exc_info:
+                tutorial.solve_puzzle(error.id)
+            assert "ZeroDivisionError" in exc_info.value.tb_str
+            with pytest.raises(UserCodeError, match = "puzzles.bad_return returned int, expected bool or str"):
+                tutorial.solve_puzzle(bad_return.id)
+
+    def test_new_puzzles(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("puzzles.py"): PUZZLES},
+                puzzles = ["puzzles.pid"], lazy_children = [[Tree("puzzles.move")]],
+                checker_limits = {"timeout": 5},
+            )
+            [pid] = tutorial.puzzles.values()
+            tutorial.solve_puzzle(pid.id)
+            pid.solved = True # Checker returns feedback, so it's never solved
+            [move] = tutorial.generate_unlocked(pid.id)
+            assert tutorial.solve_puzzle(move.id) == (False, "Incorrect!") # Worker has the new puzzle
+
+            new = tutorial.regenerate_puzzle(move.id)
+            os.system("mv A.txt B.txt")
+            assert tutorial.solve_puzzle(new.id) == (True, "Correct!")
@@ -0,0 +1,79 @@
+import pytest, pickle
+from array import array
+from pathlib import Path
+from shell_adventure.api.content_index import ContentIndex, split_paragraphs
+from shell_adventure.api.permissions import change_user
+
+CONTENT = """
+Sentence a.  Sentence b.
+Sentence c.
+
+Sentence d. Sentence e.
+  \t
+   \n
+    Indented paragraph.
+
+
+Last paragraph."""
+
+class TestContentIndex:
+    def test_matches_split_paragraphs(self, working_dir: Path):
+        for content in [CONTENT, "One line.", "\n\n\n", "A\n\nB\n\n", "  \n  A  \n  \n  B"]:
+            file = working_dir / "content.txt"
+            file.write_text(content)
+            index = ContentIndex(file)
+            assert index[:] == split_paragraphs(content), repr(content)
+            assert len(index) == len(split_paragraphs(content))
+
+    def test_indexing(self, working_dir: Path):
+        (working_dir / "content.txt").write_text(CONTENT)
+        index = ContentIndex(working_dir / "content.txt")
+        assert index[0] == "Sentence a.  Sentence b.\nSentence c."
+        assert index[-1] == "Last paragraph."
+        assert index[1:3] == ["Sentence d. Sentence e.", "    Indented paragraph."]
+        with pytest.raises(IndexError):
+            index[4]
+
+    def test_empty(self, working_dir: Path):
+        (working_dir / "empty.txt").write_text("")
+        index = ContentIndex(working_dir / "empty.txt", working_dir / "cache")
+        assert len(index) == 0
+        assert index[:] == []
+
+    def test_cache(self, working_dir: Path):
+        cache = working_dir / "cache"
+        (working_dir / "a.txt").write_text(CONTENT)
+        (working_dir / "b.txt").write_text(CONTENT) # Same content, so it shares the index
+
+        index = ContentIndex(working_dir / "a.txt", cache)
+        [cache_file] = list(cache.iterdir())
+        assert ContentIndex(working_dir / "b.txt", cache)[:] == index[:]
+        assert list(cache.iterdir()) == [cache_file]
+
+        cache_file.write_bytes(index._offsets[:2].tobytes()) # The cached index is used instead of splitting the file again
+        assert ContentIndex(working_dir / "b.txt", cache)[:] == index[:1]
+
+        # An index that doesn't fit the file is rebuilt
+        for offsets in [[0, 0], [0, 5, 3, 10], [0, 1000], [0]]:
+            cache_file.write_bytes(array("Q", offsets).tobytes())
+            assert ContentIndex(working_dir / "b.txt", cache)[:] == index[:], offsets
+        cache_file.write_bytes(b"garbage")
+        assert ContentIndex(working_dir / "b.txt", cache)[:] == index[:]
+
+        (working_dir / "b.txt").write_text("Changed")
+        assert ContentIndex(working_dir / "b.txt", cache)[:] == ["Changed"]
+        assert len(list(cache.iterdir())) == 2
+
+    def test_read_only_cache(self, working_dir: Path):
+        cache = working_dir / "cache"
+        cache.mkdir(mode = 0o555)
+        (working_dir / "content.txt").write_text(CONTENT)
+        with change_user("student"): # Root can write anyway
+            assert ContentIndex(working_dir / "content.txt", cache)[:] == split_paragraphs(CONTENT)
+        assert list(cache.iterdir()) == []
+
+    def test_pickle(self, working_dir: Path):
+        (working_dir / "content.txt").write_text(CONTENT)
+        index = ContentIndex(working_dir / "content.txt")
+        unpickled = pickle.loads(pickle.dumps(index))
+        assert unpickled[:] == index[:]
@@ -1,5 +1,5 @@
 import pytest
-import stat
+import stat, os, random, subprocess
 from pathlib import Path
 from shell_adventure.api.file import File
 from shell_adventure.api.permissions import Permissions, change_user
@@ -59,6 +59,52 @@ class TestFile:
         assert file.exists()
         assert file.read_text() == "STUFF"
 
+    def test_create_sparse(self, working_dir: Path):
+        file = File("A/sparse.img").create_sparse(10**8)
+        assert file.stat().st_size == 10**8
+        assert file.stat().st_blocks * 512 < 10**6 # Not actually allocated (du shows it as nearly empty)
+        with open(file, "rb") as f:
+            assert f.read(10) == bytes(10)
+
+        file.create_sparse(10) # Truncates existing file
+        assert file.stat().st_size == 10
+
+    def test_create_preallocated(self, working_dir: Path):
+        file = File("A/prealloc.img").create_preallocated(10**7)
+        assert file.stat().st_size == 10**7
+        assert file.stat().st_blocks * 512 >= 10**7
+        assert file.read_bytes() == bytes(10**7)
+
+        file.create_preallocated(10)
+        assert file.stat().st_size == 10
+
+    def test_write_chunks(self, working_dir: Path):
+        file = File("chunks.txt")
+        assert file.write_chunks(["a", b"b", "c"]) == file
+        assert file.read_text() == "abc"
+
+        def infinite():
+            while True: yield "0123456789"
+        file.write_chunks(infinite(), size = 25)
+        assert file.read_text() == "0123456789" * 2 + "01234"
+
+        file.write_chunks(["abc"], size = 10) # Ran out of chunks
+        assert file.read_text() == "abc"
+
+        file.write_chunks(["aé", "é"], size = 4) # Doesn't cut the second é in half
+        assert file.read_text() == "aé"
+        file.write_chunks([b"\xff\xfe\xfd"], size = 2) # bytes are cut exactly
+        assert file.read_bytes() == b"\xff\xfe"
+
+        File("sub/dir/chunks.txt").write_chunks(["abc"])
+        assert File("sub/dir/chunks.txt").read_text() == "abc"
+
+    def test_write_paragraph_stream(self, working_dir: Path):
+        random = RandomHelper("", ["A\n\nB\n\nC\n"])
+        file = File("paragraphs.txt").write_chunks(random.paragraph_stream(1), size = 1000)
+        assert file.stat().st_size == 1000
+        assert set(file.read_text().split("\n\n")[:-1]) <= {"A", "B", "C"}
+
     def test_children(self, working_dir: Path):
         dir = File("dir")
         for name in ["A.txt", "B.txt", "C.txt"]:
@@ -91,6 +137,87 @@ class TestFile:
         file.chmod("g+w,u=x")
         assert file.permissions == 0o164
 
+    def test_chmod_symbolic(self, working_dir: Path):
+        file = File("a.txt").create(mode = 0o644)
+        dir = File("dir")
+        dir.mkdir(mode = 0o755)
+
+        file.chmod("a+X") # X only sets execute if a directory or already executable
+        assert file.permissions == 0o644
+        dir.chmod("go-x,a+X")
+        assert dir.permissions == 0o755
+
+        file.chmod("u+s,g+s,+t")
+        assert stat.S_IMODE(file.stat().st_mode) == 0o7644
+        file.chmod("=644") # Octal with an op
+        assert stat.S_IMODE(file.stat().st_mode) == 0o644
+
+        file.chmod("go=u-w") # Copy bits from another section
+        assert file.permissions == 0o644
+
+        old_umask = os.umask(0o027)
+        try:
+            file.chmod("=rwx") # Omitting who doesn't change bits in the umask
+            assert file.permissions == 0o750
+        finally:
+            os.umask(old_umask)
+
+        dir.chmod("g+s")
+        dir.chmod("755") # Directories keep setgid unless it is mentioned
+        assert stat.S_IMODE(dir.stat().st_mode) == 0o2755
+        dir.chmod("00755")
+        assert stat.S_IMODE(dir.stat().st_mode) == 0o755
+
+    def test_chmod_matches_gnu_chmod(self, working_dir: Path):
+        rng = random.Random(42)
+        def random_clause() -> str:
+            who = "".join(rng.choices("ugoa", k = rng.randint(0, 2)))
+            actions = ""
+            for i in range(rng.randint(1, 2)):
+                perms = rng.choice([
+                    "".join(rng.choices("rwxXst", k = rng.randint(0, 3))),
+                    rng.choice("ugo"),
+                    oct(rng.randint(0, 0o7777))[2:],
+                ])
+                actions += rng.choice("+-=") + perms
+            return who + actions
+        def random_mode() -> str:
+            if rng.random() < 0.1:
+                return oct(rng.randint(0, 0o7777))[2:].zfill(rng.randint(1, 5))
+            mode = ",".join(random_clause() for i in range(rng.randint(1, 3)))
+            if rng.random() < 0.1: # Some invalid modes
+                i = rng.randint(0, len(mode))
+                mode = mode[:i] + rng.choice(["", ",", "q", "8", "u", "+"]) + mode[i:]
+            return mode
+
+        ours, theirs = File("ours"), File("theirs")
+        old_umask = os.umask(0o022)
+        try:
+            for i in range(1000):
+                os.umask(rng.choice([0o000, 0o022, 0o027, 0o777]))
+                is_dir = rng.random() < 0.5
+                initial = rng.randint(0, 0o7777)
+                for file in (ours, theirs):
+                    file.mkdir() if is_dir else file.touch()
+                    os.chmod(file, initial)
+
+                mode = random_mode()
+                process = subprocess.run(["chmod", "--", mode, str(theirs)], stderr = subprocess.DEVNULL)
+                try:
+                    ours.chmod(mode)
+                    valid = True
+                except ValueError:
+                    valid = False
+
+                context = f"chmod {mode} on {'dir' if is_dir else 'file'} with mode {oct(initial)}"
+                assert valid == (process.returncode == 0), context
+                assert stat.S_IMODE(ours.stat().st_mode) == stat.S_IMODE(theirs.stat().st_mode), context
+
+                for file in (ours, theirs):
+                    file.rmdir() if is_dir else file.unlink()
+        finally:
+            os.umask(old_umask)
+
     def test_chmod_errors(self, working_dir: Path):
         file = File("a.txt")
 
@@ -0,0 +1,71 @@
+import pytest
+from pathlib import Path
+from shell_adventure.api.file import File
+from shell_adventure.api.file_batch import FileBatch
+from shell_adventure.api.permissions import change_user
+
+class TestFileBatch:
+    def test_batch(self, working_dir: Path):
+        with FileBatch() as batch:
+            a = batch.file("A/B/a.txt", content = "A")
+            b = batch.file(working_dir / "A/b.txt")
+            c = batch.dir("C")
+            assert not File("A").exists() # Nothing is created until the batch is applied
+
+        assert (a, b, c) == (File("A/B/a.txt"), File(working_dir, "A/b.txt"), File("C"))
+        assert a.read_text() == "A"
+        assert b.is_file() and b.read_text() == ""
+        assert c.is_dir()
+        assert File("A").permissions == 0o755 # New dirs use default mode, like File.create()
+
+    def test_existing_files(self, working_dir: Path):
+        File("a.txt").create(content = "OLD")
+        File("b.txt").create(content = "OLD")
+        File("dir/c.txt").create()
+
+        with FileBatch() as batch:
+            batch.file("a.txt") # Left as is
+            batch.file("b.txt", content = "NEW") # Overwritten
+            batch.dir("dir")
+
+        assert File("a.txt").read_text() == "OLD"
+        assert File("b.txt").read_text() == "NEW"
+        assert File("dir/c.txt").exists()
+
+        File("file").create()
+        with pytest.raises(FileExistsError):
+            with FileBatch() as batch:
+                batch.dir("file")
+
+    def test_modes_and_owners(self, working_dir: Path):
+        with change_user("student"):
+            with FileBatch() as batch:
+                batch.file("a.txt", mode = 0o600, owner = "root")
+                batch.file("b.txt", mode = "u+x", group = "root")
+                batch.dir("locked", mode = 0o500) # Set after the file under it is created
+                batch.file("locked/c.txt", owner = 0, group = 0)
+
+        assert (File("a.txt").owner(), File("a.txt").group(), File("a.txt").permissions) == ("root", "student", 0o600)
+        assert (File("b.txt").owner(), File("b.txt").group(), File("b.txt").permissions) == ("student", "root", 0o744)
+        assert File("locked").permissions == 0o500
+        assert (File("locked/c.txt").owner(), File("locked/c.txt").group()) == ("root", "root")
+
+    def test_tree(self, working_dir: Path):
+        FileBatch().tree("project", {
+            "README.md": "# Project\n",
+            "src": {
+                "main.py": None,
+                "lib": {},
+            },
+        }).apply()
+
+        assert File("project/README.md").read_text() == "# Project\n"
+        assert File("project/src/main.py").read_text() == ""
+        assert File("project/src/lib").is_dir()
+
+    def test_error_in_context(self, working_dir: Path):
+        with pytest.raises(ValueError):
+            with FileBatch() as batch:
+                batch.file("a.txt")
+                raise ValueError()
+        assert not File("a.txt").exists()
@@ -0,0 +1,50 @@
+import pytest
+from pathlib import Path
+import os, time, threading
+from shell_adventure.docker_side.generation_recorder import GenerationRecorder
+
+class TestGenerationRecorder:
+    def test_record(self, working_dir: Path):
+        (working_dir / "existing.txt").touch()
+
+        with GenerationRecorder("puzzles.move", "template") as recorder:
+            (working_dir / "A.txt").write_text("A" * 1000)
+            (working_dir / "existing.txt").write_text("overwritten") # Isn't created
+            (working_dir / "B.txt").touch()
+            os.makedirs(working_dir / "dir/nested")
+            (working_dir / "link").symlink_to("A.txt")
+            time.sleep(0.05)
+
+        stats = recorder.stats
+        assert (stats.name, stats.kind) == ("puzzles.move", "template")
+        assert (stats.files_created, stats.dirs_created) == (3, 2)
+        assert stats.bytes_written >= 1000
+        assert stats.wall_time >= 0.05
+        assert stats.cpu_time < stats.wall_time
+
+    def test_inactive(self, working_dir: Path):
+        with GenerationRecorder("a", "template") as recorder:
+            pass
+        (working_dir / "A.txt").touch() # Not counted when no recorder is active
+
+        with GenerationRecorder("b", "template") as recorder2:
+            with GenerationRecorder("c", "template") as recorder3: # Recorders can nest
+                (working_dir / "B.txt").touch()
+            (working_dir / "C.txt").touch()
+
+        assert recorder.stats.files_created == 0
+        assert recorder2.stats.files_created == 2
+        assert recorder3.stats.files_created == 1
+
+    def test_other_threads(self, working_dir: Path):
+        def create():
+            (working_dir / "other.txt").touch()
+
+        with GenerationRecorder("a", "template") as recorder:
+            thread = threading.Thread(target = create) # Like the background grader
+            thread.start()
+            thread.join()
+            (working_dir / "A.txt").touch()
+
+        assert (working_dir / "other.txt").exists()
+        assert recorder.stats.files_created == 1
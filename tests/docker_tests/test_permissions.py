@@ -2,7 +2,7 @@ import pytest
 from pathlib import Path
 from shell_adventure.api.file import File
 from shell_adventure.api.permissions import *
-import os, stat
+import os, stat, pwd
 
 class TestPermissions:
     def test_creating_permissions(self, working_dir: Path):
@@ -65,6 +65,72 @@ class TestPermissions:
 
         assert perms == Permissions(0o777)
 
+    def test_batch(self, working_dir: Path, monkeypatch):
+        file = File("file.txt")
+        file.create(mode = 0o000)
+
+        calls = []
+        real_stat, real_chmod = File.stat, File.chmod
+        def stat_spy(self, *args, **kwargs):
+            calls.append("stat")
+            return real_stat(self, *args, **kwargs)
+        def chmod_spy(self, mode):
+            calls.append("chmod")
+            return real_chmod(self, mode)
+        monkeypatch.setattr(File, "stat", stat_spy)
+        monkeypatch.setattr(File, "chmod", chmod_spy)
+
+        with file.permissions.batch() as perms:
+            for group in [perms.user, perms.group, perms.others]:
+                group.read = group.write = group.execute = True
+            assert perms.user.read == True
+            assert stat.S_IMODE(real_stat(file).st_mode) == 0o000 # Not written until the end
+        assert calls == ["stat", "chmod"]
+        assert stat.S_IMODE(real_stat(file).st_mode) == 0o777
+
+        calls.clear()
+        with file.permissions.batch() as perms:
+            perms.user.read = False
+            perms.user.read = True # No change, so no chmod
+        assert calls == ["stat"]
+
+        with pytest.raises(ValueError):
+            with file.permissions.batch() as perms:
+                perms.others.write = False
+                raise ValueError()
+        assert stat.S_IMODE(real_stat(file).st_mode) == 0o777 # Discarded
+
+        with file.permissions.batch() as perms:
+            with perms.batch():
+                perms.others.write = False
+            assert stat.S_IMODE(real_stat(file).st_mode) == 0o777 # Outer batch writes it
+        assert stat.S_IMODE(real_stat(file).st_mode) == 0o775
+
+    def test_snapshot(self, working_dir: Path, monkeypatch):
+        file = File("file.txt")
+        file.create(mode = 0o754)
+
+        calls = []
+        real_stat = File.stat
+        def stat_spy(self, *args, **kwargs):
+            calls.append("stat")
+            return real_stat(self, *args, **kwargs)
+        monkeypatch.setattr(File, "stat", stat_spy)
+
+        snapshot = file.permissions.snapshot()
+        assert calls == ["stat"]
+        assert not isinstance(snapshot, LinkedPermissions)
+        assert snapshot == Permissions(0o754)
+
+        file.chmod(0o000)
+        assert snapshot == 0o754 # Not linked
+
+        calls.clear()
+        assert int(file.permissions) == 0o000
+        assert str(file.permissions) == "---------"
+        assert int(file.permissions.user) == 0
+        assert calls == ["stat", "stat", "stat"]
+
     def test_permissions_group_equality(self):
         p = PermissionsGroup(True, True, False)
         assert p == PermissionsGroup(True, True, False)
@@ -136,6 +202,44 @@ class TestPermissions:
             assert os.geteuid() == 1000
         assert os.geteuid() == 0
 
+    def test_change_back_user_and_group(self):
+        student = pwd.getpwnam("student")
+        with change_user("student"):
+            with change_user("root", "student"):
+                assert (os.geteuid(), os.getegid()) == (0, student.pw_gid)
+                with change_user("student", "root"):
+                    assert (os.geteuid(), os.getegid()) == (student.pw_uid, 0)
+                assert (os.geteuid(), os.getegid()) == (0, student.pw_gid)
+            assert (os.geteuid(), os.getegid()) == (student.pw_uid, student.pw_gid)
+        assert (os.geteuid(), os.getegid()) == (0, 0)
+
+    def test_change_user_skips_switch(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(os, "seteuid", lambda uid: calls.append(("seteuid", uid)))
+        monkeypatch.setattr(os, "setegid", lambda gid: calls.append(("setegid", gid)))
+
+        with change_user("root"): # Already root
+            with change_user("root", "root"):
+                pass
+        assert calls == []
+
+        with change_user("student"):
+            calls.clear()
+            with change_user("student"): # Nested contexts don't need to switch again
+                pass
+            assert calls == []
+
+    def test_change_user_exception(self):
+        with pytest.raises(ValueError):
+            with change_user("student"):
+                raise ValueError()
+        assert (os.geteuid(), os.getegid()) == (0, 0)
+
+        with pytest.raises(KeyError):
+            with change_user("george"):
+                pass
+        assert (os.geteuid(), os.getegid()) == (0, 0)
+
     def test_system_call_change_user(self, working_dir: Path):
         with change_user("student"):
             os.system(f'touch a.txt')
@@ -1,6 +1,8 @@
 import pytest
+import random as random_module
 from pathlib import Path
 from shell_adventure.api.random_helper import RandomHelper, RandomHelperException
+from shell_adventure.api.file import File
 
 CONTENT_1 = """
 Sentence a.  Sentence b.  Sentence c.
@@ -34,9 +36,59 @@ class TestRandomHelper:
         assert random.name() in {"apple", "banana", "orange"}
         assert random.name() in {"apple", "banana", "orange"}
 
-        with pytest.raises(RandomHelperException, match="Out of unique names"):
+        with pytest.raises(RandomHelperException, match="Out of unique names. All 3 names"):
             random.name()
 
+    def test_name_unique(self):
+        names = [str(i) for i in range(1000)]
+        random = RandomHelper("\n".join(names))
+        assert sorted([random.name() for i in range(1000)], key = int) == names
+
+        with pytest.raises(RandomHelperException, match = "All 1000 names in the name dictionary have been used"):
+            random.name()
+
+    def test_record(self):
+        random = RandomHelper("\n".join(map(str, range(10))))
+        names = random._record()
+        drawn = [random.name() for i in range(3)]
+        assert names == drawn
+
+        names = random._record(replay = drawn[:2])
+        assert [random.name() for i in range(3)] == names
+        assert names[:2] == drawn[:2] # Replayed names come first
+        assert names[2] not in drawn # Then new names are drawn
+        assert len({random.name() for i in range(6)} | set(names)) == 9 # Replaying doesn't use up more names
+
+    def test_record_seed(self, working_dir: Path):
+        random = RandomHelper("\n".join(map(str, range(100))), [CONTENT_1, CONTENT_2], seed = 1)
+        def generate():
+            return (random._file(working_dir, "txt").create(), random.paragraphs(), random._folder(working_dir, depth = 2))
+
+        random._stream("a")
+        names = random._record()
+        (working_dir / "taken.txt").touch()
+        first = generate()
+
+        random._stream("a")
+        random._record(replay = names)
+        # Same names and draws, even though the file still exists
+        assert generate() == first
+
+    def test_record_rejected(self, working_dir: Path):
+        random = RandomHelper("a\nb\nc\n", seed = 1)
+        taken = random.name()
+        (working_dir / taken).touch() # So the first draw is rejected
+
+        random = RandomHelper("a\nb\nc\n", seed = 1)
+        names = random._record()
+        file = random._file(working_dir)
+        assert file.name != taken and names == [file.name] # The rejected name isn't recorded
+
+        random._stream("")
+        random._record(replay = names)
+        assert random._file(working_dir) == file # Skips the rejected name
+        assert random.name() not in (taken, file.name) # Replaying didn't use up more names
+
     def test_paragraphs(self):
         random = RandomHelper("", [CONTENT_1])
         paras = ["Sentence a.  Sentence b.  Sentence c.\n", "Sentence d. Sentence e.\n", "Sentence f.\n"]
@@ -145,6 +197,17 @@ class TestRandomHelper:
             new = random._folder(working_dir, depth = 2, create_new_chance = 0)
             assert new.parent == created_folder
 
+    def test_random_folder_uses_index(self, working_dir: Path, monkeypatch):
+        random = RandomHelper("\n".join(map(str, range(20))))
+        for i in range(100): # Lots of unshared files and folders
+            (working_dir / f"dir{i}").mkdir()
+        random._mark_shared(working_dir / "dir0")
+        random._mark_shared(working_dir / "dir0") # Marking twice doesn't make it more likely
+
+        monkeypatch.setattr(File, "iterdir", lambda self: pytest.fail("Shouldn't scan directories"))
+        assert random._folder(working_dir, depth = 1, create_new_chance = 0) == working_dir / "dir0"
+        assert random._shared_children[File(working_dir)] == [working_dir / "dir0"]
+
     def test_mark_shared(self, working_dir: Path):
         random = RandomHelper("a\nb\nc\nd\ne")
 
@@ -185,4 +248,87 @@ class TestRandomHelper:
         assert random._file(working_dir, ext = "txt").name == "b.txt"
 
         with pytest.raises(RandomHelperException, match = "Out of unique names"):
-            random._file(working_dir) # "a.txt" already exists, "b" was generated.
\ No newline at end of file
+            random._file(working_dir) # "a.txt" already exists, "b" was generated.
+
+    def test_seed(self, working_dir: Path):
+        def generate(seed, key):
+            random = RandomHelper("\n".join(map(str, range(100))), [CONTENT_1], seed = seed)
+            random._stream(key)
+            return (
+                [random.name() for i in range(5)],
+                random.paragraphs((1, 3)),
+                random._folder(working_dir, depth = 3),
+            )
+
+        assert generate(42, "0:puzzles.move") == generate(42, "0:puzzles.move")
+        assert generate("abc", "0:puzzles.move") == generate("abc", "0:puzzles.move")
+        assert generate(42, "0:puzzles.move") != generate(43, "0:puzzles.move")
+        # Each stream is different
+        assert generate(42, "0:puzzles.move") != generate(42, "1:puzzles.move")
+
+    def test_seed_stream_independent(self):
+        random = RandomHelper("\n".join(map(str, range(1000))), seed = 1)
+        random._stream("b")
+        b_only = [random.name() for i in range(3)]
+
+        random = RandomHelper("\n".join(map(str, range(1000))), seed = 1)
+        random._stream("a")
+        [random.paragraphs() for i in range(5)]
+        a_names = [random.name() for i in range(10)]
+        random._stream("b")
+        # b's values don't depend on what was generated in a (unless the names happen to collide)
+        assert not set(a_names) & set(b_only)
+        assert [random.name() for i in range(3)] == b_only
+
+    def test_global_stream(self):
+        state = random_module.getstate()
+        random = RandomHelper("a\nb\n", seed = 1)
+        with random._global_stream("a"):
+            first = [random_module.random() for i in range(3)]
+        with random._global_stream("a"):
+            assert [random_module.random() for i in range(3)] == first
+        assert random_module.getstate() == state # Restored afterwards
+
+    def test_no_seed(self):
+        names = "\n".join(map(str, range(1000)))
+        random1, random2 = RandomHelper(names), RandomHelper(names)
+        random1._stream("a") # Does nothing without a seed
+        random2._stream("a")
+        assert [random1.name() for i in range(5)] != [random2.name() for i in range(5)]
+
+    def test_partition(self):
+        random = RandomHelper("\n".join(map(str, range(10))))
+        used = {random.name() for i in range(4)}
+
+        parts = [random._partition(i, 3) for i in range(3)]
+        names = [{part.name() for i in range(part._names_left)} for part in parts]
+        assert sum(len(n) for n in names) == 6 # Each unused name is in exactly one partition
+        assert set.union(*names) == set(map(str, range(10))) - used
+        with pytest.raises(RandomHelperException, match = "All 3 names in this process's partition .* 1/3 of the 10 names"):
+            parts[1].name()
+
+    def test_unpartition(self):
+        random = RandomHelper("\n".join(map(str, range(10))))
+        used = {random.name() for i in range(2)}
+
+        parts = [random._partition(i, 3) for i in range(3)]
+        used |= {parts[0].name()}
+        others = [parts[1].name(), parts[2].name()]
+        parts[0]._unpartition(others)
+        assert parts[0]._names_left == 5
+        assert {parts[0].name() for i in range(5)} == set(map(str, range(10))) - used - set(others)
+        with pytest.raises(RandomHelperException, match = "Out of unique names. All 10 names"):
+            parts[0].name()
+
+    def test_content_files(self, working_dir: Path):
+        (working_dir / "content1.txt").write_text(CONTENT_1)
+        (working_dir / "content2.txt").write_text(CONTENT_2)
+        random = RandomHelper("", [CONTENT_3], content_files = [working_dir / "content1.txt", working_dir / "content2.txt"],
+                              index_dir = working_dir / "cache")
+        paras = ["Sentence a.  Sentence b.  Sentence c.\n", "Sentence d. Sentence e.\n", "Sentence f.\n",
+                 "    Space indented paragraph.\n", "\tTab indented paragraph.\n", "One line.\n"]
+
+        assert {random.paragraphs(1) for _ in range(100)} == set(paras) # All paragraphs are used
+        for _ in range(10): # Only content1.txt has 3 paragraphs.
+            assert random.paragraphs(3) == "Sentence a.  Sentence b.  Sentence c.\n\nSentence d. Sentence e.\n\nSentence f.\n"
+        assert (working_dir / "cache").exists()
@@ -0,0 +1,36 @@
+import pytest
+import subprocess, time
+from shell_adventure.docker_side.resource_sampler import ResourceSampler
+
+class TestResourceSampler:
+    def test_sample(self):
+        process = subprocess.Popen(["sh", "-c", "sleep 10 & sleep 10 & wait"])
+        try:
+            time.sleep(0.1)
+            sampler = ResourceSampler(process.pid, interval = 0.05)
+            sample = sampler.sample()
+            assert sample.processes == 3 # Includes child processes
+            assert sample.memory > 0
+            assert sample.cpu_percent == 0 # No previous sample yet
+        finally:
+            process.kill()
+
+    def test_missing_process(self):
+        sampler = ResourceSampler(999999999, interval = 0.05)
+        sample = sampler.sample()
+        assert (sample.processes, sample.memory) == (0, 0)
+
+    def test_background_sampling(self):
+        process = subprocess.Popen(["sleep", "10"])
+        try:
+            sampler = ResourceSampler(process.pid, interval = 0.05)
+            sampler.start()
+            time.sleep(0.3)
+            sampler.stop()
+
+            samples = sampler.drain()
+            assert len(samples) >= 2
+            assert all(s.processes == 1 for s in samples)
+            assert sampler.drain() == [] # drain clears the buffer
+        finally:
+            process.kill()
@@ -0,0 +1,80 @@
+import pytest, os
+from pathlib import Path
+from shell_adventure.api.file import File
+from shell_adventure.api.file_batch import FileBatch
+from shell_adventure.api import tree_digest
+
+class TestTreeDigest:
+    @pytest.fixture()
+    def src(self, working_dir: Path):
+        FileBatch().tree("src", {
+            "README.md": "# Project\n",
+            "src": {"main.py": "print('hi')\n", "util.py": None},
+            "empty": {},
+        }).apply()
+        return File("src")
+
+    def test_copy(self, src: File):
+        os.system("cp -r src dst")
+        assert src.tree_digest() == File("dst").tree_digest()
+        assert src.tree_diff(File("dst")) == []
+
+    def test_differences(self, src: File):
+        os.system("cp -r src dst")
+        dst = File("dst")
+        (dst / "src/main.py").write_text("print('bye')\n")
+        (dst / "README.md").unlink()
+        (dst / "extra").create()
+        (dst / "empty").chmod(0o700)
+
+        assert src.tree_digest() != dst.tree_digest()
+        assert src.tree_diff(dst) == [
+            '"README.md" is missing',
+            '"empty" is different',
+            '"extra" shouldn\'t be there',
+            '"src/main.py" is different',
+        ]
+        assert src.tree_diff(dst, limit = 2) == ['"README.md" is missing', '"empty" is different']
+        assert src.tree_diff(File("missing")) == ['"missing" doesn\'t exist']
+        assert File("missing").tree_diff(src) == ['"missing" doesn\'t exist']
+
+    def test_options(self, src: File):
+        os.system("cp -r src dst")
+        dst = File("dst")
+        (dst / "src/main.py").write_text("changed\n")
+        (dst / "empty").chmod(0o700)
+
+        assert src.tree_digest(contents = False, modes = False) == dst.tree_digest(contents = False, modes = False)
+        assert src.tree_digest(contents = False) != dst.tree_digest(contents = False)
+        assert src.tree_diff(dst, modes = False) == ['"src/main.py" is different']
+
+    def test_symlinks(self, working_dir: Path):
+        File("a/target.txt").create()
+        File("b/target.txt").create()
+        File("a/link").symlink_to("target.txt")
+        File("b/link").symlink_to("missing.txt")
+        assert File("a").tree_diff(File("b")) == ['"link" is different']
+
+    def test_content_cache(self, src: File):
+        src.tree_digest()
+        cache_size = len(tree_digest._content_hashes)
+        src.tree_digest() # Unchanged files aren't hashed again
+        assert len(tree_digest._content_hashes) == cache_size
+
+        (src / "README.md").write_text("# Changed\n")
+        before = src.tree_digest()
+        assert len(tree_digest._content_hashes) == cache_size + 1
+        (src / "README.md").write_text("# Changed again\n")
+        assert src.tree_digest() != before
+
+    def test_content_cache_same_mtime(self, src: File):
+        before = src.tree_digest()
+        os.system("cp -p src/README.md original.md")
+        (src / "README.md").write_text("# Tcejorp\n") # Same size
+        os.system("touch -r original.md src/README.md") # Same mtime
+        assert src.tree_digest() != before
+
+    def test_unreadable(self, src: File):
+        (src / "README.md").chmod(0o000)
+        os.system("cp -rp src dst")
+        assert src.tree_digest() == File("dst").tree_digest() # Read as root
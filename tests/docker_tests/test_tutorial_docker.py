@@ -6,8 +6,9 @@ from shell_adventure.docker_side.tutorial_docker import TutorialDocker
 from shell_adventure.api.random_helper import RandomHelperException
 from shell_adventure.api.file import File
 from shell_adventure.shared.puzzle_data import PuzzleData
+from shell_adventure.shared.support import Tree
 from shell_adventure.shared.tutorial_errors import *
-import os
+import os, cProfile, pstats, marshal, threading
 from textwrap import dedent;
 from .helpers import *
 
@@ -73,6 +74,44 @@ class TestTutorialDocker:
             output = working_dir / "output"
             assert (output.owner(), output.group()) == ("student", "student")
 
+    def test_compiled_modules(self, working_dir: Path):
+        source = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                return Puzzle(question = "From source", checker = lambda: False)
+        """)
+        # Compile different code, so we can tell which one was run
+        compiled = marshal.dumps(compile(source.replace("From source", "Compiled"), "<string>:mypuzzles.py", "exec"))
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): source, PurePath("other.py"): source},
+                compiled_modules = {PurePath("mypuzzles.py"): compiled},
+                puzzles = ["mypuzzles.move", "other.move"],
+            )
+            assert [p.question for p in tutorial.puzzles.values()] == ["Compiled", "From source"]
+            assert tutorial.modules["mypuzzles.py"] == source # Source is still kept for tracebacks
+
+    def test_compiled_modules_traceback(self, working_dir: Path):
+        source = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                raise ValueError("BOOM")
+        """)
+        compiled = marshal.dumps(compile(source, "<string>:/path/to/puzzles.py", "exec"))
+
+        with pytest.raises(UserCodeError) as exc_info:
+            with TutorialDocker() as tutorial:
+                setup_tutorial(tutorial, working_dir,
+                    modules = {PurePath("/path/to/puzzles.py"): source},
+                    compiled_modules = {PurePath("/path/to/puzzles.py"): compiled},
+                    puzzles = ["puzzles.move"],
+                )
+        assert 'File "/path/to/puzzles.py", line 5, in move' in str(exc_info.value)
+        assert 'raise ValueError("BOOM")' in str(exc_info.value)
+
     def test_get_templates(self, working_dir: Path):
         with TutorialDocker() as tutorial:
             setup_tutorial(tutorial, working_dir)
@@ -124,6 +163,164 @@ class TestTutorialDocker:
             os.system("mv A.txt B.txt")
             assert tutorial.solve_puzzle(puz) == (True, "Correct!")
 
+    LAZY_PUZZLES = dedent(r"""
+        from shell_adventure.api import *
+
+        def puz():
+            name = rand().name()
+            File(name).create()
+            return Puzzle(question = name, checker = lambda flag: flag == name)
+    """)
+
+    def test_lazy_generation(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            puzzles, report, generation_state = tutorial.setup(
+                home = working_dir, user = None, setup_scripts = {},
+                modules = {PurePath("puzzles.py"): self.LAZY_PUZZLES},
+                puzzles = ["puzzles.puz", "puzzles.puz"],
+                lazy_children = [[Tree("puzzles.puz", [Tree("puzzles.puz")]), Tree("puzzles.puz")], []],
+                name_dictionary = "\n".join(map(str, range(100))), content_sources = [], send_checkers = False,
+            )
+            assert generation_state == None # Only needed for restart
+            assert len(puzzles) == 2 and len(report) == 2
+            assert len(list(working_dir.iterdir())) == 2
+            [root, leaf] = puzzles
+
+            assert tutorial.generate_unlocked(root.id) == [] # Not solved yet
+            assert tutorial.solve_puzzle(root.id, root.question) == (True, "Correct!")
+            children = tutorial.generate_unlocked(root.id)
+            assert len(children) == 2
+            assert all(p.checker == None for p in children) # Sent like in setup
+            assert len(list(working_dir.iterdir())) == 4
+            assert tutorial.generate_unlocked(root.id) == [] # Only generated once
+            assert tutorial.generate_unlocked(leaf.id) == []
+
+            tutorial.solve_puzzle(children[0].id, children[0].question)
+            [grandchild] = tutorial.generate_unlocked(children[0].id)
+            names = [p.question for p in [root, leaf, *children, grandchild]]
+            assert len(set(names)) == 5
+            assert sorted(f.name for f in working_dir.iterdir()) == sorted(names)
+
+    def test_lazy_generation_unknown_template(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            with pytest.raises(ConfigError, match = "Unknown puzzle template\\(s\\) 'puzzles.other'"):
+                setup_tutorial(tutorial, working_dir,
+                    puzzles = ["puzzles.move"], lazy_children = [[Tree("puzzles.other")]],
+                )
+
+    def test_lazy_restore(self, working_dir: Path):
+        modules = {PurePath("puzzles.py"): self.LAZY_PUZZLES}
+        with TutorialDocker() as tutorial:
+            puzzles, report, generation_state = tutorial.setup(
+                home = working_dir, user = None, setup_scripts = {}, modules = modules,
+                puzzles = ["puzzles.puz"], lazy_children = [[Tree("puzzles.puz")]],
+                name_dictionary = "a\nb\n", content_sources = [], send_checkers = True, seed = 1,
+            )
+            [root] = puzzles
+
+        with TutorialDocker() as tutorial:
+            tutorial.restore(home = working_dir, user = "student", modules = modules, puzzles = puzzles, generation_state = generation_state)
+            assert tutorial.solve_puzzle(root.id, root.question)[0] == True
+            [child] = tutorial.generate_unlocked(root.id)
+            assert isinstance(child.checker, bytes) # Dilled since restart is enabled
+            assert child.question != root.question # The restored RandomHelper knows which names were used
+
+    def test_regenerate(self, working_dir: Path):
+        for seed in [None, 1]:
+            with TutorialDocker() as tutorial:
+                setup_tutorial(tutorial, working_dir,
+                    modules = {PurePath("puzzles.py"): self.LAZY_PUZZLES},
+                    puzzles = ["puzzles.puz", "puzzles.puz"],
+                    name_dictionary = "\n".join(map(str, range(100))), seed = seed,
+                )
+                [puz1, puz2] = tutorial.puzzles.values()
+                (working_dir / puz1.question).unlink() # Student broke the puzzle
+
+                new = tutorial.regenerate_puzzle(puz1.id)
+                assert new.id == puz1.id and new.solved == False
+                assert isinstance(new.checker, bytes) # Packed like in setup
+                assert (working_dir / new.question).exists()
+                assert new.question != puz2.question
+                if seed != None:
+                    assert new.question == puz1.question # Same stream and names
+                else:
+                    assert new.question != puz1.question # Old names stay reserved
+                assert tutorial.solve_puzzle(new.id, new.question) == (True, "Correct!")
+                assert tutorial.solve_puzzle(new.id, puz1.question) == (seed != None, "Correct!" if seed != None else "Incorrect!")
+
+    def test_regenerate_seed(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("puzzles.py"): dedent(r"""
+                    from shell_adventure.api import *
+
+                    def puz(home):
+                        file = home.random_shared_folder().random_file("txt")
+                        file.create(recursive = True, content = rand().paragraphs())
+                        folder = home.random_shared_folder(depth = 2)
+                        return Puzzle(question = f"{file} {folder} {file.read_text()!r}", checker = lambda: True)
+                """)},
+                puzzles = ["puzzles.puz", "puzzles.puz"],
+                name_dictionary = "\n".join(map(str, range(100))), content_sources = ["A.\n\nB.\n\nC.\n\nD.\n"], seed = 1,
+            )
+            [puz1, puz2] = tutorial.puzzles.values()
+
+            # The files weren't removed, but it gets the same names and the draws after them match
+            new = tutorial.regenerate_puzzle(puz1.id)
+            assert new.question == puz1.question
+            assert tutorial.regenerate_puzzle(puz1.id).question == puz1.question
+
+    def test_regenerate_after_restore(self, working_dir: Path):
+        modules = {PurePath("puzzles.py"): self.LAZY_PUZZLES}
+        with TutorialDocker() as tutorial:
+            puzzles, report, generation_state = tutorial.setup(
+                home = working_dir, user = None, setup_scripts = {}, modules = modules, puzzles = ["puzzles.puz"],
+                name_dictionary = "a\nb\nc\n", content_sources = [], send_checkers = True,
+            )
+
+        with TutorialDocker() as tutorial:
+            tutorial.restore(home = working_dir, user = "student", modules = modules, puzzles = puzzles,
+                             generation_state = generation_state)
+            new = tutorial.regenerate_puzzle(puzzles[0].id) # Loads the templates from the modules
+            assert new.question != puzzles[0].question
+            assert tutorial.solve_puzzle(new.id, new.question)[0] == True
+
+    def test_restore_compiled_modules(self, working_dir: Path):
+        source = self.LAZY_PUZZLES
+        modules = {PurePath("puzzles.py"): source}
+        with TutorialDocker() as tutorial:
+            puzzles, report, generation_state = tutorial.setup(
+                home = working_dir, user = None, setup_scripts = {}, modules = modules, puzzles = ["puzzles.puz"],
+                name_dictionary = "a\nb\nc\n", content_sources = [], send_checkers = True,
+            )
+
+        # Compile different code, so we can tell which one was run
+        compiled = marshal.dumps(compile(source.replace("question = name", "question = 'Compiled'"), "<string>:puzzles.py", "exec"))
+        with TutorialDocker() as tutorial:
+            tutorial.restore(home = working_dir, user = "student", modules = modules, puzzles = puzzles,
+                             generation_state = generation_state, compiled_modules = {PurePath("puzzles.py"): compiled})
+            assert tutorial.regenerate_puzzle(puzzles[0].id).question == "Compiled"
+
+    def test_profile(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            assert tutorial._profiled(tutorial.solve_puzzle) == tutorial.solve_puzzle # No wrapper if disabled
+            assert tutorial.get_profile() == None
+
+            tutorial.profiler = cProfile.Profile()
+            tutorial._profiled(setup_tutorial)(tutorial, working_dir)
+            [puz] = tutorial.puzzles.keys()
+            assert tutorial._profiled(tutorial.solve_puzzle)(puz) == (False, "Incorrect!")
+
+            stats = tutorial.get_profile()
+            funcs = {func for (file, line, func) in stats.keys()}
+            assert {"setup", "move", "solve_puzzle", "checker"} <= funcs
+            pstats.Stats(tutorial.profiler) # Stats are in the format pstats expects
+
+            # Profiling continues after getting the stats
+            tutorial._profiled(tutorial.solve_puzzle)(puz)
+            stats = tutorial.get_profile()
+            [solve_stats] = [v for k, v in stats.items() if k[2] == "solve_puzzle"]
+            assert solve_stats[0] == 2 # called twice
 
     def test_user(self, working_dir: Path):
         with TutorialDocker() as tutorial:
@@ -223,6 +420,156 @@ class TestTutorialDocker:
             log = working_dir / "log.txt"
             assert log.read_text().splitlines() == ['puz1', 'puz3', 'puz2']
 
+    def test_seed(self, working_dir: Path):
+        modules = {PurePath("puzzles.py"): dedent(r"""
+            from shell_adventure.api import *
+            import random
+
+            def puz(home):
+                file = home.random_shared_folder().random_file("txt")
+                return Puzzle(question = f"{file} {random.random()} {rand().paragraphs()}", checker = lambda: False)
+        """)}
+        def generate(seed):
+            with TutorialDocker() as tutorial:
+                setup_tutorial(tutorial, working_dir, modules = modules, puzzles = ["puzzles.puz", "puzzles.puz"],
+                               name_dictionary = "\n".join(map(str, range(1000))), seed = seed)
+                return [p.question for p in tutorial.puzzles.values()]
+
+        first = generate(42)
+        assert first == generate(42)
+        assert first != generate(43)
+        assert first[0] != first[1] # Each template gets its own stream
+
+    def test_independent(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("puzzles.py"): dedent(r"""
+                    from shell_adventure.api import *
+                    import os
+
+                    def make_puzzle(home):
+                        files = [home.random_file("txt").create() for i in range(10)]
+                        return Puzzle(
+                            question = f"{os.getpid()} {' '.join(f.name for f in files)}",
+                            checker = lambda: all(f.exists() for f in files),
+                        )
+
+                    puz1 = independent(make_puzzle)
+                    def puz2(home): return make_puzzle(home)
+                    @independent
+                    def puz3(home): return make_puzzle(home)
+                """)},
+                puzzles = ["puzzles.puz1", "puzzles.puz2", "puzzles.puz3", "puzzles.puz1"],
+                name_dictionary = "\n".join(map(str, range(1000))),
+            )
+
+            puzzles = list(tutorial.puzzles.values())
+            assert [p.template for p in puzzles] == ["puzzles.puz1", "puzzles.puz2", "puzzles.puz3", "puzzles.puz1"]
+            pids = [p.question.split()[0] for p in puzzles]
+            assert pids[1] == str(os.getpid()) # Not independent
+            assert str(os.getpid()) not in (pids[0], pids[2], pids[3])
+
+            names = [name for p in puzzles for name in p.question.split()[1:]]
+            assert len(set(names)) == 40 # No conflicts between the processes
+            assert all((working_dir / name).exists() for name in names)
+            assert all(tutorial.solve_puzzle(p.id) == (True, "Correct!") for p in puzzles)
+            assert tutorial.rand._names_left == 960 # Later generation gets the names the workers didn't use
+
+    def test_independent_errors(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            with pytest.raises(UserCodeError, match = "Puzzle generation failed for template puzzles.puz") as exc_info:
+                setup_tutorial(tutorial, working_dir,
+                    modules = {PurePath("puzzles.py"): dedent(r"""
+                        from shell_adventure.api import *
+
+                        @independent
+                        def puz():
+                            raise ValueError("oops")
+                    """)},
+                    puzzles = ["puzzles.puz"],
+                )
+            assert "oops" in str(exc_info.value)
+
+            with pytest.raises(UserCodeError, match = "Independent puzzle templates are generated in a separate process"):
+                setup_tutorial(tutorial, working_dir,
+                    modules = {PurePath("puzzles.py"): dedent(r"""
+                        from shell_adventure.api import *
+
+                        @independent
+                        def puz():
+                            gen = (i for i in range(3)) # Generators can't be pickled
+                            return Puzzle(question = "", checker = lambda: next(gen) == 1)
+                    """)},
+                    puzzles = ["puzzles.puz"],
+                    send_checkers = False,
+                )
+
+    def test_independent_threads(self, working_dir: Path, monkeypatch):
+        forked_with = []
+        fork = os.fork
+        def check_fork():
+            forked_with.append({thread.name for thread in threading.enumerate()})
+            return fork()
+        monkeypatch.setattr(os, "fork", check_fork)
+
+        with TutorialDocker() as tutorial:
+            tutorial.setup(
+                home = working_dir, user = None, setup_scripts = {},
+                modules = {PurePath("puzzles.py"): dedent(r"""
+                    from shell_adventure.api import *
+
+                    @independent
+                    def puz(home):
+                        return Puzzle(question = home.random_file().create().name, checker = lambda: True)
+                """)},
+                puzzles = ["puzzles.puz"],
+                lazy_children = [[Tree("puzzles.puz")]],
+                name_dictionary = "\n".join(map(str, range(100))), content_sources = [], send_checkers = False,
+                resource_sample_interval = 0.01, auto_grade_interval = 0.01,
+            )
+            [root] = tutorial.puzzles.values()
+            tutorial.solve_puzzle(root.id)
+            with tutorial._lock: # Like when handling a message, so the grader can be waiting for it
+                [child] = tutorial.generate_unlocked(root.id)
+
+            assert len(forked_with) == 2
+            assert not any({"ResourceSampler", "BackgroundGrader"} & names for names in forked_with)
+            assert tutorial.sampler._thread.is_alive() and tutorial.grader._thread.is_alive() # Started again
+
+    def test_create_module_dont_inherit(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir)
+            module = tutorial._create_module(PurePath("mypuzzles.py"), "def f(x: int): pass")
+            assert module.f.__annotations__ == {"x": int} # Not strings, like they'd be with the __future__ import
+
+    def test_generation_report(self, working_dir: Path):
+        with TutorialDocker() as tutorial:
+            puzzles, report, generation_state = tutorial.setup(
+                home = working_dir, user = None,
+                setup_scripts = {PurePath("setup.py"): "from shell_adventure.api import *\nFile('setup.txt').create()"},
+                modules = {PurePath("puzzles.py"): dedent(r"""
+                    from shell_adventure.api import *
+
+                    def many(home):
+                        for i in range(5): home.random_file().mkdir()
+                        return Puzzle(question = "", checker = lambda: False)
+
+                    @independent
+                    def few(home):
+                        home.random_file().create(content = "x" * 100)
+                        return Puzzle(question = "", checker = lambda: False)
+                """)},
+                puzzles = ["puzzles.few", "puzzles.many"],
+                name_dictionary = "\n".join(map(str, range(100))), content_sources = [], send_checkers = False,
+            )
+
+            assert len(puzzles) == 2
+            assert [(s.name, s.kind) for s in report] == [
+                ("setup.py", "setup_script"), ("puzzles.few", "template"), ("puzzles.many", "template"),
+            ]
+            assert [(s.files_created, s.dirs_created) for s in report] == [(1, 0), (1, 0), (0, 5)]
+            assert report[1].bytes_written >= 100 # Measured in the worker process
+
     def test_puzzle_always_cwd_in_home(self, working_dir: Path):
         with TutorialDocker() as tutorial:
             setup_tutorial(tutorial, working_dir,
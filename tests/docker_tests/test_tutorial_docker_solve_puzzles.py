@@ -1,8 +1,12 @@
 import pytest
 from shell_adventure.docker_side.tutorial_docker import TutorialDocker
+from shell_adventure.docker_side.background_grader import BackgroundGrader
+from shell_adventure.docker_side import background_grader
 from shell_adventure.api.file import File
+from shell_adventure.shared.support import Tree
+from shell_adventure.shared.tutorial_errors import *
 from pathlib import PurePath, Path
-import os
+import os, time
 from textwrap import dedent;
 from .helpers import *
 
@@ -176,3 +180,264 @@ class TestTutorialDockerSolvePuzzles:
             os.system(f"mkdir --parents {src} {dst.parent}")
             os.system(f"mv {src} {dst}")
             assert tutorial.solve_puzzle(puzzle.id) == (True, "Correct!")
+
+    def test_solve_puzzle_depends_on(self, working_dir: Path):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def copy():
+                src = File("folder")
+                (src / "sub").mkdir(parents = True)
+                (src / "sub" / "A.txt").write_text("A")
+                calls = []
+
+                def checker(flag):
+                    calls.append(flag)
+                    return f"checked {len(calls)}"
+
+                return Puzzle(
+                    question = "Copy folder",
+                    checker = checker,
+                    depends_on = [src, "copy"],
+                )
+        """)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.copy"],
+            )
+            [puzzle] = list(tutorial.puzzles.values())
+            assert puzzle.depends_on == [str(working_dir / "folder"), str(working_dir / "copy")]
+
+            assert tutorial.solve_puzzle(puzzle.id) == (False, "checked 1")
+            assert tutorial.solve_puzzle(puzzle.id) == (False, "checked 1") # Nothing changed
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 2") # Different flag
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 2")
+
+            File("folder/sub/B.txt").create() # Nested change
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 3")
+            File("folder/sub/A.txt").chmod("go-r")
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 4")
+            os.system("cp -r folder copy") # Path that didn't exist was created
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 5")
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 5")
+
+            File("unrelated.txt").create()
+            assert tutorial.solve_puzzle(puzzle.id, "flag") == (False, "checked 5")
+
+    def test_auto_grade(self, working_dir: Path, monkeypatch):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                File("A.txt").create()
+                return Puzzle(
+                    question = "Rename A.txt to B.txt",
+                    checker = lambda: not File("A.txt").exists() and File("B.txt").exists(),
+                    depends_on = ["A.txt", "B.txt"],
+                )
+
+            def flag():
+                return Puzzle(question = "Say OK", checker = lambda flag: flag == "OK", depends_on = [])
+
+            def no_depends():
+                return Puzzle(question = "Nothing", checker = lambda: True)
+        """)
+        monkeypatch.setattr(BackgroundGrader, "MIN_CHECK_INTERVAL", 0)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.move", "mypuzzles.flag", "mypuzzles.no_depends"],
+                auto_grade_interval = 1000, # Call poll() ourselves
+            )
+            move, flag, no_depends = tutorial.puzzles.values()
+
+            assert tutorial.auto_grade([move.id, flag.id, no_depends.id]) == []
+            assert list(tutorial.grader._watched) == [move.id] # Only puzzles with depends_on and no flag
+
+            tutorial.grader.poll()
+            tutorial.grader.poll() # Checks once at the start
+            assert tutorial.auto_grade([move.id]) == []
+
+            os.system("mv A.txt B.txt")
+            tutorial.grader.poll() # Waits for the change to settle
+            assert tutorial.auto_grade([move.id]) == []
+            tutorial.grader.poll()
+            assert tutorial.auto_grade([move.id]) == [(move.id, "Correct!", [])]
+            assert move.solved
+
+            tutorial.grader.poll()
+            tutorial.grader.poll()
+            assert tutorial.auto_grade([]) == []
+
+    def test_auto_grade_lock(self, working_dir: Path, monkeypatch):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def puz():
+                return Puzzle(question = "Anything", checker = lambda: True, depends_on = ["."])
+        """)
+        locked = []
+        fingerprint = background_grader.fingerprint
+        def check_fingerprint(paths):
+            locked.append(tutorial._lock.locked())
+            return fingerprint(paths)
+        monkeypatch.setattr(background_grader, "fingerprint", check_fingerprint)
+        monkeypatch.setattr(BackgroundGrader, "MIN_CHECK_INTERVAL", 0)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.puz"],
+                auto_grade_interval = 0.05,
+            )
+            [puz] = tutorial.puzzles.values()
+            results = []
+            for _ in range(100):
+                with tutorial._lock:
+                    results += tutorial.auto_grade([puz.id])
+                if results: break
+                time.sleep(0.05)
+
+            assert results == [(puz.id, "Correct!", [])]
+            assert locked and not any(locked) # Fingerprinting doesn't hold up messages from the host
+
+    def test_auto_grade_background(self, working_dir: Path, monkeypatch):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                File("A.txt").create()
+                return Puzzle(
+                    question = "Rename A.txt to B.txt",
+                    checker = lambda: not File("A.txt").exists() and File("B.txt").exists(),
+                    depends_on = ["A.txt", "B.txt"],
+                )
+        """)
+        monkeypatch.setattr(BackgroundGrader, "MIN_CHECK_INTERVAL", 0)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.move"],
+                auto_grade_interval = 0.05,
+            )
+            [puzzle] = tutorial.puzzles.values()
+            with tutorial._lock:
+                tutorial.auto_grade([puzzle.id])
+
+            os.system("mv A.txt B.txt")
+            results = []
+            for _ in range(100):
+                time.sleep(0.05)
+                with tutorial._lock:
+                    results += tutorial.auto_grade([puzzle.id])
+                if results: break
+            assert results == [(puzzle.id, "Correct!", [])]
+
+    def test_auto_grade_independent_child(self, working_dir: Path, monkeypatch):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                File("A.txt").create()
+                return Puzzle(
+                    question = "Rename A.txt to B.txt",
+                    checker = lambda: File("B.txt").exists(),
+                    depends_on = ["A.txt", "B.txt"],
+                )
+
+            @independent
+            def child(home):
+                return Puzzle(question = home.random_file().name, checker = lambda: True)
+        """)
+        monkeypatch.setattr(BackgroundGrader, "MIN_CHECK_INTERVAL", 0)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.move"],
+                lazy_children = [[Tree("mypuzzles.child")]],
+                name_dictionary = "\n".join(map(str, range(100))),
+                auto_grade_interval = 0.05, resource_sample_interval = 0.05,
+            )
+            [puzzle] = tutorial.puzzles.values()
+            with tutorial._lock:
+                tutorial.auto_grade([puzzle.id])
+
+            os.system("mv A.txt B.txt")
+            results = []
+            for _ in range(100):
+                time.sleep(0.05)
+                with tutorial._lock:
+                    results += tutorial.auto_grade([puzzle.id])
+                if results: break
+
+            [(puzzle_id, feedback, [child])] = results # The grader generated the child in the pool
+            assert (puzzle_id, feedback, child.template) == (puzzle.id, "Correct!", "mypuzzles.child")
+            assert tutorial.grader._thread.is_alive() and tutorial.sampler._thread.is_alive()
+
+    def test_solve_puzzles(self, working_dir: Path, monkeypatch):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def move():
+                File("A.txt").create()
+                return Puzzle(question = "Rename A.txt to B.txt", checker = lambda: File("B.txt").exists())
+
+            def cwd():
+                return Puzzle(question = "cd to home", checker = lambda cwd: cwd == File.home())
+
+            def flag():
+                return Puzzle(question = "Say OK", checker = lambda flag: flag == "OK")
+        """)
+        cwd_calls = []
+        def student_cwd(self):
+            cwd_calls.append(1)
+            return File(working_dir)
+        monkeypatch.setattr(TutorialDocker, "student_cwd", student_cwd)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.move", "mypuzzles.cwd", "mypuzzles.cwd", "mypuzzles.flag"],
+            )
+            move, cwd1, cwd2, flag = tutorial.puzzles.values()
+            cwd_calls.clear()
+
+            results = tutorial.solve_puzzles([(move.id, None), (cwd1.id, None), (cwd2.id, None), (flag.id, "OK")])
+            assert results == [(False, "Incorrect!", []), (True, "Correct!", []), (True, "Correct!", []), (True, "Correct!", [])]
+            assert len(cwd_calls) == 1 # Only looked up once
+            assert [p.solved for p in (move, cwd1, cwd2, flag)] == [False, True, True, True]
+
+            assert tutorial.solve_puzzles([(move.id, None)]) == [(False, "Incorrect!", [])]
+            assert len(cwd_calls) == 1 # Not looked up if no checker needs it
+
+    def test_solve_puzzles_error(self, working_dir: Path):
+        puzzles = dedent("""
+            from shell_adventure.api import *
+
+            def error():
+                return Puzzle(question = "Error", checker = lambda: 1 / 0)
+
+            def parent():
+                return Puzzle(question = "Parent", checker = lambda: True)
+
+            def child():
+                return Puzzle(question = "Child", checker = lambda: True)
+        """)
+
+        with TutorialDocker() as tutorial:
+            setup_tutorial(tutorial, working_dir,
+                modules = {PurePath("mypuzzles.py"): puzzles},
+                puzzles = ["mypuzzles.error", "mypuzzles.parent"],
+                lazy_children = [[], [Tree("mypuzzles.child")]],
+            )
+            error, parent = tutorial.puzzles.values()
+
+            [error_result, parent_result] = tutorial.solve_puzzles([(error.id, None), (parent.id, None)])
+            assert isinstance(error_result, UserCodeError)
+            (solved, feedback, [child]) = parent_result # Still solved, and its child is generated
+            assert (solved, feedback, child.question) == (True, "Correct!", "Child")
@@ -0,0 +1,127 @@
+import pytest
+from pathlib import Path
+import tarfile, zipfile, io, os, stat
+import shell_adventure.api
+from shell_adventure.api import archive
+from shell_adventure.api.file import File
+from shell_adventure.api.random_helper import RandomHelper
+
+def make_tar(path: Path, members: list) -> Path:
+    """ Makes a tar.gz. members is a list of (name, type, content_or_link, mode) """
+    with tarfile.open(path, "w:gz") as tar:
+        for name, type, data, mode in members:
+            info = tarfile.TarInfo(name)
+            info.type, info.mode, info.mtime = type, mode, 1_000_000_000
+            if type == tarfile.REGTYPE:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            else:
+                if data: info.linkname = data
+                tar.addfile(info)
+    return path
+
+PROJECT = [
+    ("project", tarfile.DIRTYPE, None, 0o755),
+    ("project/README.md", tarfile.REGTYPE, b"# Project\n", 0o644),
+    ("project/src", tarfile.DIRTYPE, None, 0o700),
+    ("project/src/main.py", tarfile.REGTYPE, b"print('hi')\n", 0o755),
+    ("project/link.md", tarfile.SYMTYPE, "README.md", 0o777),
+    ("project/hard.md", tarfile.LNKTYPE, "project/README.md", 0o644),
+]
+
+class TestUnpack:
+    def test_unpack_tar(self, working_dir: Path):
+        archive = make_tar(working_dir / "project.tar.gz", PROJECT)
+        files = File("dest").unpack(archive)
+
+        assert files["project/src/main.py"] == File("dest/project/src/main.py")
+        assert File("dest/project/README.md").read_text() == "# Project\n"
+        assert File("dest/project/src/main.py").permissions == 0o755
+        assert File("dest/project/src").permissions == 0o700
+        assert File("dest/project/README.md").stat().st_mtime == 1_000_000_000
+        assert File("dest/project/src").stat().st_mtime == 1_000_000_000
+        assert os.readlink("dest/project/link.md") == "README.md"
+        assert File("dest/project/hard.md").stat().st_ino == File("dest/project/README.md").stat().st_ino
+
+    def test_unpack_zip(self, working_dir: Path):
+        with zipfile.ZipFile(working_dir / "project.zip", "w") as zip:
+            zip.writestr("project/", "")
+            info = zipfile.ZipInfo("project/run.sh")
+            info.external_attr = 0o750 << 16
+            zip.writestr(info, "echo hi\n")
+            zip.writestr("project/data.txt", "data\n")
+
+        files = File("dest").unpack(working_dir / "project.zip")
+        assert set(files) == {"project", "project/run.sh", "project/data.txt"}
+        assert File("dest/project/run.sh").read_text() == "echo hi\n"
+        assert File("dest/project/run.sh").permissions == 0o750
+
+    def test_unpack_modes_and_owner(self, working_dir: Path):
+        archive = make_tar(working_dir / "project.tar.gz", PROJECT)
+        File("dest").unpack(archive, owner = "student", group = "root", file_mode = 0o600, dir_mode = 0o500)
+
+        main = File("dest/project/src/main.py")
+        assert (main.owner(), main.group(), main.permissions) == ("student", "root", 0o600)
+        assert File("dest/project/src").permissions == 0o500
+        assert (File("dest/project/link.md").owner(), File("dest/project/link.md").group()) == ("student", "root")
+
+    def test_unpack_rename(self, working_dir: Path):
+        archive = make_tar(working_dir / "project.tar.gz", PROJECT)
+        try:
+            shell_adventure.api._rand = RandomHelper("\n".join(map(str, range(100))))
+            files = File("dest").unpack(archive, rename = True)
+        finally:
+            shell_adventure.api._rand = None
+
+        main = files["project/src/main.py"]
+        assert main.read_text() == "print('hi')\n"
+        assert main.suffix == ".py" and main.name != "main.py"
+        assert main.parent == files["project/src"] # Folders are renamed consistently
+        assert files["project/link.md"].resolve() == files["project/README.md"].resolve() # Links point to the renamed file
+        assert not File("dest/project").exists()
+
+    @pytest.mark.parametrize("members", [
+        [("../evil.txt", tarfile.REGTYPE, b"", 0o644)],
+        [("/tmp/evil.txt", tarfile.REGTYPE, b"", 0o644)],
+        [("a/../../evil.txt", tarfile.REGTYPE, b"", 0o644)],
+        [("link", tarfile.SYMTYPE, "/etc", 0o777)],
+        [("link", tarfile.SYMTYPE, "../..", 0o777)],
+        [("link", tarfile.SYMTYPE, "sub", 0o777), ("link/evil.txt", tarfile.REGTYPE, b"", 0o644)],
+        [("a", tarfile.SYMTYPE, ".", 0o777), ("b", tarfile.SYMTYPE, "a/..", 0o777)], # Links through another link
+        [("b", tarfile.SYMTYPE, "a/..", 0o777), ("a", tarfile.SYMTYPE, ".", 0o777)],
+        [("hard", tarfile.LNKTYPE, "/etc/passwd", 0o644)],
+        [("dir", tarfile.DIRTYPE, None, 0o755), ("hard", tarfile.LNKTYPE, "dir", 0o644)],
+        [("link", tarfile.SYMTYPE, "sub", 0o777), ("hard", tarfile.LNKTYPE, "link", 0o644)],
+        [("fifo", tarfile.FIFOTYPE, None, 0o644)],
+    ])
+    def test_unpack_unsafe(self, working_dir: Path, members):
+        archive = make_tar(working_dir / "evil.tar.gz", members)
+        with pytest.raises(ValueError, match = "Can't unpack"):
+            File("dest/inner").unpack(archive)
+        assert not (working_dir / "evil.txt").exists()
+        assert not (working_dir / "dest/evil.txt").exists()
+        assert not os.path.lexists("dest/inner/b") # Links that escape are removed
+
+    def test_unpack_zip_symlinks(self, working_dir: Path):
+        def make_zip(link: str) -> Path:
+            with zipfile.ZipFile(working_dir / "links.zip", "w") as zip:
+                zip.writestr("README.md", "# Project\n")
+                info = zipfile.ZipInfo("link.md")
+                info.external_attr = (stat.S_IFLNK | 0o777) << 16
+                zip.writestr(info, link)
+            return working_dir / "links.zip"
+
+        File("dest").unpack(make_zip("README.md"))
+        assert os.readlink("dest/link.md") == "README.md"
+        assert File("dest/link.md").read_text() == "# Project\n"
+
+        with pytest.raises(ValueError, match = "Can't unpack"):
+            File("dest2").unpack(make_zip("../../etc/passwd"))
+        assert not os.path.lexists("dest2/link.md")
+
+    def test_archive(self, working_dir: Path, monkeypatch):
+        monkeypatch.setattr(shell_adventure.api, "ARCHIVE_PATH", str(working_dir))
+        make_tar(working_dir / "project.tar.gz", PROJECT)
+        assert archive("project.tar.gz") == File(working_dir / "project.tar.gz")
+        with pytest.raises(FileNotFoundError, match = 'No archive "missing.tar.gz"'):
+            archive("missing.tar.gz")
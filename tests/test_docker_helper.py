@@ -15,4 +15,25 @@ class TestDockerHelper:
         finally:
             docker_helper.stop(container) # should autoremove
 
-    # I'm not going to test an actual pull here as it would make the tests take forever
\ No newline at end of file
+    # I'm not going to test an actual pull here as it would make the tests take forever
+    def test_host_port(self, check_containers):
+        containers = []
+        try:
+            for i in range(2):
+                containers.append(docker_helper.launch("shelladventure/tests:alpine"))
+            ports = [docker_helper.host_port(c) for c in containers]
+            assert len(set(ports)) == 2 # Each container gets its own port
+        finally:
+            for container in containers:
+                docker_helper.stop(container)
+
+    def test_cache_volume(self, check_containers):
+        image = docker_helper.get_image("shelladventure/tests:main")
+        name = docker_helper.cache_volume(image)
+        assert docker_helper.client.volumes.get(f"{name}-complete") # Marked complete once filled
+        assert docker_helper.cache_volume(image) == name
+
+    def test_cache_volume_failed(self, check_containers):
+        image = docker_helper.get_image("shelladventure/tests:alpine") # No python, so filling the cache fails
+        assert docker_helper.cache_volume(image) == None # Not mounted
+        assert docker_helper.cache_volume(image) == None # Tries again instead of using the unfilled volume
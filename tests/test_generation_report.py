@@ -0,0 +1,18 @@
+from shell_adventure.shared.generation_report import GenerationStats, format_report
+
+class TestGenerationReport:
+    def test_format_report(self):
+        report = [
+            GenerationStats(name = "setup.py", kind = "setup_script", wall_time = 0.5, cpu_time = 0.25,
+                            files_created = 1, dirs_created = 0, bytes_written = 10),
+            GenerationStats(name = "puzzles.grep", kind = "template", wall_time = 1.5, cpu_time = 1.0,
+                            files_created = 100, dirs_created = None, bytes_written = None),
+        ]
+        lines = format_report(report).splitlines()
+        assert lines[0].split() == ["Name", "Kind", "Wall", "(s)", "%", "CPU", "(s)", "Files", "Dirs", "Written", "(B)"]
+        assert lines[1].split() == ["setup.py", "setup_script", "0.500", "25.0", "0.250", "1", "0", "10"]
+        assert lines[2].split() == ["puzzles.grep", "template", "1.500", "75.0", "1.000", "100", "?", "?"]
+        assert lines[3] == "Total: 2.000s"
+
+    def test_format_empty_report(self):
+        assert format_report([]).splitlines()[-1] == "Total: 0.000s"
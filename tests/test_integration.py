@@ -1,9 +1,12 @@
 import pytest
+from typing import List
 from shell_adventure.host_side import docker_helper
+from shell_adventure.host_side.tutorial import Tutorial
 from shell_adventure.shared.tutorial_errors import *
+from shell_adventure.shared.puzzle_data import PuzzleData
 from textwrap import dedent
 from pathlib import Path, PurePosixPath
-import datetime, time
+import datetime, time, pstats
 import docker, docker.errors
 from .helpers import *
 
@@ -113,6 +116,9 @@ class TestIntegration:
 
             exit_code, output = run_command(tutorial, ["cat", src])
             assert "STUFF" in output
+            # The content source was indexed when the cache volume was filled
+            exit_code, output = run_command(tutorial, ["ls", docker_helper.CONTENT_INDEX_PATH])
+            assert output.endswith(".idx")
 
             solved, feedback = tutorial.solve_puzzle(rand_puzzle)
             assert solved == False
@@ -363,6 +369,62 @@ class TestIntegration:
 
         assert "dill, python-lorem" in tutorial.logs()
 
+    def test_preforked_image(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                image: shelladventure/tests:prefork
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.user_puzzle:
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+                import getpass
+
+                def user_puzzle():
+                    assert File("A").create().owner() == "bob"
+                    return Puzzle(
+                        question = "Who are you?",
+                        checker = lambda: getpass.getuser() == "root"
+                    )
+            """),
+        })
+
+        with tutorial:
+            # The shell replaced the start script as PID 1, and dropped to the image's user
+            exit_code, output = run_command(tutorial, "ps -o user=,comm=", user = "root")
+            assert output.splitlines()[0].split() == ["bob", "sh"]
+            assert tutorial.get_student_cwd() == PurePosixPath("/home/bob")
+
+            puzzle = tutorial.get_all_puzzles()[0]
+            assert tutorial.solve_puzzle(puzzle) == (True, "Correct!")
+
+            run_command(tutorial, "touch new.txt", user = "bob")
+            tutorial.restart()
+            assert not file_exists(tutorial, "new.txt")
+            assert tutorial.solve_puzzle(puzzle) == (True, "Correct!")
+
+    def test_preforked_wrong_user(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                image: shelladventure/tests:prefork
+                container_options:
+                    user: not-a-user
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.move:
+            """,
+            "puzzles.py": SIMPLE_PUZZLES
+        })
+
+        with pytest.raises(ContainerStartupError, match = "unable to find user not-a-user"):
+            with tutorial:
+                pass # Just launch
+
+        assert "unable to find user not-a-user" in tutorial.logs()
+
     def test_wrong_user(self, tmp_path: Path, check_containers):
         # Test that exceptions in the container get raised in the Tutorial
         tutorial = create_tutorial(tmp_path, {
@@ -444,4 +506,288 @@ class TestIntegration:
             assert [n.data.template for n in tutorial.puzzles[2].children] == ["puzz6.move"]
 
             # Third Level
-            assert [n.data.template for n in tutorial.puzzles[0][0].children] == ["puzz3.move"]
\ No newline at end of file
+            assert [n.data.template for n in tutorial.puzzles[0][0].children] == ["puzz3.move"]
+
+    def test_lazy_generation(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.puz:
+                        - puzzles.puz:
+                            - puzzles.puz
+                        - puzzles.puz
+                    - puzzles.puz
+                lazy_generation: yes
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+
+                def puz():
+                    name = rand().name()
+                    File(name).create()
+                    return Puzzle(question = name, checker = lambda flag: flag == name)
+            """),
+        })
+
+        with tutorial:
+            assert len(tutorial.get_all_puzzles()) == 2 # Only the roots are generated
+            [root1, root2] = tutorial.get_current_puzzles()
+            assert all(file_exists(tutorial, p.question) for p in [root1, root2])
+
+            assert tutorial.solve_puzzle(root2, root2.question) == (True, "Correct!")
+            assert len(tutorial.get_all_puzzles()) == 2
+            assert tutorial.solve_puzzle(root1, root1.question) == (True, "Correct!")
+            assert [len(n.children) for n in tutorial.puzzles] == [2, 0]
+            [child1, child2] = [n.data for n in tutorial.puzzles[0].children]
+            assert tutorial.get_current_puzzles() == [root1, child1, child2, root2]
+            assert all(file_exists(tutorial, p.question) for p in [child1, child2])
+
+            tutorial.solve_puzzle(child2, child2.question)
+            assert not tutorial.is_finished()
+            tutorial.solve_puzzle(child1, child1.question)
+            [grandchild] = [n.data for n in tutorial.puzzles[0][0].children]
+            assert len({p.question for p in tutorial.get_all_puzzles()}) == 5
+            assert not tutorial.is_finished()
+            tutorial.solve_puzzle(grandchild, grandchild.question)
+            assert tutorial.is_finished()
+
+    def test_solve_puzzles(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.move:
+                        - puzzles.move2
+                    - puzzles.move2
+                lazy_generation: yes
+            """,
+            "puzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            [move, move2] = tutorial.get_current_puzzles()
+            run_command(tutorial, "mv A.txt B.txt")
+            assert tutorial.solve_puzzles([move, move2]) == [(True, "Correct!"), (False, "Incorrect!")]
+            assert move.solved and not move2.solved
+            [child] = [n.data for n in tutorial.puzzles[0].children] # Generated by solving move
+
+            run_command(tutorial, "mv C.txt D.txt")
+            assert tutorial.solve_puzzles([child, move2]) == [(True, "Correct!"), (True, "Correct!")]
+            assert tutorial.is_finished()
+
+    def test_solve_puzzles_error(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.error
+                    - puzzles.move:
+                        - puzzles.move2
+                lazy_generation: yes
+            """,
+            "puzzles.py": SIMPLE_PUZZLES + dedent("""
+                def error():
+                    return Puzzle(question = "Error", checker = lambda: 1 / 0)
+            """),
+        })
+
+        with tutorial:
+            [error, move] = tutorial.get_current_puzzles()
+            run_command(tutorial, "mv A.txt B.txt")
+            with pytest.raises(UserCodeError):
+                tutorial.solve_puzzles([error, move])
+            assert move.solved and not error.solved # The other results are kept
+            [child] = [n.data for n in tutorial.puzzles[1].children]
+
+    def test_auto_grade(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.move:
+                        - puzzles.move
+                lazy_generation: yes
+                auto_grade_interval: 0.1
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+
+                def move():
+                    src, dst = File(rand().name()), File(rand().name())
+                    src.create()
+                    return Puzzle(
+                        question = f"{src.name} -> {dst.name}",
+                        checker = lambda: not src.exists() and dst.exists(),
+                        depends_on = [src, dst],
+                    )
+            """),
+        })
+
+        def wait_for_auto_grade() -> List[PuzzleData]:
+            for _ in range(50):
+                solved = tutorial.update_auto_grade()
+                if solved: return solved
+                time.sleep(0.2)
+            return []
+
+        with tutorial:
+            [parent] = tutorial.get_current_puzzles()
+            assert tutorial.update_auto_grade() == []
+
+            run_command(tutorial, "mv {} {}".format(*parent.question.split(" -> ")))
+            assert wait_for_auto_grade() == [parent]
+            assert parent.solved
+            [child] = tutorial.get_current_puzzles()[1:] # Generated when the parent was auto-graded
+
+            run_command(tutorial, "mv {} {}".format(*child.question.split(" -> ")))
+            assert wait_for_auto_grade() == [child]
+            assert tutorial.is_finished()
+
+    def test_auto_grade_then_solve(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.move:
+                        - puzzles.move
+                lazy_generation: yes
+                auto_grade_interval: 0.1
+            """,
+            "puzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            [parent] = tutorial.get_current_puzzles()
+            assert tutorial.update_auto_grade() == []
+            run_command(tutorial, "mv A.txt B.txt")
+            time.sleep(2) # Let the container auto-grade it, then solve it before the result is collected
+
+            assert tutorial.solve_puzzle(parent) == (True, "Correct!")
+            assert tutorial.get_current_puzzles() == [parent] # The children came with the auto-grade result
+            assert tutorial.update_auto_grade() == [parent]
+            assert len(tutorial.get_current_puzzles()) == 2
+            assert not tutorial.is_finished()
+
+    def test_regenerate(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.puz:
+                        - puzzles.puz
+                seed: 7
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+
+                def puz():
+                    name = rand().name()
+                    File(name).write_text("A")
+                    return Puzzle(question = name, checker = lambda: File(name).read_text() == "B")
+            """),
+        })
+
+        with tutorial:
+            [root, child] = tutorial.get_all_puzzles()
+            run_command(tutorial, f"rm {root.question}\n") # Break the puzzle
+
+            new_root = tutorial.regenerate_puzzle(root)
+            assert new_root.id == root.id and new_root.question == root.question # Seeded, so it is the same puzzle
+            assert tutorial.get_all_puzzles() == [new_root, child]
+            assert file_exists(tutorial, root.question)
+
+            run_command(tutorial, ["bash", "-c", f"echo -n B > {root.question}"])
+            assert tutorial.solve_puzzle(new_root) == (True, "Correct!")
+            assert tutorial.get_current_puzzles() == [new_root, child]
+
+    def test_bytecode_cache(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            # The package is read-only, so bytecode should be in the cache volume instead.
+            exit_code, output = run_command(tutorial, ["find", docker_helper.PYCACHE_PATH, "-name", "tutorial_docker.*.pyc"])
+            assert exit_code == 0
+            assert "tutorial_docker" in output
+
+            # Not even root in the tutorial container can change the cache
+            exit_code, output = run_command(tutorial, ["touch", f"{docker_helper.PYCACHE_PATH}/planted.pyc"], user = "root")
+            assert exit_code != 0
+            assert "Read-only file system" in output
+
+    def test_profile(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - mypuzzles.py
+                puzzles:
+                    - mypuzzles.move
+                log_dir: logs
+                profile: yes
+            """,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            puzzle = tutorial.get_all_puzzles()[0]
+            tutorial.solve_puzzle(puzzle)
+            tutorial.restart()
+            tutorial.solve_puzzle(puzzle)
+
+        [first, restarted] = sorted((tmp_path / "logs").glob("*.pstats"))
+        assert first.name.endswith("_profile.pstats")
+        assert restarted.name.endswith("_profile_restart1.pstats")
+
+        funcs = {func for (file, line, func) in pstats.Stats(str(first)).stats} # type: ignore
+        assert {"setup", "move", "solve_puzzle"} <= funcs
+        funcs = {func for (file, line, func) in pstats.Stats(str(restarted)).stats} # type: ignore
+        assert {"restore", "solve_puzzle"} <= funcs
+        assert "setup" not in funcs
+
+    def test_generation_report(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - mypuzzles.py
+                puzzles:
+                    - mypuzzles.move
+                log_dir: logs
+            """,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            [stats] = tutorial.generation_report
+            assert (stats.name, stats.kind, stats.files_created) == ("mypuzzles.move", "template", 1)
+
+        [report] = (tmp_path / "logs").glob("*_generation_report.txt")
+        assert "mypuzzles.move" in report.read_text()
+
+    def test_generation_report_printed(self, tmp_path: Path, check_containers, capsys):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL, # No log_dir
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        with tutorial:
+            pass
+        assert "mypuzzles.move" in capsys.readouterr().out
+
+    def test_python_magic(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+
+        with tutorial:
+            # Container's Python is detected once per image, and modules still work whether or not they were compiled on host
+            assert tutorial._image_id in Tutorial._python_magic
+            assert [p.template for p in tutorial.get_all_puzzles()] == ["mypuzzles.move"]
@@ -0,0 +1,30 @@
+from pathlib import PurePath
+import marshal
+from shell_adventure.host_side import module_compiler
+
+class TestModuleCompiler:
+    def test_compile_module(self):
+        compiled = module_compiler.compile_module(PurePath("/path/to/puzzles.py"), "a = 1 + 1\n")
+        code = marshal.loads(compiled)
+        assert code.co_filename == "<string>:/path/to/puzzles.py"
+
+        namespace = {}
+        exec(code, namespace)
+        assert namespace["a"] == 2
+
+    def test_cache(self):
+        path = PurePath("puzzles.py")
+        assert module_compiler.compile_module(path, "a = 1") is module_compiler.compile_module(path, "a = 1")
+        assert module_compiler.compile_module(path, "a = 1") != module_compiler.compile_module(path, "a = 2")
+        # Path is part of the code object, so it is part of the key
+        assert module_compiler.compile_module(path, "a = 1") != module_compiler.compile_module(PurePath("other.py"), "a = 1")
+
+    def test_no_future_imports(self):
+        # Modules shouldn't inherit the __future__ imports of the host code
+        code = marshal.loads(module_compiler.compile_module(PurePath("puzzles.py"), "def f(a: int): pass"))
+        namespace = {}
+        exec(code, namespace)
+        assert namespace["f"].__annotations__ == {"a": int}
+
+    def test_syntax_error(self):
+        assert module_compiler.compile_module(PurePath("puzzles.py"), "1 ++") == None
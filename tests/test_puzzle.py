@@ -22,3 +22,16 @@ class TestPuzzle:
                 question = 1,
                 checker = lambda: False,
             )
+
+        with pytest.raises(TypeError, match = "Puzzle.depends_on"):
+            puzzle = Puzzle(
+                question = "Hey",
+                checker = lambda: False,
+                depends_on = "file.txt",
+            )
+
+    def test_depends_on(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        puzzle = Puzzle("Solve this puzzle.", checker = lambda: False, depends_on = ["a.txt", tmp_path / "b"])
+        assert puzzle.depends_on == [str(tmp_path / "a.txt"), str(tmp_path / "b")]
+        assert Puzzle("Solve this puzzle.", checker = lambda: False).depends_on == None
@@ -0,0 +1,10 @@
+from shell_adventure.shared.resource_usage import ResourceSample, peak_sample
+
+class TestResourceUsage:
+    def test_peak_sample(self):
+        samples = [
+            ResourceSample(time = 1, cpu_percent = 50.0, memory = 10, read_bytes = 0, write_bytes = 7, processes = 1),
+            ResourceSample(time = 2, cpu_percent = 10.0, memory = 30, read_bytes = 4, write_bytes = 0, processes = 3),
+        ]
+        assert peak_sample(samples) == ResourceSample(2, 50.0, 30, 4, 7, 3)
+        assert peak_sample([]) == None
@@ -89,6 +89,75 @@ class TestRestart:
 
             assert tutorial.solve_puzzle(globals_set) == (True, "Correct!") # _home is still set
 
+    def test_restart_lazy_generation(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.puz:
+                        - puzzles.puz
+                lazy_generation: yes
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+
+                def puz():
+                    name = rand().name()
+                    File(name).create()
+                    return Puzzle(question = name, checker = lambda flag: flag == name)
+            """),
+        })
+
+        with tutorial:
+            [root] = tutorial.get_all_puzzles()
+            assert tutorial.solve_puzzle(root, root.question) == (True, "Correct!")
+            [root, child] = tutorial.get_all_puzzles()
+
+            tutorial.restart()
+            assert tutorial.get_all_puzzles() == [root] # Child is generated again when its parent is solved
+            assert root.solved == False
+            assert not file_exists(tutorial, child.question)
+
+            assert tutorial.solve_puzzle(root, root.question) == (True, "Correct!")
+            [root, new_child] = tutorial.get_all_puzzles()
+            assert new_child.id != child.id
+            assert new_child.question != root.question
+            assert tutorial.solve_puzzle(new_child, new_child.question) == (True, "Correct!")
+            assert tutorial.is_finished()
+
+    def test_restart_after_regenerate(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.puz
+            """,
+            "puzzles.py": dedent("""
+                from shell_adventure.api import *
+
+                def puz():
+                    name = rand().name()
+                    File(name).create()
+                    return Puzzle(question = name, checker = lambda flag: flag == name)
+            """),
+        })
+
+        with tutorial:
+            [puzzle] = tutorial.get_all_puzzles()
+            new = tutorial.regenerate_puzzle(puzzle)
+            assert new.question != puzzle.question # Not seeded, so it got a new name
+            assert tutorial.get_all_puzzles() == [new]
+
+            tutorial.restart() # Goes back to the puzzle from the snapshot
+            assert tutorial.get_all_puzzles() == [puzzle]
+            assert not file_exists(tutorial, new.question)
+            assert tutorial.solve_puzzle(puzzle, puzzle.question) == (True, "Correct!")
+
+            new = tutorial.regenerate_puzzle(puzzle) # Can still regenerate after a restart
+            assert tutorial.solve_puzzle(new, new.question) == (True, "Correct!")
+
     def test_restart_pickle_failure(self, tmp_path: Path, check_containers):
         puzzles = dedent("""
             from shell_adventure.api import *
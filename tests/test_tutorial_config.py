@@ -17,6 +17,12 @@ class TestTutorialConfig:
         tutorial = Tutorial(f"{tmp_path / 'config.yaml'}") # Strings should also work for path
         assert tutorial.config_file == tmp_path / "config.yaml"
         assert tutorial.name_dictionary.name == "name_dictionary.txt"
+        assert tutorial.log_dir == None
+        assert tutorial.resource_sample_interval == None
+        assert tutorial.auto_grade_interval == None
+        assert tutorial.checker_limits == None
+        assert tutorial.profile == False
+        assert tutorial.seed == None
 
     def test_creation(self, tmp_path: Path, check_containers):
         tutorial = create_tutorial(tmp_path, {
@@ -40,6 +46,16 @@ class TestTutorialConfig:
                 name_dictionary: "my_dictionary.txt"
                 content_sources:
                     - content.txt
+                archives:
+                    - fixtures/project.tar.gz
+                lazy_generation: yes
+                log_dir: logs
+                resource_sample_interval: 0.5
+                auto_grade_interval: 1
+                checker_timeout: 2.5
+                checker_memory_limit: 100
+                profile: yes
+                seed: 42
             """,
             "setup.py": "File('A.txt').create()",
             "path/to/puzz1.py": SIMPLE_PUZZLES,
@@ -58,11 +74,32 @@ class TestTutorialConfig:
         }
         assert tutorial.name_dictionary == tmp_path / "my_dictionary.txt"
         assert tutorial.content_sources == [tmp_path / "content.txt"]
+        assert tutorial.archives == [tmp_path / "fixtures/project.tar.gz"]
+        assert tutorial.lazy_generation == True
+        assert tutorial.log_dir == tmp_path / "logs"
+        assert tutorial.resource_sample_interval == 0.5
+        assert tutorial.auto_grade_interval == 1
+        assert tutorial.checker_limits == {"timeout": 2.5, "memory_limit": 100, "cpu_limit": None}
+        assert tutorial.profile == True
+        assert tutorial.seed == 42
 
         assert [s for s in tutorial.setup_scripts] == [tmp_path / "setup.py"]
         assert [m for m in tutorial.module_paths] == [tmp_path / "path/to/puzz1.py", tmp_path / "puzz2.py", tmp_path / "puzz3.py"]
         assert [n.data for n in tutorial.puzzle_templates] == ["puzz1.move", "puzz2.move", "puzz3.move"]
 
+    def test_fractional_memory_limit(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - mypuzzles.py
+                puzzles:
+                    - mypuzzles.move
+                checker_memory_limit: 0.5
+            """,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        assert tutorial.checker_limits == {"timeout": None, "memory_limit": 0.5, "cpu_limit": None}
+
     def test_nested_puzzles(self, tmp_path: Path, check_containers):
         tutorial = create_tutorial(tmp_path, {
             "config.yaml": f"""
@@ -108,6 +145,21 @@ class TestTutorialConfig:
         with pytest.raises(ConfigError, match = r".*puzzles\.py"):
             with tutorial: pass
 
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL + "content_sources: [not_a_content_source.txt]\n",
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        with pytest.raises(ConfigError, match = r"No such file or directory.*not_a_content_source\.txt"):
+            with tutorial: pass
+        assert not (tmp_path / "not_a_content_source.txt").exists() # Docker didn't make it when mounting
+
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL + "archives: [not_an_archive.tar]\n",
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        with pytest.raises(ConfigError, match = r"No such file or directory.*not_an_archive\.tar"):
+            with tutorial: pass
+
     def test_duplicate_module_names(self, tmp_path: Path, check_containers):
         with pytest.raises(ConfigError, match='Multiple puzzle modules with name "puzzle1" found'):
             tutorial = create_tutorial(tmp_path, {
@@ -122,6 +174,26 @@ class TestTutorialConfig:
                 "path/to/puzzle1.py": SIMPLE_PUZZLES,
             })
 
+    def test_duplicate_archive_names(self, tmp_path: Path, check_containers):
+        with pytest.raises(ConfigError, match='Multiple archives with name "files.zip" found'):
+            tutorial = create_tutorial(tmp_path, {
+                "config.yaml": SIMPLE_TUTORIAL + "archives: [files.zip, path/to/files.zip]\n",
+                "mypuzzles.py": SIMPLE_PUZZLES,
+            })
+
+    def test_profile_requires_log_dir(self, tmp_path: Path, check_containers):
+        with pytest.raises(ConfigError, match = "log_dir is required when profile is enabled"):
+            tutorial = create_tutorial(tmp_path, {
+                "config.yaml": """
+                    modules:
+                        - puzzles.py
+                    puzzles:
+                        - puzzles.move
+                    profile: yes
+                """,
+                "puzzles.py": SIMPLE_PUZZLES,
+            })
+
     def test_validation_error(self, tmp_path: Path, check_containers):
         with pytest.raises(ConfigError) as exc_info:
             tutorial = create_tutorial(tmp_path, {
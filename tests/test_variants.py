@@ -0,0 +1,123 @@
+import pytest
+from shell_adventure.host_side.tutorial import Tutorial
+from shell_adventure.host_side import docker_helper, variants
+from shell_adventure.shared.tutorial_errors import *
+from textwrap import dedent
+from pathlib import Path
+import re
+from .helpers import *
+
+RANDOM_PUZZLES = dedent("""
+    from shell_adventure.api import *
+
+    def move():
+        src = File(rand().name())
+        src.write_text("A")
+
+        def checker():
+            return not src.exists()
+
+        return Puzzle(
+            question = f"Delete {src}",
+            checker = checker,
+        )
+""")
+
+class TestVariants:
+    @pytest.fixture()
+    def remove_variants(self):
+        """ Removes the variant images the test made. """
+        images_before = set(docker_helper.client.images.list(docker_helper.VARIANT_REPOSITORY))
+        yield
+        for image in set(docker_helper.client.images.list(docker_helper.VARIANT_REPOSITORY)) - images_before:
+            docker_helper.client.images.remove(image.id, force = True)
+
+    def test_variant_id(self):
+        assert variants.variant_id("path/to/config.yaml", 42) == "config-42"
+        for config, seed in [("config.yaml", "héllo wörld"), (".yaml", "-1"), ("config.yaml", "x" * 200)]:
+            id = variants.variant_id(config, seed)
+            assert re.fullmatch(r"[A-Za-z0-9_][A-Za-z0-9_.-]{0,127}", id)
+        # Ids that had to be changed stay unique
+        assert variants.variant_id("config.yaml", "a b") != variants.variant_id("config.yaml", "a_b")
+        assert variants.variant_id("config.yaml", "x" * 200) != variants.variant_id("config.yaml", "x" * 201)
+
+    def test_generate(self, tmp_path: Path, remove_variants, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        store = tmp_path / "store"
+        ids = variants.generate_all(tutorial.config_file, store, [1, 2], jobs = 2)
+        assert ids == ["config-1", "config-2"]
+        assert variants.variant_file(store, "config-1").exists()
+        assert docker_helper.client.images.get(f"{docker_helper.VARIANT_REPOSITORY}:config-2")
+
+        tutorial = Tutorial(tutorial.config_file, variants.variant_file(store, "config-1"))
+        with tutorial:
+            assert tutorial.seed == 1
+            assert file_exists(tutorial, "A.txt") # Made when the variant was generated
+            [puzzle] = tutorial.get_all_puzzles()
+            assert puzzle.question == "Rename A.txt to B.txt"
+            assert tutorial.solve_puzzle(puzzle) == (False, "Incorrect!")
+
+            run_command(tutorial, "mv A.txt B.txt")
+            assert tutorial.solve_puzzle(puzzle) == (True, "Correct!")
+
+            tutorial.restart()
+            assert file_exists(tutorial, "A.txt")
+            assert not puzzle.solved
+        assert docker_helper.client.images.get(f"{docker_helper.VARIANT_REPOSITORY}:config-1") # Variant is kept
+
+    def test_seeded_variants_differ(self, tmp_path: Path, remove_variants, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": """
+                modules:
+                    - puzzles.py
+                puzzles:
+                    - puzzles.move
+            """,
+            "puzzles.py": RANDOM_PUZZLES,
+        })
+        store = tmp_path / "store"
+        ids = variants.generate_all(tutorial.config_file, store, ["a", "b"])
+
+        questions = []
+        for id in ids:
+            with Tutorial(tutorial.config_file, variants.variant_file(store, id)) as variant:
+                questions.append(variant.get_all_puzzles()[0].question)
+        assert questions[0] != questions[1]
+
+    def test_config_changed(self, tmp_path: Path, remove_variants, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        store = tmp_path / "store"
+        [id] = variants.generate_all(tutorial.config_file, store, [1])
+
+        tutorial.config_file.write_text(SIMPLE_TUTORIAL + "restart_enabled: no\n")
+        with pytest.raises(ConfigError, match = "different config file"):
+            with Tutorial(tutorial.config_file, variants.variant_file(store, id)):
+                pass
+
+    def test_puzzles_changed(self, tmp_path: Path, remove_variants, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        store = tmp_path / "store"
+        [id] = variants.generate_all(tutorial.config_file, store, [1])
+
+        (tmp_path / "mypuzzles.py").write_text(SIMPLE_PUZZLES.replace("A.txt", "X.txt"))
+        with pytest.raises(ConfigError, match = "different config file or puzzles"):
+            with Tutorial(tutorial.config_file, variants.variant_file(store, id)):
+                pass
+
+    def test_missing_variant(self, tmp_path: Path, check_containers):
+        tutorial = create_tutorial(tmp_path, {
+            "config.yaml": SIMPLE_TUTORIAL,
+            "mypuzzles.py": SIMPLE_PUZZLES,
+        })
+        with pytest.raises(ConfigError, match = "Couldn't load variant"):
+            with Tutorial(tutorial.config_file, tmp_path / "missing.variant"):
+                pass